@@ -19,3 +19,26 @@ class PolicyTypes:
 class ActionSettings:
     PreviousSubmittedAction = "previous_submitted_action"
     DefaultAction = "default_action"
+
+
+@dataclasses.dataclass(frozen=True)
+class TickCatchupPolicies:
+    CatchUp = "catch_up"
+    Skip = "skip"
+
+
+@dataclasses.dataclass(frozen=True)
+class GameSchedulers:
+    PerGame = "per_game"
+    Multiplexed = "multiplexed"
+
+
+@dataclasses.dataclass(frozen=True)
+class DegradationPolicies:
+    ReduceEmitRate = "reduce_emit_rate"
+
+
+@dataclasses.dataclass(frozen=True)
+class LateBotActionPolicies:
+    Apply = "apply"
+    Drop = "drop"
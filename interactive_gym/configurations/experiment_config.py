@@ -19,6 +19,12 @@ class ExperimentConfig:
         self.max_ping = 100000
         self.min_ping_measurements = 5
 
+        # Admission control
+        self.max_concurrent_games: int | None = None
+        self.max_tick_lag_s: float | None = None
+        self.max_cpu_utilization: float | None = None
+        self.admission_update_interval_s: float = 1.0
+
         # Experiment data
         self.save_experiment_data = True
 
@@ -44,6 +50,7 @@ class ExperimentConfig:
         host: str | None = NotProvided,
         port: int | None = NotProvided,
         max_ping: int = NotProvided,
+        max_concurrent_games: int | None = NotProvided,
     ):
         if host is not NotProvided:
             self.host = host
@@ -54,6 +61,48 @@ class ExperimentConfig:
         if max_ping is not NotProvided:
             self.max_ping = max_ping
 
+        if max_concurrent_games is not NotProvided:
+            assert (
+                max_concurrent_games is None or max_concurrent_games >= 1
+            ), "Must have at least one concurrent game!"
+            self.max_concurrent_games = max_concurrent_games
+
+        return self
+
+    def admission_control(
+        self,
+        max_tick_lag_s: float | None = NotProvided,
+        max_cpu_utilization: float | None = NotProvided,
+        admission_update_interval_s: float = NotProvided,
+    ):
+        """Stop admitting participants to new games when the server is overloaded.
+
+        Participants who would start a new game while the server is at
+        `max_concurrent_games` (see `hosting`), or above either of these
+        thresholds, wait in a queue and are shown their position until
+        there is capacity.
+
+        :param max_tick_lag_s: Mean tick lag of the worst running game above which no new games are admitted, None for no limit, defaults to NotProvided
+        :type max_tick_lag_s: float | None, optional
+        :param max_cpu_utilization: Fraction of a CPU core used by the server process above which no new games are admitted, None for no limit, defaults to NotProvided
+        :type max_cpu_utilization: float | None, optional
+        :param admission_update_interval_s: Seconds between load measurements and queue updates, defaults to NotProvided
+        :type admission_update_interval_s: float, optional
+        :return: The ExperimentConfig instance (self)
+        :rtype: ExperimentConfig
+        """
+        if max_tick_lag_s is not NotProvided:
+            self.max_tick_lag_s = max_tick_lag_s
+
+        if max_cpu_utilization is not NotProvided:
+            self.max_cpu_utilization = max_cpu_utilization
+
+        if admission_update_interval_s is not NotProvided:
+            assert (
+                admission_update_interval_s > 0
+            ), "admission_update_interval_s must be > 0."
+            self.admission_update_interval_s = admission_update_interval_s
+
         return self
 
     def to_dict(self, serializable=False):
@@ -18,7 +18,8 @@ class RemoteConfig:
         # hosting
         self.host = None
         self.port = 8000
-        self.max_concurrent_games = 1
+        # Opt-in cap on concurrent games, enforced by admission control.
+        self.max_concurrent_games: int | None = None
 
         # policies
         self.load_policy_fn: typing.Callable | None = None
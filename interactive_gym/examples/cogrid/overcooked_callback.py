@@ -47,6 +47,12 @@ class OvercookedCallback(callback.GameCallback):
             f"{a_id}_reward": reward
             for a_id, reward in remote_game.prev_rewards.items()
         }
+        actions.update(
+            {
+                f"{a_id}_action_status": status
+                for a_id, status in remote_game.bot_action_status.items()
+            }
+        )
 
         self.actions[remote_game.game_uuid].append(actions)
         self.rewards[remote_game.game_uuid].append(rewards)
@@ -58,6 +64,7 @@ class OvercookedCallback(callback.GameCallback):
             "episode_num": remote_game.episode_num,
             "episode_s_elapsed": time.time() - self.start_times[remote_game.game_uuid],
             "tick_num": remote_game.tick_num,
+            "emit_interval": remote_game.emit_interval,
         }
 
         env: cogrid_env.CoGridEnv = remote_game.env
@@ -28,6 +28,9 @@ class GymScene(scene.Scene):
         available_policies (dict[str, Any]): Available policies for the scene.
         policy_configs (dict[str, Any]): Configurations for the policies.
         frame_skip (int): Number of frames to skip between actions.
+        stateful_policy_inference (bool): Whether to pass each bot's recurrent state key to `policy_inference_fn`.
+        bot_action_deadline_ticks (int | None): Ticks after an observation by which a bot's action must be applied, None for `frame_skip`.
+        late_bot_action_policy (str): Whether bot actions that miss their deadline are applied or dropped.
         num_episodes (int): Number of episodes to run.
         max_steps (int): Maximum number of steps per episode.
         action_mapping (dict[str, int]): Mapping of action names to action indices.
@@ -51,6 +54,25 @@ class GymScene(scene.Scene):
         assets_dir (str): Directory containing assets.
         assets_to_preload (list[str]): List of assets to preload.
         animation_configs (list): Configurations for animations.
+        lockstep (bool): Whether Pyodide clients step the same seeded environment in lockstep, with the server only relaying their actions.
+        lockstep_input_delay_ticks (int): Number of ticks after it's taken that a lockstep action is applied.
+        lockstep_state_hash_interval (int | None): Ticks between the state-hash checks that detect lockstep desyncs, None to disable them.
+        interpolation_delay_ms (int | None): How far behind the server the client renders, interpolating object positions between frames (server mode only), None to draw each frame as it arrives.
+        tick_catchup_policy (str): How the server game loop handles ticks that are behind schedule.
+        max_catchup_ticks (int): Maximum number of ticks to run back-to-back when catching up.
+        game_scheduler (str): Whether each server game runs its own loop or all are ticked by a single driver.
+        num_env_workers (int): Number of worker processes to host environments in (0 runs them in the server process).
+        batched_env_step (bool): Whether the multiplexed scheduler steps all of its games' environments as one batch.
+        env_pool_size (int): Number of pre-built, already-reset environments to keep ready for new games (0 disables the pool).
+        double_buffered_reset (bool): Whether to prepare the next episode during the reset countdown.
+        stalled_game_timeout_s (float | None): Seconds an active game can go without ticking before it is reclaimed, None to never reclaim.
+        reset_barrier_timeout_s (float | None): Seconds a game can wait for its players to confirm a reset before it is reclaimed, None to wait indefinitely.
+        supervisor_interval_s (float): Seconds between checks for stalled games.
+        degradation_policy (str | None): How the server degrades a game that is running behind, None to not degrade.
+        max_emit_interval (int): Largest k the server will emit every k-th frame at when reducing the emit rate.
+        state_delta_encoding (bool): Whether the server emits only the state objects that changed since the last frame.
+        keyframe_interval (int): Number of emits between full keyframes when delta encoding the state.
+        binary_state_encoding (bool): Whether the server packs state objects with msgpack and per-type schemas rather than sending JSON dicts.
     """
 
     DEFAULT_IG_PACKAGE = "interactive-gym==0.0.7"
@@ -72,6 +94,11 @@ class GymScene(scene.Scene):
         self.available_policies: dict[str, Any] = dict()
         self.policy_configs: dict[str, Any] = dict()
         self.frame_skip: int = 4
+        self.stateful_policy_inference: bool = False
+        self.bot_action_deadline_ticks: int | None = None
+        self.late_bot_action_policy: str = (
+            configuration_constants.LateBotActionPolicies.Apply
+        )
 
         # gameplay
         self.num_episodes: int = 1
@@ -103,6 +130,7 @@ class GymScene(scene.Scene):
         self.assets_dir: str = "./static/assets/"
         self.assets_to_preload: list[str] = []
         self.animation_configs: list = []
+        self.interpolation_delay_ms: int | None = None
 
         # user_experience
         self.scene_header: str = None
@@ -119,6 +147,28 @@ class GymScene(scene.Scene):
         self.on_game_step_code: str = ""
         self.packages_to_install: list[str] = [GymScene.DEFAULT_IG_PACKAGE]
         self.restart_pyodide: bool = False
+        self.lockstep: bool = False
+        self.lockstep_input_delay_ticks: int = 3
+        self.lockstep_state_hash_interval: int | None = 30
+
+        # server runtime
+        self.tick_catchup_policy: str = (
+            configuration_constants.TickCatchupPolicies.CatchUp
+        )
+        self.max_catchup_ticks: int = 5
+        self.game_scheduler: str = configuration_constants.GameSchedulers.PerGame
+        self.num_env_workers: int = 0
+        self.batched_env_step: bool = False
+        self.env_pool_size: int = 0
+        self.double_buffered_reset: bool = False
+        self.stalled_game_timeout_s: float | None = None
+        self.reset_barrier_timeout_s: float | None = None
+        self.supervisor_interval_s: float = 5
+        self.degradation_policy: str | None = None
+        self.max_emit_interval: int = 4
+        self.state_delta_encoding: bool = False
+        self.keyframe_interval: int = 150
+        self.binary_state_encoding: bool = False
 
     def environment(
         self,
@@ -162,9 +212,17 @@ class GymScene(scene.Scene):
         assets_dir: str = NotProvided,
         assets_to_preload: list[str] = NotProvided,
         animation_configs: list = NotProvided,
+        interpolation_delay_ms: int | None = NotProvided,
     ):
         """_summary_
 
+        With `interpolation_delay_ms`, server-mode clients buffer the frames they receive
+        and render `interpolation_delay_ms` behind the server, interpolating the positions
+        of objects (matched by `uuid`) between frames at the browser's frame rate. Movement
+        then stays smooth through network jitter and at a low server `fps` (e.g., 10-15 for
+        slow-paced games), at the cost of that much added display latency. A delay of about
+        two server frames (e.g., 150-200 ms at 10-15 fps) is a good starting point.
+
         :param fps: Frames per second for rendering the game, defaults to NotProvided
         :type fps: int, optional
         :param env_to_state_fn: Function to convert environment state to renderable state, defaults to NotProvided
@@ -189,6 +247,8 @@ class GymScene(scene.Scene):
         :type assets_to_preload: list[str], optional
         :param animation_configs: Configurations for game animations, defaults to NotProvided
         :type animation_configs: list, optional
+        :param interpolation_delay_ms: Milliseconds behind the server to render at while interpolating between frames, None to disable, defaults to NotProvided
+        :type interpolation_delay_ms: int | None, optional
         :return: This scene object
         :rtype: GymScene
         """
@@ -232,6 +292,12 @@ class GymScene(scene.Scene):
         if animation_configs is not NotProvided:
             self.animation_configs = animation_configs
 
+        if interpolation_delay_ms is not NotProvided:
+            assert (
+                interpolation_delay_ms is None or interpolation_delay_ms >= 0
+            ), "interpolation_delay_ms must be None or >= 0."
+            self.interpolation_delay_ms = interpolation_delay_ms
+
         return self
 
     def policies(
@@ -240,6 +306,9 @@ class GymScene(scene.Scene):
         load_policy_fn: Callable = NotProvided,
         policy_inference_fn: Callable = NotProvided,
         frame_skip: int = NotProvided,
+        stateful_policy_inference: bool = NotProvided,
+        bot_action_deadline_ticks: int | None = NotProvided,
+        late_bot_action_policy: str = NotProvided,
     ):
         """_summary_
 
@@ -251,6 +320,12 @@ class GymScene(scene.Scene):
         :type policy_inference_fn: Callable, optional
         :param frame_skip: Number of frames to skip between actions, defaults to NotProvided
         :type frame_skip: int, optional
+        :param stateful_policy_inference: Whether `policy_inference_fn` keeps a recurrent state for each bot. If True, it's called with a `state_key` keyword argument (the game's UUID and the agent ID), whose state is zeroed at the start of every episode and dropped when the game ends. The ONNX inference functions use it to serve recurrent models, defaults to NotProvided
+        :type stateful_policy_inference: bool, optional
+        :param bot_action_deadline_ticks: Number of ticks after a bot receives an observation by which the action it computes must be applied. Every tick, each bot's action is recorded as on time, late, dropped, missed (still computing past the deadline), pending, or idle (no observation to act on), and the counts are logged when the game ends. If None, the deadline is `frame_skip` ticks, i.e., before the bot's next observation, defaults to NotProvided
+        :type bot_action_deadline_ticks: int | None, optional
+        :param late_bot_action_policy: What to do with a bot action that misses its deadline, one of `configuration_constants.LateBotActionPolicies`: `apply` it anyway (the previous behavior) or `drop` it, so the bot keeps taking the default or previous action until its next on-time action, defaults to NotProvided
+        :type late_bot_action_policy: str, optional
         :return: The GymScene instance
         :rtype: GymScene
         """
@@ -266,6 +341,23 @@ class GymScene(scene.Scene):
         if frame_skip is not NotProvided:
             self.frame_skip = frame_skip
 
+        if stateful_policy_inference is not NotProvided:
+            self.stateful_policy_inference = stateful_policy_inference
+
+        if bot_action_deadline_ticks is not NotProvided:
+            assert (
+                bot_action_deadline_ticks is None
+                or bot_action_deadline_ticks >= 1
+            ), "bot_action_deadline_ticks must be None or at least 1."
+            self.bot_action_deadline_ticks = bot_action_deadline_ticks
+
+        if late_bot_action_policy is not NotProvided:
+            assert late_bot_action_policy in [
+                configuration_constants.LateBotActionPolicies.Apply,
+                configuration_constants.LateBotActionPolicies.Drop,
+            ], f"Unrecognized late bot action policy: {late_bot_action_policy}"
+            self.late_bot_action_policy = late_bot_action_policy
+
         return self
 
     def gameplay(
@@ -423,12 +515,25 @@ class GymScene(scene.Scene):
         on_game_step_code: str = NotProvided,
         packages_to_install: list[str] = NotProvided,
         restart_pyodide: bool = NotProvided,
+        lockstep: bool = NotProvided,
+        lockstep_input_delay_ticks: int = NotProvided,
+        lockstep_state_hash_interval: int | None = NotProvided,
     ):
         """Configure Pyodide-related settings for the GymScene.
 
         This method sets up parameters related to running the environment through Pyodide,
         which allows Python code to run in the browser.
 
+        With `lockstep`, scenes with several human players are played in lockstep: every
+        client runs the same environment, reset with a seed the server picks for the game,
+        and steps it with the same actions. Each client sends its own action (and the bot
+        host, the actions of the bots) for the tick `lockstep_input_delay_ticks` ahead of
+        the one it's stepping, and the server only relays the bundle of every player's
+        actions for a tick back to the room. A client waits for a tick's bundle before
+        stepping it, so the input delay hides the round trip to the server. Every
+        `lockstep_state_hash_interval` ticks, the clients also send a hash of their state,
+        and the server logs and reports a desync to the room if they differ.
+
         :param run_through_pyodide: Whether to run the environment through Pyodide, defaults to NotProvided
         :type run_through_pyodide: bool, optional
         :param environment_initialization_code: Python code to initialize the environment in Pyodide, defaults to NotProvided
@@ -439,6 +544,12 @@ class GymScene(scene.Scene):
         :type packages_to_install: list[str], optional
         :param restart_pyodide: Whether to restart the Pyodide environment, defaults to NotProvided
         :type restart_pyodide: bool, optional
+        :param lockstep: Whether to step every player's environment in lockstep, requires run_through_pyodide, defaults to NotProvided
+        :type lockstep: bool, optional
+        :param lockstep_input_delay_ticks: Ticks after it's taken that a player's action is applied in lockstep, defaults to NotProvided
+        :type lockstep_input_delay_ticks: int, optional
+        :param lockstep_state_hash_interval: Ticks between state-hash checks for desyncs, None to disable them, defaults to NotProvided
+        :type lockstep_state_hash_interval: int | None, optional
         :return: The GymScene instance (self)
         :rtype: GymScene
         """
@@ -471,6 +582,226 @@ class GymScene(scene.Scene):
         if on_game_step_code is not NotProvided:
             self.on_game_step_code = on_game_step_code
 
+        if lockstep is not NotProvided:
+            assert (
+                not lockstep or self.run_through_pyodide
+            ), "lockstep requires run_through_pyodide=True."
+            self.lockstep = lockstep
+
+        if lockstep_input_delay_ticks is not NotProvided:
+            assert (
+                type(lockstep_input_delay_ticks) == int
+                and lockstep_input_delay_ticks >= 0
+            ), "Must pass an int >=0 to lockstep_input_delay_ticks."
+            self.lockstep_input_delay_ticks = lockstep_input_delay_ticks
+
+        if lockstep_state_hash_interval is not NotProvided:
+            assert (
+                lockstep_state_hash_interval is None
+                or lockstep_state_hash_interval >= 1
+            ), "lockstep_state_hash_interval must be None or >= 1."
+            self.lockstep_state_hash_interval = lockstep_state_hash_interval
+
+        return self
+
+    def runtime(
+        self,
+        tick_catchup_policy: str = NotProvided,
+        max_catchup_ticks: int = NotProvided,
+        game_scheduler: str = NotProvided,
+        num_env_workers: int = NotProvided,
+        batched_env_step: bool = NotProvided,
+        env_pool_size: int = NotProvided,
+        double_buffered_reset: bool = NotProvided,
+        stalled_game_timeout_s: float | None = NotProvided,
+        reset_barrier_timeout_s: float | None = NotProvided,
+        supervisor_interval_s: float = NotProvided,
+        degradation_policy: str | None = NotProvided,
+        max_emit_interval: int = NotProvided,
+        state_delta_encoding: bool = NotProvided,
+        keyframe_interval: int = NotProvided,
+        binary_state_encoding: bool = NotProvided,
+    ):
+        """Configure how the server runs games for this scene (server mode only).
+
+        Each game is paced by a fixed-timestep clock that tracks absolute deadlines
+        at `fps`. When the loop falls behind (e.g., a slow `env_to_state_fn`), the
+        catch-up policy decides whether the missed ticks are run back-to-back or dropped.
+
+        By default each game runs in its own loop. With `GameSchedulers.Multiplexed`, a
+        single driver ticks every active game of the scene in one pass on a shared clock,
+        which avoids timer jitter and hub contention with many concurrent games.
+
+        Setting `num_env_workers` moves each game's environment into a pool of worker
+        processes, with `reset`, `step`, and rendering proxied over a pipe, so that a
+        CPU-heavy environment doesn't stall socket I/O for everyone else. The
+        `env_creator` and `env_to_state_fn` must then be picklable (e.g., module-level functions).
+
+        With the multiplexed scheduler and env workers, `batched_env_step` runs each tick
+        of every active game in the scene as one batch: actions are collected for all
+        games, their environments are stepped with one round trip per worker (in parallel
+        across workers), and the results are applied to each game. Games whose episode
+        ends leave the batch until all of their players confirm the reset.
+
+        `env_pool_size` keeps that many environments built and reset ahead of time for
+        the scene (per `env_config`). New games borrow one instead of calling `env_creator`
+        and `env.reset()` after the match is found, and environments are reset and returned
+        to the pool when their game is removed.
+
+        With `double_buffered_reset`, the next episode's `env.reset()` and first render run
+        in the background as soon as an episode ends (after `on_episode_end`), while the
+        players are in the reset freeze and countdown, and are swapped in once every player
+        has confirmed so that the first frame of the new episode is sent right away.
+
+        A supervisor reclaims games that are active but haven't ticked for
+        `stalled_game_timeout_s`, or that have waited on their reset barrier (every player
+        confirming the reset) for longer than `reset_barrier_timeout_s`, e.g., because a
+        participant closed the tab during the countdown. Reclaimed games are ended and
+        cleaned up, freeing their environment, bots, and socket room. The supervisor only
+        runs if at least one of the two is set, and both are None by default.
+
+        With `degradation_policy=DegradationPolicies.ReduceEmitRate`, a game whose loop is
+        running behind first has its render and emit rate lowered (emitting every k-th frame,
+        up to `max_emit_interval`) while the simulation keeps ticking at `fps`, and the rate
+        is raised again once the game catches up. Each change is recorded on the game in
+        `remote_game.emit_interval_changes` (and `remote_game.emit_interval` is the current
+        value) so callbacks can save it with the game data.
+
+        With `state_delta_encoding`, each frame emitted to a room only holds the objects
+        from `env_to_state_fn` that were added or changed since the previous frame, and the
+        `uuid`s of those that were removed. A full keyframe is sent at the start of each
+        episode, when a participant joins, and every `keyframe_interval` emits.
+
+        `binary_state_encoding` additionally packs those objects with msgpack, using a
+        registered schema per object type (see `state_encoding.register_object_schema`) so
+        that field names and trailing defaults aren't sent, and interning strings such as
+        `uuid`s, image names, and colors for the room until the next keyframe.
+
+        :param tick_catchup_policy: One of `TickCatchupPolicies.CatchUp` (run missed ticks back-to-back, up to `max_catchup_ticks`) or `TickCatchupPolicies.Skip` (drop missed ticks), defaults to NotProvided
+        :type tick_catchup_policy: str, optional
+        :param max_catchup_ticks: Maximum number of ticks to run back-to-back when catching up, defaults to NotProvided
+        :type max_catchup_ticks: int, optional
+        :param game_scheduler: One of `GameSchedulers.PerGame` (one loop per game) or `GameSchedulers.Multiplexed` (one driver for all games in the scene), defaults to NotProvided
+        :type game_scheduler: str, optional
+        :param num_env_workers: Number of worker processes to host environments in, 0 to run them in the server process, defaults to NotProvided
+        :type num_env_workers: int, optional
+        :param batched_env_step: Whether to step the environments of all games in the scene as one batch, requires the multiplexed scheduler and env workers, defaults to NotProvided
+        :type batched_env_step: bool, optional
+        :param env_pool_size: Number of pre-built, already-reset environments to keep ready for new games, 0 to build one per game, defaults to NotProvided
+        :type env_pool_size: int, optional
+        :param double_buffered_reset: Whether to reset the environment and render the next episode's first frame during the reset countdown, defaults to NotProvided
+        :type double_buffered_reset: bool, optional
+        :param stalled_game_timeout_s: Seconds an active game can go without ticking before it's reclaimed, None to never reclaim, defaults to NotProvided
+        :type stalled_game_timeout_s: float | None, optional
+        :param reset_barrier_timeout_s: Seconds a game can wait for all players to confirm a reset before it's reclaimed, None to wait indefinitely, defaults to NotProvided
+        :type reset_barrier_timeout_s: float | None, optional
+        :param supervisor_interval_s: Seconds between checks for stalled games, defaults to NotProvided
+        :type supervisor_interval_s: float, optional
+        :param degradation_policy: `DegradationPolicies.ReduceEmitRate` to lower the emit rate of games that are running behind, None to not degrade, defaults to NotProvided
+        :type degradation_policy: str | None, optional
+        :param max_emit_interval: Largest k to emit every k-th frame at when reducing the emit rate, defaults to NotProvided
+        :type max_emit_interval: int, optional
+        :param state_delta_encoding: Whether to emit only the state objects that changed since the last frame, defaults to NotProvided
+        :type state_delta_encoding: bool, optional
+        :param keyframe_interval: Number of emits between full keyframes when delta encoding the state, defaults to NotProvided
+        :type keyframe_interval: int, optional
+        :param binary_state_encoding: Whether to pack state objects with msgpack and per-type schemas, requires state_delta_encoding, defaults to NotProvided
+        :type binary_state_encoding: bool, optional
+        :return: The GymScene instance (self)
+        :rtype: GymScene
+        """
+        if tick_catchup_policy is not NotProvided:
+            assert tick_catchup_policy in [
+                configuration_constants.TickCatchupPolicies.CatchUp,
+                configuration_constants.TickCatchupPolicies.Skip,
+            ], f"Unrecognized tick catch-up policy: {tick_catchup_policy}"
+            self.tick_catchup_policy = tick_catchup_policy
+
+        if max_catchup_ticks is not NotProvided:
+            assert (
+                type(max_catchup_ticks) == int and max_catchup_ticks >= 1
+            ), "Must pass an int >=1 to max_catchup_ticks."
+            self.max_catchup_ticks = max_catchup_ticks
+
+        if game_scheduler is not NotProvided:
+            assert game_scheduler in [
+                configuration_constants.GameSchedulers.PerGame,
+                configuration_constants.GameSchedulers.Multiplexed,
+            ], f"Unrecognized game scheduler: {game_scheduler}"
+            self.game_scheduler = game_scheduler
+
+        if num_env_workers is not NotProvided:
+            assert (
+                type(num_env_workers) == int and num_env_workers >= 0
+            ), "Must pass an int >=0 to num_env_workers."
+            self.num_env_workers = num_env_workers
+
+        if batched_env_step is not NotProvided:
+            assert (
+                not batched_env_step
+                or self.game_scheduler
+                == configuration_constants.GameSchedulers.Multiplexed
+            ), "batched_env_step requires game_scheduler=GameSchedulers.Multiplexed."
+            # In the server process, a batch would step each env in turn,
+            # which is no faster than ticking the games one at a time.
+            assert (
+                not batched_env_step or self.num_env_workers > 0
+            ), "batched_env_step requires num_env_workers > 0."
+            self.batched_env_step = batched_env_step
+
+        if env_pool_size is not NotProvided:
+            assert (
+                type(env_pool_size) == int and env_pool_size >= 0
+            ), "Must pass an int >=0 to env_pool_size."
+            self.env_pool_size = env_pool_size
+
+        if double_buffered_reset is not NotProvided:
+            self.double_buffered_reset = double_buffered_reset
+
+        if stalled_game_timeout_s is not NotProvided:
+            assert (
+                stalled_game_timeout_s is None or stalled_game_timeout_s > 0
+            ), "stalled_game_timeout_s must be None or > 0."
+            self.stalled_game_timeout_s = stalled_game_timeout_s
+
+        if reset_barrier_timeout_s is not NotProvided:
+            assert (
+                reset_barrier_timeout_s is None or reset_barrier_timeout_s > 0
+            ), "reset_barrier_timeout_s must be None or > 0."
+            self.reset_barrier_timeout_s = reset_barrier_timeout_s
+
+        if supervisor_interval_s is not NotProvided:
+            assert supervisor_interval_s > 0, "supervisor_interval_s must be > 0."
+            self.supervisor_interval_s = supervisor_interval_s
+
+        if degradation_policy is not NotProvided:
+            assert degradation_policy in [
+                None,
+                configuration_constants.DegradationPolicies.ReduceEmitRate,
+            ], f"Unrecognized degradation policy: {degradation_policy}"
+            self.degradation_policy = degradation_policy
+
+        if max_emit_interval is not NotProvided:
+            assert (
+                type(max_emit_interval) == int and max_emit_interval >= 1
+            ), "Must pass an int >=1 to max_emit_interval."
+            self.max_emit_interval = max_emit_interval
+
+        if state_delta_encoding is not NotProvided:
+            self.state_delta_encoding = state_delta_encoding
+
+        if keyframe_interval is not NotProvided:
+            assert (
+                type(keyframe_interval) == int and keyframe_interval >= 1
+            ), "Must pass an int >=1 to keyframe_interval."
+            self.keyframe_interval = keyframe_interval
+
+        if binary_state_encoding is not NotProvided:
+            assert (
+                not binary_state_encoding or self.state_delta_encoding
+            ), "binary_state_encoding requires state_delta_encoding=True."
+            self.binary_state_encoding = binary_state_encoding
+
         return self
 
     @property
@@ -0,0 +1,204 @@
+"""
+Admission control for new games.
+
+Without it, every participant who presses start gets a game right away, so a
+spike in traffic (e.g., a study going live on a recruitment platform) degrades
+every running game at once. The `AdmissionController` sits in front of
+`join_game`: participants who would start a new game are only admitted while
+the server is below its limits (number of games, tick lag, and CPU usage), and
+the rest wait in a FIFO queue and are told their position. Participants who
+join a game that is already waiting for players are always admitted, since
+they don't add a game.
+
+Admission happens outside of the participant's request, so the controller
+tells the client it was admitted and the client sends `join_game` again.
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+import time
+import typing
+
+from interactive_gym.server import utils
+from interactive_gym.utils.typing import SubjectID
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Admit participants to new games while the server has capacity, queue the rest."""
+
+    # How long an admitted participant's slot is held for them to rejoin.
+    ADMISSION_HOLD_S = 30
+
+    def __init__(
+        self,
+        sio,
+        load_fn: typing.Callable[[], dict[str, float | int]],
+        max_concurrent_games: int | None = None,
+        max_tick_lag_s: float | None = None,
+        max_cpu_utilization: float | None = None,
+        update_interval_s: float = 1.0,
+        time_fn: typing.Callable[[], float] = time.monotonic,
+        process_time_fn: typing.Callable[[], float] = time.process_time,
+    ):
+        """
+        :param sio: The SocketIO server used to notify participants.
+        :param load_fn: Returns the current number of games (`num_games`) and the worst mean tick lag (`tick_lag_s`).
+        :param max_concurrent_games: Maximum number of games in this process, None for no limit.
+        :param max_tick_lag_s: Stop admitting new games while the tick lag is above this, None for no limit.
+        :param max_cpu_utilization: Stop admitting new games while this process uses more than this fraction of a CPU core, None for no limit.
+        :param update_interval_s: Seconds between load measurements and queue updates.
+        """
+        self.sio = sio
+        self.load_fn = load_fn
+        self.max_concurrent_games = max_concurrent_games
+        self.max_tick_lag_s = max_tick_lag_s
+        self.max_cpu_utilization = max_cpu_utilization
+        self.update_interval_s = update_interval_s
+        self.time_fn = time_fn
+        self.process_time_fn = process_time_fn
+
+        # Queued participants (in order) and the socket room to notify them in.
+        self.queue: collections.OrderedDict[SubjectID, str] = (
+            collections.OrderedDict()
+        )
+
+        # Participants that were admitted from the queue but haven't
+        # joined their game yet, and when their hold expires.
+        self.admitted: dict[SubjectID, float] = utils.ThreadSafeDict()
+
+        self.driver = None
+
+        self.cpu_utilization: float = 0.0
+        self._last_cpu_sample = (self.time_fn(), self.process_time_fn())
+
+        self.num_admitted: int = 0
+        self.num_queued: int = 0
+
+    def request_admission(
+        self, subject_id: SubjectID, room: str, needs_new_game: bool
+    ) -> bool:
+        """Return whether the participant may join a game now, queueing them if not."""
+        if subject_id in self.admitted:
+            return True
+
+        if not needs_new_game or (not self.queue and self.has_capacity()):
+            self.queue.pop(subject_id, None)
+            return True
+
+        if subject_id not in self.queue:
+            self.queue[subject_id] = room
+            self.num_queued += 1
+            logger.info(
+                f"Queued {subject_id} for admission at position {len(self.queue)}. Load: {self.stats()}"
+            )
+
+        self._emit_position(subject_id, room, list(self.queue).index(subject_id))
+
+        if self.driver is None:
+            self.driver = self.sio.start_background_task(self._run)
+
+        return False
+
+    def joined(self, subject_id: SubjectID) -> None:
+        """Release the hold on an admitted participant's slot once they've joined."""
+        if subject_id in self.admitted:
+            del self.admitted[subject_id]
+        self.num_admitted += 1
+
+    def withdraw(self, subject_id: SubjectID, room: str | None = None) -> None:
+        """Remove a participant from the queue (e.g., if they leave or disconnect).
+
+        :param room: Only withdraw them if they are queued from this room, so that a stale socket disconnecting doesn't drop the participant's new one.
+        """
+        if room is not None and self.queue.get(subject_id) != room:
+            return
+
+        self.queue.pop(subject_id, None)
+        if subject_id in self.admitted:
+            del self.admitted[subject_id]
+
+    def has_capacity(self) -> bool:
+        """Whether another game can be admitted given the measured load."""
+        self._sample_cpu_utilization()
+        load = self.load_fn()
+
+        if (
+            self.max_concurrent_games is not None
+            and load["num_games"] + len(self.admitted)
+            >= self.max_concurrent_games
+        ):
+            return False
+
+        if (
+            self.max_tick_lag_s is not None
+            and load["tick_lag_s"] > self.max_tick_lag_s
+        ):
+            return False
+
+        if (
+            self.max_cpu_utilization is not None
+            and self.cpu_utilization > self.max_cpu_utilization
+        ):
+            return False
+
+        return True
+
+    def _sample_cpu_utilization(self) -> None:
+        """Update the CPU utilization if at least one interval has passed since the last sample."""
+        now, process_time = self.time_fn(), self.process_time_fn()
+        last_time, last_process_time = self._last_cpu_sample
+        if now - last_time < self.update_interval_s:
+            return
+
+        self.cpu_utilization = (process_time - last_process_time) / (
+            now - last_time
+        )
+        self._last_cpu_sample = (now, process_time)
+
+    def _run(self) -> None:
+        """Admit queued participants as capacity frees up, until the queue is empty."""
+        while self.queue or self.admitted:
+            self.sio.sleep(self.update_interval_s)
+
+            # Release the slots of admitted participants who never joined.
+            now = self.time_fn()
+            for subject_id, expires_at in list(self.admitted.items()):
+                if now > expires_at:
+                    logger.info(
+                        f"{subject_id} was admitted but didn't join, releasing their slot."
+                    )
+                    del self.admitted[subject_id]
+
+            while self.queue and self.has_capacity():
+                subject_id, room = self.queue.popitem(last=False)
+                self.admitted[subject_id] = now + self.ADMISSION_HOLD_S
+                logger.info(f"Admitting {subject_id} from the queue.")
+                self.sio.emit("admission_granted", {}, room=room)
+
+            for position, (subject_id, room) in enumerate(self.queue.items()):
+                self._emit_position(subject_id, room, position)
+
+        self.driver = None
+
+    def _emit_position(
+        self, subject_id: SubjectID, room: str, position: int
+    ) -> None:
+        self.sio.emit(
+            "admission_queue",
+            {"position": position + 1, "queue_length": len(self.queue)},
+            room=room,
+        )
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            **self.load_fn(),
+            "cpu_utilization": self.cpu_utilization,
+            "queue_length": len(self.queue),
+            "num_held_slots": len(self.admitted),
+            "num_admitted": self.num_admitted,
+            "num_queued": self.num_queued,
+        }
@@ -20,7 +20,7 @@ from interactive_gym.scenes import gym_scene
 from interactive_gym.server import game_manager as gm
 
 from interactive_gym.configurations import remote_config
-from interactive_gym.server import utils
+from interactive_gym.server import admission, policy_registry, utils
 from interactive_gym.scenes import stager
 from interactive_gym.server import game_manager as gm
 from interactive_gym.scenes import unity_scene
@@ -84,8 +84,9 @@ def get_subject_id_from_session_id(session_id: str) -> SubjectID:
 # List of subject names that have entered a game (collected on end_game)
 PROCESSED_SUBJECT_NAMES = []
 
-# Number of games allowed
-MAX_CONCURRENT_SESSIONS: int | None = 1
+# Queues participants for new games when the server is at capacity.
+# Instantiated on run() if any limits are configured.
+ADMISSION_CONTROLLER: admission.AdmissionController | None = None
 
 # Generate a unique identifier for the server session
 SERVER_SESSION_ID = secrets.token_urlsafe(16)
@@ -149,6 +150,9 @@ def register_subject(data):
     sid = flask.request.sid
     flask.session["subject_id"] = subject_id
     SESSION_ID_TO_SUBJECT_ID[sid] = subject_id
+    # Events for a single participant (e.g., the start of a lockstep game,
+    # which differs per player) are emitted to a room named after them.
+    flask_socketio.join_room(subject_id)
     logger.info(f"Registered session ID {sid} with subject {subject_id}")
     participant_stager = STAGERS[subject_id]
     participant_stager.start(socketio, room=sid)
@@ -244,11 +248,27 @@ def join_game(data):
             )
             return
 
+        # If the server is at capacity, the participant is queued and
+        # the client will send `join_game` again once they're admitted.
+        if (
+            ADMISSION_CONTROLLER is not None
+            and not current_scene.run_through_pyodide
+            and not ADMISSION_CONTROLLER.request_admission(
+                subject_id,
+                room=flask.request.sid,
+                needs_new_game=not game_manager.has_waiting_game(),
+            )
+        ):
+            return
+
         game = game_manager.add_subject_to_game(subject_id)
         logger.info(
             f"Successfully added subject {subject_id} to game {game.game_id}."
         )
 
+        if ADMISSION_CONTROLLER is not None:
+            ADMISSION_CONTROLLER.joined(subject_id)
+
 
 def is_valid_session(
     client_session_id: str, subject_id: SubjectID, context: str
@@ -293,10 +313,21 @@ def leave_game(data):
         current_scene = participant_stager.current_scene
         game_manager = GAME_MANAGERS.get(current_scene.scene_id, None)
 
+        if ADMISSION_CONTROLLER is not None:
+            ADMISSION_CONTROLLER.withdraw(subject_id)
+
         game_manager.leave_game(subject_id=subject_id)
         PROCESSED_SUBJECT_NAMES.append(subject_id)
 
 
+@socketio.on("disconnect")
+def withdraw_on_disconnect():
+    """Give up a participant's place in the admission queue if their socket disconnects."""
+    subject_id = get_subject_id_from_session_id(flask.request.sid)
+    if ADMISSION_CONTROLLER is not None and subject_id is not None:
+        ADMISSION_CONTROLLER.withdraw(subject_id, room=flask.request.sid)
+
+
 # @socketio.on("disconnect")
 # def on_disconnect():
 #     global SUBJECTS
@@ -334,29 +365,37 @@ def leave_game(data):
 #         )
 
 
+def get_subject_game_manager(
+    subject_id: SubjectID, event: str
+) -> gm.GameManager | None:
+    """Return the GameManager of a participant's current scene, if they have one."""
+    participant_stager = STAGERS.get(subject_id, None)
+    if participant_stager is None:
+        logger.error(
+            f"{event} received for {subject_id} but they don't have a Stager."
+        )
+        return None
+
+    current_scene = participant_stager.current_scene
+    return GAME_MANAGERS.get(current_scene.scene_id, None)
+
+
 @socketio.on("send_pressed_keys")
 def send_pressed_keys(data):
     """
-    Translate pressed keys into game action and add them to the pending_actions queue.
+    Translate a single keystroke into a game action and add it to the pending_actions queue.
+
+    Only used in single keystroke mode, held keys are pushed with `update_pressed_keys`.
     """
     # return
     # sess_id = flask.request.sid
-    subject_id = get_subject_id_from_session_id(flask.request.sid)
     subject_id = flask.session.get("subject_id")
-    # print(subject_id, sess_id, STAGERS)
 
     # # TODO(chase): figure out why we're getting a different session ID here...
-    participant_stager = STAGERS.get(subject_id, None)
-    if participant_stager is None:
-        logger.error(
-            f"Pressed keys requested for {subject_id} but they don't have a Stager."
-        )
+    game_manager = get_subject_game_manager(subject_id, "Pressed keys")
+    if game_manager is None:
         return
 
-    current_scene = participant_stager.current_scene
-    game_manager = GAME_MANAGERS.get(current_scene.scene_id, None)
-    # game = game_manager.get_subject_game(subject_id)
-
     client_reported_server_session_id = data.get("server_session_id")
     # print(client_reported_server_session_id, "send_pressed_keys")
     # print(sess_id, subject_id, "send_pressed_keys")
@@ -372,6 +411,45 @@ def send_pressed_keys(data):
     )
 
 
+@socketio.on("update_pressed_keys")
+def update_pressed_keys(data):
+    """
+    Record the keys a participant holds down, which their client pushes whenever they change.
+    """
+    subject_id = flask.session.get("subject_id")
+
+    game_manager = get_subject_game_manager(subject_id, "Pressed keys")
+    if game_manager is None:
+        return
+
+    game_manager.update_pressed_keys(
+        subject_id=subject_id,
+        pressed_keys=data["pressed_keys"],
+        sequence_num=data["sequence_num"],
+        client_timestamp=data.get("client_timestamp"),
+    )
+
+
+@socketio.on("lockstep_actions")
+def lockstep_actions(data):
+    """
+    Relay a participant's actions for a tick of a lockstep game to the other players.
+    """
+    subject_id = flask.session.get("subject_id")
+
+    game_manager = get_subject_game_manager(subject_id, "Lockstep actions")
+    if game_manager is None:
+        return
+
+    game_manager.relay_lockstep_actions(
+        subject_id=subject_id,
+        tick=data["tick"],
+        actions=data["actions"],
+        state_hash_tick=data.get("state_hash_tick"),
+        state_hash=data.get("state_hash"),
+    )
+
+
 @socketio.on("reset_complete")
 def handle_reset_complete(data):
     subject_id = get_subject_id_from_session_id(flask.request.sid)
@@ -615,10 +693,37 @@ def receive_remote_game_data(data):
 
 
 def run(config):
-    global app, CONFIG, logger, GENERIC_STAGER
+    global app, CONFIG, logger, GENERIC_STAGER, ADMISSION_CONTROLLER
     CONFIG = config
     GENERIC_STAGER = config.stager
 
+    if any(
+        getattr(CONFIG, limit, None) is not None
+        for limit in [
+            "max_concurrent_games",
+            "max_tick_lag_s",
+            "max_cpu_utilization",
+        ]
+    ):
+        ADMISSION_CONTROLLER = admission.AdmissionController(
+            sio=socketio,
+            load_fn=gm.GameManager.get_server_load,
+            max_concurrent_games=getattr(CONFIG, "max_concurrent_games", None),
+            max_tick_lag_s=getattr(CONFIG, "max_tick_lag_s", None),
+            max_cpu_utilization=getattr(CONFIG, "max_cpu_utilization", None),
+            update_interval_s=getattr(
+                CONFIG, "admission_update_interval_s", 1.0
+            ),
+        )
+
+    # Load every server-side policy up front, so that the first
+    # game to use each one doesn't wait on it.
+    policy_stats = policy_registry.POLICY_REGISTRY.preload(
+        GENERIC_STAGER.scenes
+    )
+    if policy_stats:
+        logger.info(f"Preloaded policies: {policy_stats}")
+
     atexit.register(on_exit)
 
     socketio.run(
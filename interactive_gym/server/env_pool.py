@@ -0,0 +1,142 @@
+"""
+Pools of pre-built environments shared by the games of a scene.
+
+Building an environment can be expensive (e.g., parsing layouts and allocating
+grids), and `RemoteGameV2` would otherwise build one for every pairing, after
+the match has been found. When a scene sets `runtime(env_pool_size=N)`, up to N
+environments are built and reset ahead of time and lent out to new games. When
+a game is removed its environment is reset in the background and returned to
+the pool, so the next game can start without waiting on `env_creator` or
+`env.reset`.
+"""
+
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import typing
+
+import eventlet
+
+from interactive_gym.server import env_worker
+
+logger = logging.getLogger(__name__)
+
+
+class EnvPool:
+    """Environments for a single scene and env_config, kept built and reset."""
+
+    def __init__(self, scene, size: int):
+        assert size >= 1, "Must have an env pool size of at least one!"
+        self.scene = scene
+        self.size = size
+
+        # Idle environments and the result of the reset we already ran on them.
+        self.idle: collections.deque[tuple[typing.Any, tuple]] = (
+            collections.deque()
+        )
+        self.num_preparing: int = 0
+
+        self.num_hits: int = 0
+        self.num_misses: int = 0
+
+    def _make_env(self):
+        if self.scene.num_env_workers > 0:
+            return env_worker.get_env_worker_pool(
+                self.scene.num_env_workers
+            ).make_env(self.scene)
+
+        return self.scene.env_creator(
+            **self.scene.env_config, render_mode="rgb_array"
+        )
+
+    def fill(self) -> None:
+        """Start building environments until the pool is full."""
+        while len(self.idle) + self.num_preparing < self.size:
+            self.num_preparing += 1
+            eventlet.spawn(self._prepare, None)
+
+    def acquire(self) -> tuple[typing.Any, tuple | None]:
+        """Take an environment from the pool.
+
+        Returns the environment and the result of the reset that was already
+        run on it, or a freshly built environment and None if the pool is empty.
+        """
+        if self.idle:
+            self.num_hits += 1
+            env, reset_result = self.idle.popleft()
+        else:
+            self.num_misses += 1
+            logger.info(
+                f"Env pool for scene {self.scene.scene_id} is empty, building an environment."
+            )
+            env, reset_result = self._make_env(), None
+
+        self.fill()
+        return env, reset_result
+
+    def release(self, env) -> None:
+        """Return an environment to the pool once a game is done with it."""
+        if len(self.idle) + self.num_preparing >= self.size:
+            self._close(env)
+            return
+
+        self.num_preparing += 1
+        eventlet.spawn(self._prepare, env)
+
+    def _prepare(self, env) -> None:
+        """Build (if needed) and reset an environment, then make it available."""
+        try:
+            if env is None:
+                env = self._make_env()
+            reset_result = env.reset()
+        except Exception as e:
+            logger.exception(
+                f"Failed to prepare an environment for the env pool of scene {self.scene.scene_id}: {e}"
+            )
+            if env is not None:
+                self._close(env)
+            return
+        finally:
+            self.num_preparing -= 1
+
+        self.idle.append((env, reset_result))
+
+    @staticmethod
+    def _close(env) -> None:
+        try:
+            if hasattr(env, "close"):
+                env.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled environment: {e}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self.size,
+            "num_idle": len(self.idle),
+            "num_preparing": self.num_preparing,
+            "num_hits": self.num_hits,
+            "num_misses": self.num_misses,
+        }
+
+
+# Pools are shared by every GameManager in the process and keyed by the
+# scene and environment configuration they build environments for.
+ENV_POOLS: dict[tuple, EnvPool] = {}
+
+
+def _pool_key(scene) -> tuple:
+    return (
+        scene.scene_id,
+        json.dumps(scene.env_config, sort_keys=True, default=str),
+        scene.num_env_workers,
+    )
+
+
+def get_env_pool(scene) -> EnvPool:
+    """Return the env pool for this scene and env_config, creating it if necessary."""
+    key = _pool_key(scene)
+    if key not in ENV_POOLS:
+        ENV_POOLS[key] = EnvPool(scene, scene.env_pool_size)
+    return ENV_POOLS[key]
@@ -0,0 +1,373 @@
+"""
+Out-of-process environment workers for server-mode games.
+
+By default, `RemoteGameV2` builds its environment in the Flask-SocketIO process, so
+every `env.step` and render runs on the eventlet hub and a single CPU-heavy
+environment stalls socket I/O for every other participant. When a scene sets
+`runtime(num_env_workers=N)`, environments are instead created inside a pool of
+N worker processes and `RemoteEnv` proxies `reset`, `step`, `render`, and the
+scene's `env_to_state_fn` over a pipe. Waiting on a worker only blocks the
+calling greenlet, so a single server can use all of its cores.
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import functools
+import itertools
+import logging
+import multiprocessing
+import threading
+import traceback
+import typing
+
+from eventlet import hubs
+
+logger = logging.getLogger(__name__)
+
+
+class EnvWorkerError(RuntimeError):
+    """Raised in the server process when a command fails inside an env worker."""
+
+
+# Commands understood by the worker process.
+_MAKE = "make"
+_RESET = "reset"
+_STEP = "step"
+_STEP_BATCH = "step_batch"
+_RENDER = "render"
+_ENV_TO_STATE = "env_to_state"
+_GETATTR = "getattr"
+_CALL = "call"
+_CLOSE = "close"
+_SHUTDOWN = "shutdown"
+
+# Attributes we read once when the environment is created so that the
+# proxy doesn't need a round trip every time they're accessed.
+_CACHED_ATTRIBUTES = ["action_space", "observation_space", "render_mode"]
+
+
+def _step_env(env, actions):
+    """Step an environment with the players' actions, as `RemoteGameV2.step_env` does.
+
+    Single-agent environments (e.g., Slime Volleyball) fail an assertion when
+    stepped with a dict of actions, so they're stepped with the only action.
+    """
+    try:
+        return env.step(actions)
+    except AssertionError:
+        return env.step(list(actions.values())[0])
+
+
+def _worker_main(conn) -> None:
+    """Entry point of a worker process: serve commands for the envs it hosts."""
+    envs = {}
+    render_fns = {}
+
+    while True:
+        try:
+            cmd, env_id, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if cmd == _SHUTDOWN:
+            break
+
+        try:
+            if cmd == _MAKE:
+                env_creator, env_kwargs, env_to_state_fn, scene = payload
+                env = env_creator(**env_kwargs)
+                envs[env_id] = env
+                render_fns[env_id] = (env_to_state_fn, scene)
+
+                # Only send back attributes that can be pickled directly;
+                # callables (e.g., PettingZoo's `action_space(agent)`) are
+                # resolved on access through _CALL.
+                result = {
+                    attr: getattr(env, attr)
+                    for attr in _CACHED_ATTRIBUTES
+                    if hasattr(env, attr) and not callable(getattr(env, attr))
+                }
+            elif cmd == _RESET:
+                result = envs[env_id].reset(**payload)
+            elif cmd == _STEP:
+                result = _step_env(envs[env_id], payload)
+            elif cmd == _STEP_BATCH:
+                # Step every env in the batch, reporting failures per env so
+                # that one bad step doesn't fail the rest of the batch.
+                result = []
+                for batch_env_id, actions in payload:
+                    try:
+                        result.append(
+                            (True, _step_env(envs[batch_env_id], actions))
+                        )
+                    except Exception:
+                        result.append((False, traceback.format_exc()))
+            elif cmd == _RENDER:
+                result = envs[env_id].render()
+            elif cmd == _ENV_TO_STATE:
+                env_to_state_fn, scene = render_fns[env_id]
+                result = env_to_state_fn(envs[env_id], scene)
+            elif cmd == _GETATTR:
+                value = getattr(envs[env_id], payload)
+                result = (True, None) if callable(value) else (False, value)
+            elif cmd == _CALL:
+                name, args, kwargs = payload
+                result = getattr(envs[env_id], name)(*args, **kwargs)
+            elif cmd == _CLOSE:
+                env = envs.pop(env_id, None)
+                render_fns.pop(env_id, None)
+                if env is not None and hasattr(env, "close"):
+                    env.close()
+                result = None
+            else:
+                raise ValueError(f"Unrecognized env worker command: {cmd}")
+
+            conn.send((True, result))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+
+
+class EnvWorker:
+    """Handle on a single worker process and the pipe used to talk to it."""
+
+    def __init__(self, ctx: multiprocessing.context.BaseContext, index: int):
+        self.index = index
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn,),
+            daemon=True,
+            name=f"interactive-gym-env-worker-{index}",
+        )
+        self.process.start()
+        child_conn.close()
+
+        # Requests are strictly request/response, so only one
+        # greenlet may talk to the worker at a time.
+        self.lock = threading.Lock()
+        self.num_envs: int = 0
+
+    def request(self, cmd: str, env_id: int, payload: typing.Any = None):
+        with self.lock:
+            self.conn.send((cmd, env_id, payload))
+
+            # Wait for the response without blocking the eventlet hub.
+            hubs.trampoline(self.conn.fileno(), read=True)
+            ok, result = self.conn.recv()
+
+        if not ok:
+            raise EnvWorkerError(
+                f"Command `{cmd}` failed in env worker {self.index}:\n{result}"
+            )
+        return result
+
+    def send_batch(self, batch: list[tuple[int, typing.Any]]) -> None:
+        """Send a batch of steps, holding the lock until `recv_batch`."""
+        self.lock.acquire()
+        try:
+            self.conn.send((_STEP_BATCH, None, batch))
+        except Exception:
+            self.lock.release()
+            raise
+
+    def recv_batch(self) -> list[tuple[bool, typing.Any]]:
+        """Receive the results of the batch sent with `send_batch`.
+
+        Each env's result is `(True, step_result)` or, if its step raised,
+        `(False, traceback)`.
+        """
+        try:
+            hubs.trampoline(self.conn.fileno(), read=True)
+            ok, result = self.conn.recv()
+        finally:
+            self.lock.release()
+
+        if not ok:
+            raise EnvWorkerError(
+                f"Command `{_STEP_BATCH}` failed in env worker {self.index}:\n{result}"
+            )
+        return result
+
+    def shutdown(self) -> None:
+        try:
+            self.conn.send((_SHUTDOWN, None, None))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class RemoteEnv:
+    """
+    Proxy to an environment that lives in an env worker process.
+
+    Exposes the parts of the Gymnasium API that `RemoteGameV2` and
+    `GameManager` use. Any other attribute is fetched from the worker on
+    access (and methods are called remotely), so callbacks that inspect
+    `remote_game.env` keep working, at the cost of a round trip per access.
+    """
+
+    def __init__(self, worker: EnvWorker, env_id: int, attributes: dict):
+        # Set through __dict__ to avoid going through __getattr__.
+        self.__dict__["_worker"] = worker
+        self.__dict__["_env_id"] = env_id
+        self.__dict__["_closed"] = False
+        self.__dict__.update(attributes)
+
+    def reset(self, seed: int | None = None, options: dict | None = None):
+        return self._worker.request(
+            _RESET, self._env_id, {"seed": seed, "options": options}
+        )
+
+    def step(self, actions):
+        return self._worker.request(_STEP, self._env_id, actions)
+
+    def render(self):
+        return self._worker.request(_RENDER, self._env_id)
+
+    def env_to_state(self):
+        """Run the scene's `env_to_state_fn` on the environment inside the worker."""
+        return self._worker.request(_ENV_TO_STATE, self._env_id)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.__dict__["_closed"] = True
+        self._worker.request(_CLOSE, self._env_id)
+        self._worker.num_envs -= 1
+
+    def _call(self, name: str, *args, **kwargs):
+        return self._worker.request(
+            _CALL, self._env_id, (name, args, kwargs)
+        )
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        is_callable, value = self._worker.request(_GETATTR, self._env_id, name)
+        if is_callable:
+            return functools.partial(self._call, name)
+        return value
+
+
+def step_many(
+    envs: list[RemoteEnv],
+    actions: list[typing.Any],
+    wait_fn: typing.Callable[[list[int]], None] | None = None,
+) -> list[tuple | EnvWorkerError]:
+    """Step many remote envs with a single round trip per worker.
+
+    All batches are sent before any results are read, so the workers step
+    their envs in parallel. Returns the step result for each env, or an
+    `EnvWorkerError` if its step raised inside the worker (in which case
+    the env may have been partly stepped).
+
+    :param wait_fn: Called with the indices of a worker's envs before waiting on its results, e.g., to track which envs a stall is on.
+    """
+    batches: dict[int, tuple[EnvWorker, list, list[int]]] = {}
+    for i, (env, env_actions) in enumerate(zip(envs, actions)):
+        worker = env._worker
+        _, batch, indices = batches.setdefault(
+            worker.index, (worker, [], [])
+        )
+        batch.append((env._env_id, env_actions))
+        indices.append(i)
+
+    # Acquire the workers in a fixed order so that concurrent callers
+    # can't deadlock on each other.
+    sent = []
+    error = None
+    for index in sorted(batches):
+        worker, batch, indices = batches[index]
+        try:
+            worker.send_batch(batch)
+        except Exception as e:
+            error = e
+            break
+        sent.append((worker, indices))
+
+    # Always drain every worker we sent to, so its lock is released and the
+    # pipe is left in a consistent state.
+    results: list[tuple | EnvWorkerError | None] = [None] * len(envs)
+    for worker, indices in sent:
+        if wait_fn is not None:
+            wait_fn(indices)
+        try:
+            for i, (ok, result) in zip(indices, worker.recv_batch()):
+                results[i] = (
+                    result
+                    if ok
+                    else EnvWorkerError(
+                        f"Step failed in env worker {worker.index}:\n{result}"
+                    )
+                )
+        except Exception as e:
+            error = error or e
+
+    if error is not None:
+        raise error
+
+    return results
+
+
+class EnvWorkerPool:
+    """Pool of worker processes that host environments for server-mode games."""
+
+    def __init__(self, num_workers: int):
+        assert num_workers >= 1, "Must have at least one env worker!"
+
+        # Forking a process with a running eventlet hub isn't safe,
+        # so workers are always started fresh.
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [EnvWorker(ctx, i) for i in range(num_workers)]
+        self._env_ids = itertools.count()
+
+        logger.info(f"Started {num_workers} env worker processes.")
+
+    def make_env(self, scene) -> RemoteEnv:
+        """Create the scene's environment in the least loaded worker."""
+        worker = min(self.workers, key=lambda w: w.num_envs)
+        env_id = next(self._env_ids)
+
+        # The scene is needed by `env_to_state_fn`, but the socket and
+        # callback only make sense in the server process.
+        render_scene = None
+        if scene.env_to_state_fn is not None:
+            render_scene = copy.copy(scene)
+            render_scene.sio = None
+            render_scene.callback = None
+
+        attributes = worker.request(
+            _MAKE,
+            env_id,
+            (
+                scene.env_creator,
+                {**(scene.env_config or {}), "render_mode": "rgb_array"},
+                scene.env_to_state_fn,
+                render_scene,
+            ),
+        )
+        worker.num_envs += 1
+
+        return RemoteEnv(worker, env_id, attributes)
+
+    def shutdown(self) -> None:
+        for worker in self.workers:
+            worker.shutdown()
+
+
+# Env workers are shared by every GameManager in the process.
+ENV_WORKER_POOL: EnvWorkerPool | None = None
+
+
+def get_env_worker_pool(num_workers: int) -> EnvWorkerPool:
+    """Return the process-wide env worker pool, starting it if necessary."""
+    global ENV_WORKER_POOL
+    if ENV_WORKER_POOL is None:
+        ENV_WORKER_POOL = EnvWorkerPool(num_workers)
+        atexit.register(ENV_WORKER_POOL.shutdown)
+    return ENV_WORKER_POOL
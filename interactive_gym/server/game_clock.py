@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import time
+import typing
+
+from interactive_gym.configurations import configuration_constants
+
+
+class GameClock:
+    """
+    Fixed-timestep clock that paces a server-side game loop against
+    absolute deadlines.
+
+    Rather than sleeping for a full frame after the tick, render, and emit
+    are done (which makes the real period 1/fps plus all of that work), the
+    clock keeps a running deadline for the next tick and only sleeps for what
+    is left of the frame budget. If the loop falls behind, `wait()` reports
+    how many ticks are due so that the caller can catch up, or the missed
+    ticks are skipped, depending on the catch-up policy.
+    """
+
+    # Smoothing factor for the exponential moving average of the tick lag.
+    LAG_EMA_ALPHA = 0.1
+
+    def __init__(
+        self,
+        fps: int | float,
+        catchup_policy: str = configuration_constants.TickCatchupPolicies.CatchUp,
+        max_catchup_ticks: int = 5,
+        sleep_fn: typing.Callable[[float], None] = time.sleep,
+        time_fn: typing.Callable[[], float] = time.monotonic,
+    ):
+        assert fps > 0, "Must pass a positive fps to the GameClock!"
+        assert catchup_policy in [
+            configuration_constants.TickCatchupPolicies.CatchUp,
+            configuration_constants.TickCatchupPolicies.Skip,
+        ], f"Unrecognized catch-up policy: {catchup_policy}"
+        assert max_catchup_ticks >= 1, "max_catchup_ticks must be >= 1."
+
+        self.period_s: float = 1 / fps
+        self.catchup_policy = catchup_policy
+        self.max_catchup_ticks = max_catchup_ticks
+        self.sleep_fn = sleep_fn
+        self.time_fn = time_fn
+
+        self.next_deadline: float | None = None
+        self.last_tick_time: float | None = None
+
+        # Tick lag statistics, all in seconds. Lag is how late we woke up
+        # relative to the deadline of the tick we're about to run.
+        self.lag_s: float = 0.0
+        self.mean_lag_s: float = 0.0
+        self.max_lag_s: float = 0.0
+        self.num_ticks: int = 0
+        self.num_late_ticks: int = 0
+        self.num_caught_up_ticks: int = 0
+        self.num_skipped_ticks: int = 0
+
+    def start(self) -> None:
+        """(Re)anchor the clock so the next tick is due one period from now."""
+        now = self.time_fn()
+        self.next_deadline = now + self.period_s
+        self.last_tick_time = now
+
+    def set_fps(self, fps: int | float) -> None:
+        """Change the tick rate, keeping the current deadline."""
+        assert fps > 0, "Must pass a positive fps to the GameClock!"
+        self.period_s = 1 / fps
+
+    def wait(self) -> int:
+        """Sleep until the next deadline and return the number of ticks due.
+
+        If we're on time, this sleeps for the remainder of the frame budget
+        and returns 1. If we're late, it doesn't sleep and returns the number
+        of ticks to run back-to-back (CatchUp, bounded by `max_catchup_ticks`)
+        or 1 with the missed ticks dropped (Skip).
+        """
+        if self.next_deadline is None:
+            self.start()
+
+        now = self.time_fn()
+        remaining = self.next_deadline - now
+        if remaining > 0:
+            self.sleep_fn(remaining)
+            now = self.time_fn()
+        else:
+            # Always yield so a loop that is behind doesn't starve the hub.
+            self.sleep_fn(0)
+
+        lag = max(0.0, now - self.next_deadline)
+        ticks_behind = int(lag // self.period_s)
+        ticks_due = 1
+
+        if ticks_behind > 0:
+            if (
+                self.catchup_policy
+                == configuration_constants.TickCatchupPolicies.CatchUp
+            ):
+                ticks_due = min(1 + ticks_behind, self.max_catchup_ticks)
+                self.num_caught_up_ticks += ticks_due - 1
+
+            # Anything we aren't going to run is dropped and the deadline
+            # moves forward accordingly.
+            skipped = 1 + ticks_behind - ticks_due
+            self.num_skipped_ticks += skipped
+            self.next_deadline += skipped * self.period_s
+
+        self.next_deadline += ticks_due * self.period_s
+        self.last_tick_time = now
+        self._record_lag(lag, ticks_due, late=ticks_behind > 0)
+
+        return ticks_due
+
+    def _record_lag(self, lag: float, ticks_due: int, late: bool) -> None:
+        self.lag_s = lag
+        self.max_lag_s = max(self.max_lag_s, lag)
+        if self.num_ticks == 0:
+            self.mean_lag_s = lag
+        else:
+            self.mean_lag_s += self.LAG_EMA_ALPHA * (lag - self.mean_lag_s)
+
+        self.num_ticks += ticks_due
+        if late:
+            self.num_late_ticks += 1
+
+    def stats(self) -> dict[str, float | int]:
+        """Return a summary of the tick lag for logging and monitoring."""
+        return {
+            "fps": 1 / self.period_s,
+            "lag_s": self.lag_s,
+            "mean_lag_s": self.mean_lag_s,
+            "max_lag_s": self.max_lag_s,
+            "num_ticks": self.num_ticks,
+            "num_late_ticks": self.num_late_ticks,
+            "num_caught_up_ticks": self.num_caught_up_ticks,
+            "num_skipped_ticks": self.num_skipped_ticks,
+        }
+
+
+class EmitThrottle:
+    """
+    Lowers how often a game's state is emitted when its loop is overloaded.
+
+    Rendering and emitting the state is usually the most expensive part of
+    a tick, so when the clock reports that ticks are running late, the
+    throttle emits only every k-th frame (up to `max_emit_interval`) rather
+    than letting the simulation itself slow down. Once the lag recovers,
+    the interval is lowered back to 1. Changes are made at most once per
+    `window_ticks` so that the interval doesn't oscillate.
+    """
+
+    def __init__(
+        self,
+        max_emit_interval: int,
+        window_ticks: int,
+        overload_lag_fraction: float = 0.5,
+        recover_lag_fraction: float = 0.1,
+    ):
+        """
+        :param max_emit_interval: Largest k to emit every k-th frame at.
+        :param window_ticks: Minimum number of ticks between changes to the interval.
+        :param overload_lag_fraction: Mean lag, as a fraction of the tick period, above which the interval is raised.
+        :param recover_lag_fraction: Mean lag, as a fraction of the tick period, below which the interval is lowered.
+        """
+        assert max_emit_interval >= 1, "max_emit_interval must be >= 1."
+        self.max_emit_interval = max_emit_interval
+        self.window_ticks = window_ticks
+        self.overload_lag_fraction = overload_lag_fraction
+        self.recover_lag_fraction = recover_lag_fraction
+
+        self.emit_interval: int = 1
+        self.ticks_since_change: int = 0
+
+    def update(self, clock: GameClock) -> bool:
+        """Adjust the emit interval to the clock's lag, returning whether it changed."""
+        self.ticks_since_change += 1
+        if self.ticks_since_change < self.window_ticks:
+            return False
+
+        lag_fraction = clock.mean_lag_s / clock.period_s
+        new_interval = self.emit_interval
+        if (
+            lag_fraction > self.overload_lag_fraction
+            and self.emit_interval < self.max_emit_interval
+        ):
+            new_interval += 1
+        elif (
+            lag_fraction < self.recover_lag_fraction
+            and self.emit_interval > 1
+        ):
+            new_interval -= 1
+
+        if new_interval == self.emit_interval:
+            return False
+
+        self.emit_interval = new_interval
+        self.ticks_since_change = 0
+        return True
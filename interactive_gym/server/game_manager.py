@@ -2,11 +2,14 @@ from __future__ import annotations
 from typing import Any
 
 import base64
+import contextlib
+import dataclasses
 import itertools
 import logging
 import random
 import time
 import uuid
+import weakref
 
 import eventlet
 import flask
@@ -31,9 +34,27 @@ from interactive_gym.configurations import (
     configuration_constants,
     remote_config,
 )
-from interactive_gym.server import remote_game, utils
+from interactive_gym.server import (
+    env_pool,
+    env_worker,
+    game_clock,
+    game_scheduler,
+    lockstep,
+    remote_game,
+    state_encoding,
+    utils,
+)
 from interactive_gym.scenes import stager, gym_scene, scene
-import flask_socketio
+
+
+@dataclasses.dataclass
+class PressedKeysState:
+    """The keys a subject last reported holding down (in `PressedKeys` input mode)."""
+
+    pressed_keys: list[str]
+    sequence_num: int
+    client_timestamp: float | None
+    received_at: float
 
 
 class GameManager:
@@ -42,6 +63,14 @@ class GameManager:
     and the games being played for a particular Scene.
     """
 
+    END_STATUSES = [
+        remote_game.GameStatus.Inactive,
+        remote_game.GameStatus.Done,
+    ]
+
+    # Every GameManager in the process, for measuring the server's load.
+    INSTANCES: weakref.WeakSet[GameManager] = weakref.WeakSet()
+
     def __init__(
         self,
         scene: gym_scene.GymScene,
@@ -50,6 +79,7 @@ class GameManager:
     ):
         assert isinstance(scene, gym_scene.GymScene)
         self.scene = scene
+        GameManager.INSTANCES.add(self)
         self.experiment_config = experiment_config
         self.sio = sio
 
@@ -67,6 +97,13 @@ class GameManager:
         # save subject IDs and the room they are in
         self.subject_rooms: dict[SubjectID] = utils.ThreadSafeDict()
 
+        # In PressedKeys input mode, clients push the keys they hold down
+        # whenever that changes, and we keep the latest state of each subject
+        # to turn into their action on every tick.
+        self.subject_pressed_keys: dict[SubjectID, PressedKeysState] = (
+            utils.ThreadSafeDict()
+        )
+
         # Games that are currently being played
         self.active_games = utils.ThreadSafeSet()
 
@@ -78,6 +115,104 @@ class GameManager:
         # this is not used when running with Pyodide
         self.reset_events = utils.ThreadSafeDict()
 
+        # Deadline-based clocks that pace each server-side game loop
+        # and track its tick lag.
+        self.game_clocks: dict[GameID, game_clock.GameClock] = (
+            utils.ThreadSafeDict()
+        )
+
+        # When using the multiplexed scheduler, a single driver ticks every
+        # game in this scene rather than running one loop per game. Games that
+        # are waiting on their reset barrier are tracked with the time at which
+        # the reset should be emitted (None once it has been).
+        self.scheduler: game_scheduler.MultiplexedGameScheduler | None = None
+        if (
+            self.scene.game_scheduler
+            == configuration_constants.GameSchedulers.Multiplexed
+        ):
+            self.scheduler = game_scheduler.MultiplexedGameScheduler(
+                fps=self.scene.fps,
+                start_fn=self._start_scheduled_game,
+                step_fn=self._step_scheduled_game,
+                batch_step_fn=(
+                    self._tick_scheduled_games
+                    if self.scene.batched_env_step
+                    else None
+                ),
+                error_fn=self._end_failed_scheduled_game,
+                catchup_policy=self.scene.tick_catchup_policy,
+                max_catchup_ticks=self.scene.max_catchup_ticks,
+                sleep_fn=self.sio.sleep,
+                spawn_fn=self.sio.start_background_task,
+            )
+        self.pending_game_resets: dict[GameID, float | None] = (
+            utils.ThreadSafeDict()
+        )
+
+        # With batched env stepping, the IDs of the games that were ticked
+        # in the batch at the start of the current scheduler pass.
+        self.batch_ticked_games = utils.ThreadSafeSet()
+
+        # With double-buffered resets, the next episode is prepared while the
+        # players are in the reset countdown. These hold an event that's sent
+        # once the preparation is done, and the first render of the episode.
+        self.reset_preparations: dict[GameID, eventlet.event.Event] = (
+            utils.ThreadSafeDict()
+        )
+        self.prepared_renders: dict[GameID, tuple] = utils.ThreadSafeDict()
+
+        # Per-game throttles that lower the emit rate under overload,
+        # if the scene opted into it.
+        self.emit_throttles: dict[GameID, game_clock.EmitThrottle] = (
+            utils.ThreadSafeDict()
+        )
+
+        # Per-room encoders that send only what changed in the state,
+        # if the scene opted into delta encoding.
+        self.state_encoders: dict[GameID, state_encoding.StateDeltaEncoder] = (
+            utils.ThreadSafeDict()
+        )
+
+        # Per-game relays of the players' actions, for Pyodide scenes
+        # that are played in lockstep.
+        self.lockstep_relays: dict[GameID, lockstep.LockstepRelay] = (
+            utils.ThreadSafeDict()
+        )
+
+        # The supervisor periodically checks for games that stopped ticking
+        # or are stuck on their reset barrier and reclaims them. It tracks
+        # the per-game loops (so they can be killed) and when each reset
+        # barrier started.
+        self.supervisor = None
+        self.game_loops: dict[GameID, Any] = utils.ThreadSafeDict()
+        self.reset_barrier_starts: dict[GameID, float] = utils.ThreadSafeDict()
+        self.num_reaped_games: int = 0
+
+        # Start building environments for the scene's env pool so that
+        # they're ready by the time the first games are matched.
+        if self.scene.env_pool_size > 0 and not self.scene.run_through_pyodide:
+            env_pool.get_env_pool(self.scene).fill()
+
+    @classmethod
+    def get_server_load(cls) -> dict[str, float | int]:
+        """Measure the load across every GameManager in the process.
+
+        Returns the number of games (including those waiting for players) and
+        the worst mean tick lag of any running game.
+        """
+        num_games = 0
+        tick_lag_s = 0.0
+        for game_manager in list(cls.INSTANCES):
+            num_games += len(game_manager.games)
+            for clock in list(game_manager.game_clocks.values()):
+                tick_lag_s = max(tick_lag_s, clock.mean_lag_s)
+
+        return {"num_games": num_games, "tick_lag_s": tick_lag_s}
+
+    def has_waiting_game(self) -> bool:
+        """Whether a new subject would join an existing game rather than create one."""
+        return len(self.waiting_games) > 0
+
     def subject_in_game(self, subject_id: SubjectID) -> bool:
         return subject_id in self.subject_games
 
@@ -128,12 +263,43 @@ class GameManager:
         if game_id in self.waiting_games:
             self.waiting_games.remove(game_id)
 
+        game = self.games.get(game_id)
+        if game is not None:
+            # The game's loop renders the env outside of its ticks, so wait
+            # until it's done with the env before handing it back.
+            with game.lock:
+                game.release_env()
+
         if game_id in self.games:
             del self.games[game_id]
         if game_id in self.reset_events:
             del self.reset_events[game_id]
         if game_id in self.waitroom_timeouts:
             del self.waitroom_timeouts[game_id]
+        if game_id in self.game_clocks:
+            del self.game_clocks[game_id]
+        if game_id in self.pending_game_resets:
+            del self.pending_game_resets[game_id]
+        if game_id in self.reset_preparations:
+            del self.reset_preparations[game_id]
+        if game_id in self.reset_barrier_starts:
+            del self.reset_barrier_starts[game_id]
+        if game_id in self.game_loops:
+            del self.game_loops[game_id]
+        if game_id in self.emit_throttles:
+            del self.emit_throttles[game_id]
+        if game_id in self.state_encoders:
+            del self.state_encoders[game_id]
+        if game_id in self.lockstep_relays:
+            logger.info(
+                f"Lockstep stats for game {game_id}: {self.lockstep_relays[game_id].stats()}"
+            )
+            del self.lockstep_relays[game_id]
+        if game_id in self.prepared_renders:
+            del self.prepared_renders[game_id]
+        if self.scheduler is not None:
+            self.scheduler.remove_game(game_id)
+        self.batch_ticked_games.remove(game_id)
         if game_id in self.active_games:
             self.active_games.remove(game_id)
         if game_id in self.waiting_games:
@@ -164,9 +330,16 @@ class GameManager:
         with game.lock:
             self.subject_games[subject_id] = game.game_id
             self.subject_rooms[subject_id] = game.game_id
+            # A rejoining client (e.g., after a refresh) restarts its sequence numbers.
+            if subject_id in self.subject_pressed_keys:
+                del self.subject_pressed_keys[subject_id]
             self.reset_events[game.game_id][subject_id] = eventlet.event.Event()
             flask_socketio.join_room(game.game_id)
 
+            # The new participant needs the full state before any deltas.
+            if game.game_id in self.state_encoders:
+                self.state_encoders[game.game_id].request_keyframe()
+
             available_human_agent_ids = game.get_available_human_agent_ids()
             if not available_human_agent_ids:
                 logger.warning(
@@ -195,7 +368,7 @@ class GameManager:
             if game.is_ready_to_start():
                 self.start_game(game)
             else:
-                self.send_participant_to_waiting_room(game, subject_id)
+                self.send_participant_to_waiting_room(subject_id)
 
         return game
 
@@ -212,7 +385,7 @@ class GameManager:
             "waiting_room",
             {
                 "cur_num_players": game.cur_num_human_players(),
-                "players_needed": len(game.get_available_human_player_ids()),
+                "players_needed": len(game.get_available_human_agent_ids()),
                 "ms_remaining": remaining_wait_time,
             },
             room=subject_id,
@@ -332,6 +505,8 @@ class GameManager:
         # Remove the subject from the game
         del self.subject_games[subject_id]
         del self.subject_rooms[subject_id]
+        if subject_id in self.subject_pressed_keys:
+            del self.subject_pressed_keys[subject_id]
 
         # Use flask_socketio.leave_room instead of self.sio.leave_room
         flask_socketio.leave_room(game_id)
@@ -347,25 +522,182 @@ class GameManager:
         )
         self.active_games.add(game.game_id)
 
-        self.sio.emit(
-            "start_game",
-            {
-                "scene_metadata": self.scene.scene_metadata,
-                # "experiment_config": self.experiment_config.to_dict(),
-            },
-            room=game.game_id,
-        )
+        if self.scene.run_through_pyodide and self.scene.lockstep:
+            # Each client needs the agent it controls, so they're started individually.
+            relay = lockstep.LockstepRelay(
+                player_agent_ids={
+                    subject_id: agent_id
+                    for agent_id, subject_id in game.human_players.items()
+                    if subject_id != utils.Available
+                },
+                seed=random.randint(0, 2**31 - 1),
+            )
+            self.lockstep_relays[game.game_id] = relay
+            for subject_id in relay.player_agent_ids:
+                self.sio.emit(
+                    "start_game",
+                    {
+                        "scene_metadata": self.scene.scene_metadata,
+                        "lockstep": relay.start_payload(subject_id),
+                    },
+                    room=subject_id,
+                )
+        else:
+            self.sio.emit(
+                "start_game",
+                {
+                    "scene_metadata": self.scene.scene_metadata,
+                    # "experiment_config": self.experiment_config.to_dict(),
+                },
+                room=game.game_id,
+            )
 
         if not self.scene.run_through_pyodide:
-            self.sio.start_background_task(self.run_server_game, game)
+            if (
+                self.scene.degradation_policy
+                == configuration_constants.DegradationPolicies.ReduceEmitRate
+            ):
+                self.emit_throttles[game.game_id] = game_clock.EmitThrottle(
+                    max_emit_interval=self.scene.max_emit_interval,
+                    window_ticks=max(1, int(self.scene.fps)),
+                )
+
+            if self.scheduler is not None:
+                self.game_clocks[game.game_id] = self.scheduler.clock
+                self.scheduler.add_game(game)
+            else:
+                self.game_loops[game.game_id] = self.sio.start_background_task(
+                    self.run_server_game, game
+                )
+
+            if self.supervisor is None and (
+                self.scene.stalled_game_timeout_s is not None
+                or self.scene.reset_barrier_timeout_s is not None
+            ):
+                self.supervisor = self.sio.start_background_task(
+                    self.supervise_games
+                )
 
     def run_server_game(self, game: remote_game.RemoteGameV2):
-        """Run a remote game on the server."""
-        end_status = [
-            remote_game.GameStatus.Inactive,
-            remote_game.GameStatus.Done,
-        ]
+        """Run a remote game on the server in its own loop."""
+        clock = game_clock.GameClock(
+            fps=self.scene.fps,
+            catchup_policy=self.scene.tick_catchup_policy,
+            max_catchup_ticks=self.scene.max_catchup_ticks,
+            sleep_fn=self.sio.sleep,
+        )
+        self.game_clocks[game.game_id] = clock
+
+        self._start_server_game(game)
+
+        # The first tick runs immediately, after which the clock
+        # schedules ticks against absolute deadlines.
+        clock.start()
+        ticks_due = 1
+
+        while game.status not in self.END_STATUSES:
+            self._advance_server_game(game, ticks_due)
 
+            if game.status == remote_game.GameStatus.Reset:
+                eventlet.sleep(self.scene.reset_freeze_s)
+                self._emit_game_reset(game)
+
+                game.reset_event.wait()
+
+                self._finish_server_game_reset(game)
+
+                # Re-anchor the deadlines so the time spent waiting on the
+                # reset isn't treated as lag to catch up on.
+                clock.start()
+
+            if game.status not in self.END_STATUSES:
+                ticks_due = clock.wait()
+                self._update_emit_rate(game, clock)
+
+        self._end_server_game(game)
+
+    def _start_scheduled_game(self, game: remote_game.RemoteGameV2) -> None:
+        """Start a game that was added to the multiplexed scheduler."""
+        try:
+            self._start_server_game(game)
+        except Exception as e:
+            logger.exception(
+                f"Error starting game {game.game_id} on the scheduler: {e}"
+            )
+            self._end_server_game(game)
+
+    def _end_failed_scheduled_game(
+        self, game: remote_game.RemoteGameV2, error: Exception
+    ) -> None:
+        """End a game that raised while the multiplexed scheduler was ticking it."""
+        game.status = remote_game.GameStatus.Done
+        try:
+            self._end_server_game(game)
+        except Exception as e:
+            logger.exception(f"Error ending failed game {game.game_id}: {e}")
+            if game.game_id in self.games:
+                self._remove_game(game.game_id)
+
+    def _step_scheduled_game(
+        self, game: remote_game.RemoteGameV2, ticks_due: int
+    ) -> bool:
+        """Advance a game on the multiplexed scheduler by one pass.
+
+        Unlike `run_server_game`, this never blocks: games waiting on their
+        reset barrier are checked on each pass and reset once every player
+        has confirmed. Returns whether the game should stay in the tick set.
+        """
+        # The game may have been cleaned up elsewhere (e.g., all players left).
+        if game.game_id not in self.games:
+            return False
+
+        # Games ticked in this pass's batch still need to be rendered even
+        # if their episode just ended.
+        ticked_in_batch = game.game_id in self.batch_ticked_games
+        self.batch_ticked_games.remove(game.game_id)
+
+        try:
+            if (
+                game.status == remote_game.GameStatus.Active
+                or ticked_in_batch
+            ):
+                self._update_emit_rate(game, self.scheduler.clock)
+                self._advance_server_game(
+                    game, 0 if self.scheduler.batch_step_fn else ticks_due
+                )
+
+                if game.status == remote_game.GameStatus.Reset:
+                    self.pending_game_resets[game.game_id] = (
+                        time.monotonic() + self.scene.reset_freeze_s
+                    )
+
+            elif game.status == remote_game.GameStatus.Reset:
+                emit_reset_at = self.pending_game_resets.get(game.game_id)
+                if emit_reset_at is not None:
+                    if time.monotonic() >= emit_reset_at:
+                        self._emit_game_reset(game)
+                        self.pending_game_resets[game.game_id] = None
+                elif (
+                    game.reset_event.ready()
+                    and self._is_reset_prepared(game.game_id)
+                ):
+                    del self.pending_game_resets[game.game_id]
+                    self._finish_server_game_reset(game)
+
+        except Exception as e:
+            logger.exception(
+                f"Error advancing game {game.game_id} on the scheduler: {e}"
+            )
+            game.status = remote_game.GameStatus.Done
+
+        if game.status in self.END_STATUSES:
+            self._end_server_game(game)
+            return False
+
+        return True
+
+    def _start_server_game(self, game: remote_game.RemoteGameV2) -> None:
+        """Reset a game for its first episode and render the initial state."""
         with game.lock:
             game.reset()
 
@@ -374,69 +706,135 @@ class GameManager:
 
         self.render_server_game(game)
 
-        while game.status not in end_status:
-
-            with game.lock:
-                if self.scene.callback is not None:
-                    self.scene.callback.on_game_tick_start(game)
-
-                game.tick()
+    def _advance_server_game(
+        self, game: remote_game.RemoteGameV2, ticks_due: int
+    ) -> None:
+        """Run the ticks that are due for a game and render the result."""
+        # If we fell behind, run the ticks that are due back-to-back
+        # (according to the catch-up policy) and only render the last one.
+        for _ in range(ticks_due):
+            self._tick_server_game(game)
+            if game.status != remote_game.GameStatus.Active:
+                break
 
-                if self.scene.callback is not None:
-                    self.scene.callback.on_game_tick_end(game)
+        self.render_server_game(game)
 
-            self.render_server_game(game)
+        if (
+            game.status == remote_game.GameStatus.Reset
+            or game.status == remote_game.GameStatus.Done
+        ):
+            if self.scene.callback is not None:
+                self.scene.callback.on_episode_end(game)
 
-            if (
-                self.scene.input_mode
-                == configuration_constants.InputModes.PressedKeys
-            ):
-                self.sio.emit("request_pressed_keys", {})
+        if (
+            game.status == remote_game.GameStatus.Reset
+            and self.scene.double_buffered_reset
+        ):
+            self._start_reset_preparation(game)
 
-            self.sio.sleep(1 / game.scene.fps)
+    def _update_emit_rate(
+        self, game: remote_game.RemoteGameV2, clock: game_clock.GameClock
+    ) -> None:
+        """Let the game's emit throttle (if any) react to the clock's lag and record any change."""
+        throttle = self.emit_throttles.get(game.game_id)
+        if throttle is None or not throttle.update(clock):
+            return
 
-            if (
-                game.status == remote_game.GameStatus.Reset
-                or game.status == remote_game.GameStatus.Done
-            ):
-                if self.scene.callback is not None:
-                    self.scene.callback.on_episode_end(game)
+        change = {
+            "time": time.time(),
+            "episode_num": game.episode_num,
+            "tick_num": game.tick_num,
+            "emit_interval": throttle.emit_interval,
+            "previous_emit_interval": game.emit_interval,
+            "mean_lag_s": clock.mean_lag_s,
+        }
+        game.emit_interval = throttle.emit_interval
+        game.emit_interval_changes.append(change)
+        logger.info(f"Changed emit interval of game {game.game_id}: {change}")
+
+    def _emit_game_reset(self, game: remote_game.RemoteGameV2) -> None:
+        """Tell the participants to start the countdown to the next episode."""
+        self.reset_barrier_starts[game.game_id] = time.monotonic()
+        self.sio.emit(
+            "game_reset",
+            {
+                "timeout": self.scene.reset_timeout,
+                "config": self.scene.scene_metadata,
+                "room": game.game_id,
+            },
+            room=game.game_id,
+        )
 
-            if game.status == remote_game.GameStatus.Reset:
-                eventlet.sleep(self.scene.reset_freeze_s)
-                self.sio.emit(
-                    "game_reset",
-                    {
-                        "timeout": self.scene.reset_timeout,
-                        "config": self.scene.scene_metadata,
-                        "room": game.game_id,
-                    },
-                    room=game.game_id,
-                )
+    def _start_reset_preparation(self, game: remote_game.RemoteGameV2) -> None:
+        """Prepare the next episode of a game in the background during the reset countdown."""
+        prepared = eventlet.event.Event()
+        self.reset_preparations[game.game_id] = prepared
+        self.sio.start_background_task(
+            self._prepare_server_game_reset, game, prepared
+        )
 
-                game.reset_event.wait()
+    def _prepare_server_game_reset(
+        self, game: remote_game.RemoteGameV2, prepared: eventlet.event.Event
+    ) -> None:
+        """Reset the env and render the first frame of the next episode ahead of time."""
+        try:
+            with game.lock:
+                if game.status == remote_game.GameStatus.Reset:
+                    game.prepared_reset = game.env.reset()
+                    self.prepared_renders[game.game_id] = self._render_env(
+                        game
+                    )
+        except Exception as e:
+            # Fall back to resetting once the players have confirmed.
+            logger.exception(
+                f"Failed to prepare the reset of game {game.game_id}: {e}"
+            )
+            game.prepared_reset = None
+            if game.game_id in self.prepared_renders:
+                del self.prepared_renders[game.game_id]
+        finally:
+            prepared.send()
+
+    def _is_reset_prepared(self, game_id: GameID) -> bool:
+        prepared = self.reset_preparations.get(game_id)
+        return prepared is None or prepared.ready()
+
+    def _finish_server_game_reset(
+        self, game: remote_game.RemoteGameV2
+    ) -> None:
+        """Reset the game for the next episode once every player has confirmed."""
+        # If the next episode is being prepared, it should be swapped in
+        # rather than reset again.
+        prepared = self.reset_preparations.pop(game.game_id, None)
+        if prepared is not None:
+            prepared.wait()
+        prepared_render = self.prepared_renders.pop(game.game_id, None)
 
-                # Replace the events for each player with new eventlet.event.Event instances
-                for player_id in self.reset_events[game.game_id].keys():
-                    self.reset_events[game.game_id][
-                        player_id
-                    ] = eventlet.event.Event()
+        # Replace the events for each player with new eventlet.event.Event instances
+        for player_id in self.reset_events[game.game_id].keys():
+            self.reset_events[game.game_id][player_id] = eventlet.event.Event()
 
-                # Clear the game reset event
-                game.set_reset_event()
+        if game.game_id in self.reset_barrier_starts:
+            del self.reset_barrier_starts[game.game_id]
 
-                with game.lock:
-                    game.reset()
-                    if self.scene.callback is not None:
-                        self.scene.callback.on_episode_start(game)
+        # Clear the game reset event
+        game.set_reset_event()
 
-                self.render_server_game(game)
+        with game.lock:
+            game.reset()
+            if self.scene.callback is not None:
+                self.scene.callback.on_episode_start(game)
 
-                self.sio.sleep(1 / game.scene.fps)
+        self.render_server_game(game, rendered_env=prepared_render)
 
+    def _end_server_game(self, game: remote_game.RemoteGameV2) -> None:
+        """Tear down a server-side game whose loop has ended."""
         with game.lock:
             logger.info(
-                f"Game loop ended for {game.game_id}, ending and cleaning up."
+                f"Game loop ended for {game.game_id}, ending and cleaning up. "
+                f"Tick stats: {self.get_tick_stats(game.game_id)}. "
+                f"Bot reaction latency: {game.bot_reaction_stats()}. "
+                f"Bot action deadlines: {game.bot_action_stats()}"
             )
             if game.status != remote_game.GameStatus.Inactive:
                 game.tear_down()
@@ -448,7 +846,255 @@ class GameManager:
                 {},
                 room=game.game_id,
             )
-            self.cleanup_game(game.game_id)
+            if game.game_id in self.games:
+                self.cleanup_game(game.game_id)
+
+    def _tick_server_game(self, game: remote_game.RemoteGameV2) -> None:
+        """Advance a server-side game by a single tick, triggering the tick callbacks."""
+        with game.lock:
+            # The game may have been torn down while we waited on the lock.
+            if game.status != remote_game.GameStatus.Active:
+                return
+
+            if self.scene.callback is not None:
+                self.scene.callback.on_game_tick_start(game)
+
+            self._enqueue_pressed_keys_actions(game)
+            game.tick()
+
+            if self.scene.callback is not None:
+                self.scene.callback.on_game_tick_end(game)
+
+    def _tick_scheduled_games(
+        self, games: list[remote_game.RemoteGameV2], ticks_due: int
+    ) -> None:
+        """Run the ticks that are due for every active game as batches."""
+        for _ in range(ticks_due):
+            active_games = [
+                game
+                for game in games
+                if game.status == remote_game.GameStatus.Active
+                and game.game_id in self.games
+            ]
+            if not active_games:
+                break
+
+            self._tick_server_games(active_games)
+            for game in active_games:
+                self.batch_ticked_games.add(game.game_id)
+
+    def _tick_server_games(
+        self, games: list[remote_game.RemoteGameV2]
+    ) -> None:
+        """Advance several server-side games by a single tick with one batched env step.
+
+        Environments that live in env workers are stepped with a single round
+        trip per worker (in parallel across workers); any others are stepped
+        in turn. A game whose env fails to step in the batch is ended rather
+        than stepped again, since its env may have been partly stepped.
+        Per-game behavior, including the tick callbacks, is the same as
+        `_tick_server_game`.
+        """
+        with contextlib.ExitStack() as stack:
+            for game in games:
+                self._set_current_games([game])
+                stack.enter_context(game.lock)
+
+            # Drop any game that was torn down while we waited on the locks.
+            games = [
+                game
+                for game in games
+                if game.status == remote_game.GameStatus.Active
+            ]
+
+            player_actions = []
+            for game in games:
+                self._set_current_games([game])
+                if self.scene.callback is not None:
+                    self.scene.callback.on_game_tick_start(game)
+                self._enqueue_pressed_keys_actions(game)
+                player_actions.append(game.get_player_actions())
+
+            step_results = [None] * len(games)
+            remote_indices = [
+                i
+                for i, game in enumerate(games)
+                if isinstance(game.env, env_worker.RemoteEnv)
+            ]
+            if remote_indices:
+                try:
+                    # While we wait on a worker, a stall is on its games.
+                    remote_results = env_worker.step_many(
+                        [games[i].env for i in remote_indices],
+                        [player_actions[i] for i in remote_indices],
+                        wait_fn=lambda indices: self._set_current_games(
+                            [games[remote_indices[j]] for j in indices]
+                        ),
+                    )
+                except env_worker.EnvWorkerError as e:
+                    logger.exception(f"Error in batched env step: {e}")
+                    for i in remote_indices:
+                        games[i].status = remote_game.GameStatus.Done
+                    remote_results = [None] * len(remote_indices)
+
+                for i, result in zip(remote_indices, remote_results):
+                    if isinstance(result, env_worker.EnvWorkerError):
+                        logger.error(
+                            f"Error stepping game {games[i].game_id} in a batch: {result}"
+                        )
+                        games[i].status = remote_game.GameStatus.Done
+                        continue
+                    step_results[i] = result
+
+            for game, actions, step_result in zip(
+                games, player_actions, step_results
+            ):
+                if game.status != remote_game.GameStatus.Active:
+                    continue
+
+                self._set_current_games([game])
+                try:
+                    # Anything that wasn't batched is stepped on its own.
+                    if step_result is None:
+                        step_result = game.step_env(actions)
+                    game.process_step(step_result)
+                except Exception as e:
+                    logger.exception(
+                        f"Error ticking game {game.game_id} in a batch: {e}"
+                    )
+                    game.status = remote_game.GameStatus.Done
+                    continue
+
+                if self.scene.callback is not None:
+                    self.scene.callback.on_game_tick_end(game)
+
+    def _set_current_games(
+        self, games: list[remote_game.RemoteGameV2]
+    ) -> None:
+        """Record the games the scheduler's batch is working on, in case it stalls on them."""
+        if self.scheduler is not None:
+            self.scheduler.current_game_ids = [game.game_id for game in games]
+
+    def supervise_games(self) -> None:
+        """Periodically reclaim games that have stalled, until no games are left.
+
+        A game is reclaimed if it's active but hasn't ticked within
+        `stalled_game_timeout_s` or if it has been waiting on its reset barrier
+        (e.g., because a participant closed the tab during the countdown) for
+        longer than `reset_barrier_timeout_s`.
+        """
+        logger.info(f"Starting game supervisor for scene {self.scene.scene_id}.")
+
+        while self.active_games:
+            self.sio.sleep(self.scene.supervisor_interval_s)
+
+            now = time.monotonic()
+            if self.scheduler is not None:
+                self._check_scheduler_stalled(now)
+
+            for game_id, game in list(self.games.items()):
+                if game_id not in self.active_games:
+                    continue
+
+                barrier_start = self.reset_barrier_starts.get(game_id)
+                clock = self.game_clocks.get(game_id)
+
+                if (
+                    game.status == remote_game.GameStatus.Reset
+                    and barrier_start is not None
+                    and self.scene.reset_barrier_timeout_s is not None
+                    and now - barrier_start > self.scene.reset_barrier_timeout_s
+                ):
+                    self._reap_game(
+                        game,
+                        f"waiting on its reset barrier for {now - barrier_start:.1f}s",
+                    )
+                elif (
+                    game.status == remote_game.GameStatus.Active
+                    and self.scheduler is None
+                    and clock is not None
+                    and clock.last_tick_time is not None
+                    and self.scene.stalled_game_timeout_s is not None
+                    and now - clock.last_tick_time
+                    > self.scene.stalled_game_timeout_s
+                ):
+                    self._reap_game(
+                        game,
+                        f"no tick for {now - clock.last_tick_time:.1f}s",
+                    )
+
+        logger.info(
+            f"Stopping game supervisor for scene {self.scene.scene_id}, "
+            f"reclaimed {self.num_reaped_games} stalled games in total."
+        )
+        self.supervisor = None
+
+    def _check_scheduler_stalled(self, now: float) -> None:
+        """Reclaim the games the multiplexed scheduler is stuck on, if it stalled.
+
+        Games on the scheduler share its clock, so a stall shows up as the
+        driver not completing a pass. The driver is restarted without the
+        game(s) it was stuck on, so the others keep running. In a batched
+        step, those are the game whose lock or callback it was waiting on, or
+        the games of the env worker it was waiting on.
+        """
+        clock = self.scheduler.clock
+        if (
+            self.scheduler.driver is None
+            or self.scene.stalled_game_timeout_s is None
+            or clock.last_tick_time is None
+            or now - clock.last_tick_time <= self.scene.stalled_game_timeout_s
+        ):
+            return
+
+        stuck_game_ids = self.scheduler.current_game_ids
+        logger.warning(
+            f"Multiplexed scheduler for scene {self.scene.scene_id} has not "
+            f"completed a pass for {now - clock.last_tick_time:.1f}s, stuck on games {stuck_game_ids}."
+        )
+
+        # Killing the driver releases any game lock it was holding.
+        self.scheduler.driver.kill()
+        for game_id in stuck_game_ids:
+            game = self.games.get(game_id)
+            if game is not None:
+                self._reap_game(
+                    game, f"no tick for {now - clock.last_tick_time:.1f}s"
+                )
+
+        self.scheduler.restart()
+
+    def _reap_game(self, game: remote_game.RemoteGameV2, reason: str) -> None:
+        """Tear down a stalled game and everything it holds."""
+        self.num_reaped_games += 1
+        logger.warning(
+            f"Reclaiming stalled game {game.game_id} ({reason}). "
+            f"Reclaimed {self.num_reaped_games} games for scene {self.scene.scene_id}."
+        )
+
+        # Stop the game's loop first so that it can't hold on to the game
+        # lock (or pick the game back up) while it's cleaned up.
+        loop = self.game_loops.get(game.game_id)
+        if loop is not None:
+            loop.kill()
+        if self.scheduler is not None:
+            self.scheduler.remove_game(game.game_id)
+
+        try:
+            self._end_server_game(game)
+        except Exception as e:
+            logger.exception(
+                f"Error reclaiming stalled game {game.game_id}: {e}"
+            )
+            if game.game_id in self.games:
+                self._remove_game(game.game_id)
+
+    def get_tick_stats(self, game_id: GameID) -> dict[str, float | int] | None:
+        """Return the tick lag statistics for a server-side game, if it's running."""
+        clock = self.game_clocks.get(game_id)
+        if clock is None:
+            return None
+        return clock.stats()
 
     def trigger_reset(self, subject_id: SubjectID):
         game = self.get_subject_game(subject_id)
@@ -498,9 +1144,108 @@ class GameManager:
                 f"Subject {subject_id} is not in game {game.game_id} but we received key presses."
             )
 
-        # No keys pressed, queue the default action
+        action = self._pressed_keys_to_action(pressed_keys)
+        if action is not None:
+            game.enqueue_action(subject_agent_id, action)
+
+    def update_pressed_keys(
+        self,
+        subject_id: SubjectID,
+        pressed_keys: list,
+        sequence_num: int,
+        client_timestamp: float | None = None,
+    ) -> bool:
+        """Record the keys a subject holds down, as pushed by their client when they change.
+
+        Updates are applied on the game's next tick. An update with a sequence
+        number that isn't newer than the last one from the subject is stale and
+        ignored. Returns whether the update was applied.
+        """
+        current = self.subject_pressed_keys.get(subject_id)
+        if current is not None and sequence_num <= current.sequence_num:
+            return False
+
+        self.subject_pressed_keys[subject_id] = PressedKeysState(
+            pressed_keys=list(pressed_keys),
+            sequence_num=sequence_num,
+            client_timestamp=client_timestamp,
+            received_at=time.time(),
+        )
+        return True
+
+    def relay_lockstep_actions(
+        self,
+        subject_id: SubjectID,
+        tick: int,
+        actions: dict,
+        state_hash_tick: int | None = None,
+        state_hash: str | None = None,
+    ) -> None:
+        """Record a player's actions (and state hash) in a lockstep game and relay them once all players' are in.
+
+        :param tick: The tick the actions are applied on.
+        :param actions: The actions of the agents the player acts for, by agent ID.
+        :param state_hash_tick: The tick after which the player hashed their state, if they did.
+        :param state_hash: The hash of the player's state after `state_hash_tick`.
+        """
+        game_id = self.subject_games.get(subject_id)
+        relay = self.lockstep_relays.get(game_id)
+        if relay is None:
+            logger.warning(
+                f"Received lockstep actions from {subject_id}, who isn't in a lockstep game."
+            )
+            return
+
+        bundle = relay.add_actions(subject_id, tick, actions)
+        if bundle is not None:
+            self.sio.emit(
+                "lockstep_actions",
+                {"tick": tick, "actions": bundle},
+                room=game_id,
+            )
+
+        if state_hash is None:
+            return
+
+        state_hashes = relay.add_state_hash(
+            subject_id, state_hash_tick, state_hash
+        )
+        if state_hashes is not None:
+            logger.warning(
+                f"Lockstep game {game_id} desynced at tick {state_hash_tick}: {state_hashes}"
+            )
+            self.sio.emit(
+                "lockstep_desync",
+                {"tick": state_hash_tick, "state_hashes": state_hashes},
+                room=game_id,
+            )
+
+    def _enqueue_pressed_keys_actions(
+        self, game: remote_game.RemoteGameV2
+    ) -> None:
+        """Queue the action of each player's latest pressed keys for the tick that's about to run."""
+        if (
+            self.scene.input_mode
+            != configuration_constants.InputModes.PressedKeys
+        ):
+            return
+
+        for agent_id, subject_id in game.human_players.items():
+            if subject_id not in self.subject_games:
+                continue
+
+            state = self.subject_pressed_keys.get(subject_id)
+            action = self._pressed_keys_to_action(
+                state.pressed_keys if state is not None else []
+            )
+            if action is not None:
+                game.enqueue_action(agent_id, action)
+
+    def _pressed_keys_to_action(self, pressed_keys: list) -> Any | None:
+        """Map pressed keys to an action, None if none of them are mapped to one."""
+        # No keys pressed, use the default action
         if len(pressed_keys) == 0:
-            game.enqueue_action(subject_agent_id, self.scene.default_action)
+            return self.scene.default_action
 
         elif len(pressed_keys) > 1:
             if not self.scene.game_has_composite_actions:
@@ -508,21 +1253,11 @@ class GameManager:
             else:
                 pressed_keys = self.generate_composite_action(pressed_keys)
 
-        if game is None:
-            return
-
-        if not any([k in self.scene.action_mapping for k in pressed_keys]):
-            return
-
-        action = None
         for k in pressed_keys:
             if k in self.scene.action_mapping:
-                action = self.scene.action_mapping[k]
-                break
+                return self.scene.action_mapping[k]
 
-        assert action is not None
-
-        game.enqueue_action(subject_agent_id, action)
+        return None
 
     def generate_composite_action(self, pressed_keys) -> list[tuple[str]]:
         max_composite_action_size = max(
@@ -554,12 +1289,84 @@ class GameManager:
 
         return pressed_keys
 
-    def render_server_game(self, game: remote_game.RemoteGameV2):
+    def render_server_game(
+        self,
+        game: remote_game.RemoteGameV2,
+        rendered_env: tuple | None = None,
+    ):
+        """Emit the game's current state to its players.
+
+        :param rendered_env: The output of `_render_env` if the env was already rendered (e.g., for a prepared reset).
+        """
+        # Under overload, a frame is only sent once `emit_interval` ticks have
+        # passed since the last one, though the first and last frames of an
+        # episode always are. Counting from the last emit (rather than using
+        # multiples of the interval) keeps the rate when catching up skips ticks.
+        if (
+            game.emit_interval > 1
+            and game.status == remote_game.GameStatus.Active
+            and game.last_emit_tick is not None
+            and game.tick_num - game.last_emit_tick < game.emit_interval
+        ):
+            return
+        game.last_emit_tick = game.tick_num
+
+        if rendered_env is None:
+            with game.lock:
+                # The game may have been removed while we waited on the lock.
+                if game.env_released:
+                    return
+                rendered_env = self._render_env(game)
+        state, game_image_binary = rendered_env
+
+        hud_text = (
+            self.scene.hud_text_fn(game)
+            if self.scene.hud_text_fn is not None
+            else None
+        )
+
+        if self.scene.state_delta_encoding:
+            encoder = self.state_encoders.get(game.game_id)
+            if encoder is None:
+                encoder = state_encoding.StateDeltaEncoder(
+                    self.scene.keyframe_interval,
+                    binary=self.scene.binary_state_encoding,
+                )
+                self.state_encoders[game.game_id] = encoder
+
+            # Each episode starts from a keyframe.
+            if game.tick_num == 0:
+                encoder.request_keyframe()
+            frame = encoder.encode(state, hud_text)
+        else:
+            frame = {"game_state_objects": state, "hud_text": hud_text}
+
+        # TODO(chase): this emits the same state to every player in a room, but we may want
+        #   to have different observations for each player. Figure that out (maybe state is a dict
+        #   with player_ids and their respective observations?).
+        self.sio.emit(
+            "environment_state",
+            {
+                **frame,
+                "game_image_binary": game_image_binary,
+                "step": game.tick_num,
+            },
+            room=game.game_id,
+        )
+
+    def _render_env(
+        self, game: remote_game.RemoteGameV2
+    ) -> tuple[list[dict] | None, bytes | None]:
+        """Render the game's env to state objects or an encoded image."""
         state = None
         encoded_image = None
         if self.scene.env_to_state_fn is not None:
             # generate a state object representation
-            state = self.scene.env_to_state_fn(game.env, self.scene)
+            if isinstance(game.env, env_worker.RemoteEnv):
+                # Run the render function next to the env in its worker.
+                state = game.env.env_to_state()
+            else:
+                state = self.scene.env_to_state_fn(game.env, self.scene)
         else:
             # Generate a base64 image of the game and send it to display
             assert (
@@ -575,24 +1382,8 @@ class GameManager:
             )
             # encoded_image = base64.b64encode(encoded_image).decode()
 
-        hud_text = (
-            self.scene.hud_text_fn(game)
-            if self.scene.hud_text_fn is not None
-            else None
-        )
-
-        # TODO(chase): this emits the same state to every player in a room, but we may want
-        #   to have different observations for each player. Figure that out (maybe state is a dict
-        #   with player_ids and their respective observations?).
-        self.sio.emit(
-            "environment_state",
-            {
-                "game_state_objects": state,
-                "game_image_binary": encoded_image.tobytes(),
-                "step": game.tick_num,
-                "hud_text": hud_text,
-            },
-            room=game.game_id,
+        return state, (
+            encoded_image.tobytes() if encoded_image is not None else None
         )
 
     def cleanup_game(self, game_id: GameID):
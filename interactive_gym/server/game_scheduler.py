@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import logging
+import time
+import typing
+
+import eventlet
+
+from interactive_gym.configurations import configuration_constants
+from interactive_gym.server import game_clock, remote_game, utils
+from interactive_gym.utils.typing import GameID
+
+logger = logging.getLogger(__name__)
+
+
+class MultiplexedGameScheduler:
+    """
+    Ticks every active server-side game of a scene from a single driver.
+
+    Instead of one greenlet per game that sleeps on its own timer, all games
+    that share a scene (and therefore an fps) are ticked in one pass against a
+    shared deadline-based clock. Games join and leave the tick set without
+    spawning new greenlets, and the pass duration gives a single place to
+    measure (and shed) load.
+
+    The scheduler doesn't know anything about the games' life cycle itself:
+    `start_fn` is called for each game on the first pass after it joins, and
+    `step_fn(game, ticks_due)` is called on every pass after that and returns
+    whether the game should stay in the tick set. If `batch_step_fn` is given,
+    it is called with every game in the tick set at the start of each pass so
+    that their ticks can be run as a batch before the per-game `step_fn`s. It
+    should narrow `current_game_ids` to the games it's working on as it goes,
+    so that a stall in the batch is only blamed on the games that caused it.
+
+    If any of these raise, the games the driver was working on (per
+    `current_game_ids`) are dropped from the tick set and passed to
+    `error_fn(game, error)` to be ended, while the rest keep running.
+    """
+
+    # Smoothing factor for the exponential moving average of the pass duration.
+    PASS_DURATION_EMA_ALPHA = 0.1
+
+    def __init__(
+        self,
+        fps: int | float,
+        start_fn: typing.Callable[[remote_game.RemoteGameV2], None],
+        step_fn: typing.Callable[[remote_game.RemoteGameV2, int], bool],
+        after_pass_fn: typing.Callable[[], None] | None = None,
+        batch_step_fn: (
+            typing.Callable[[list[remote_game.RemoteGameV2], int], None] | None
+        ) = None,
+        error_fn: (
+            typing.Callable[[remote_game.RemoteGameV2, Exception], None] | None
+        ) = None,
+        catchup_policy: str = configuration_constants.TickCatchupPolicies.CatchUp,
+        max_catchup_ticks: int = 5,
+        sleep_fn: typing.Callable[[float], None] = eventlet.sleep,
+        spawn_fn: typing.Callable = eventlet.spawn,
+    ):
+        self.start_fn = start_fn
+        self.step_fn = step_fn
+        self.after_pass_fn = after_pass_fn
+        self.batch_step_fn = batch_step_fn
+        self.error_fn = error_fn
+        self.spawn_fn = spawn_fn
+
+        self.clock = game_clock.GameClock(
+            fps=fps,
+            catchup_policy=catchup_policy,
+            max_catchup_ticks=max_catchup_ticks,
+            sleep_fn=sleep_fn,
+        )
+
+        # Games waiting to be started on the next pass and games in the tick set.
+        self.joining_games: dict[GameID, remote_game.RemoteGameV2] = (
+            utils.ThreadSafeDict()
+        )
+        self.games: dict[GameID, remote_game.RemoteGameV2] = (
+            utils.ThreadSafeDict()
+        )
+
+        self.driver = None
+
+        # The games the driver is working on right now, so that if the driver
+        # stalls we know which game it's stuck on.
+        self.current_game_ids: list[GameID] = []
+
+        self.last_pass_duration_s: float = 0.0
+        self.mean_pass_duration_s: float = 0.0
+        self.num_passes: int = 0
+
+    def __contains__(self, game_id: GameID) -> bool:
+        return game_id in self.games or game_id in self.joining_games
+
+    def __len__(self) -> int:
+        return len(self.games) + len(self.joining_games)
+
+    def add_game(self, game: remote_game.RemoteGameV2) -> None:
+        """Add a game to the tick set, starting the driver if it isn't running."""
+        self.joining_games[game.game_id] = game
+
+        if self.driver is None:
+            self.driver = self.spawn_fn(self._run)
+
+    def remove_game(self, game_id: GameID) -> None:
+        """Remove a game from the tick set."""
+        if game_id in self.joining_games:
+            del self.joining_games[game_id]
+        if game_id in self.games:
+            del self.games[game_id]
+
+    def restart(self) -> None:
+        """Kill the driver (e.g., if it's stalled) and start a new one if there are games left."""
+        if self.driver is not None:
+            self.driver.kill()
+        self.driver = None
+        self.current_game_ids = []
+
+        if len(self):
+            self.driver = self.spawn_fn(self._run)
+
+    def _run(self) -> None:
+        logger.info("Starting multiplexed game scheduler.")
+        self.clock.start()
+        ticks_due = 1
+
+        try:
+            while len(self):
+                pass_start = time.monotonic()
+
+                for game_id, game in list(self.joining_games.items()):
+                    del self.joining_games[game_id]
+                    self.games[game_id] = game
+                    self.current_game_ids = [game_id]
+                    try:
+                        self.start_fn(game)
+                    except Exception as e:
+                        self._end_current_games(e)
+
+                if self.batch_step_fn is not None:
+                    self.current_game_ids = list(self.games.keys())
+                    try:
+                        self.batch_step_fn(
+                            list(self.games.values()), ticks_due
+                        )
+                    except Exception as e:
+                        self._end_current_games(e)
+
+                for game_id, game in list(self.games.items()):
+                    if game_id not in self.games:
+                        continue
+
+                    self.current_game_ids = [game_id]
+                    try:
+                        if not self.step_fn(game, ticks_due):
+                            self.remove_game(game_id)
+                    except Exception as e:
+                        self._end_current_games(e)
+
+                self.current_game_ids = []
+                if self.after_pass_fn is not None:
+                    self.after_pass_fn()
+
+                self._record_pass_duration(time.monotonic() - pass_start)
+                ticks_due = self.clock.wait()
+
+            logger.info(
+                f"Multiplexed game scheduler has no games left, stopping. Stats: {self.stats()}"
+            )
+        finally:
+            # Whether we ran out of games or hit an error outside of a game,
+            # the next game that's added should start a new driver.
+            self.driver = None
+
+    def _end_current_games(self, error: Exception) -> None:
+        """Drop the games the driver was working on when it hit an error."""
+        logger.exception(
+            f"Error on the multiplexed scheduler while working on games "
+            f"{self.current_game_ids}: {error}"
+        )
+        for game_id in self.current_game_ids:
+            game = self.games.get(game_id)
+            self.remove_game(game_id)
+            if game is None or self.error_fn is None:
+                continue
+
+            try:
+                self.error_fn(game, error)
+            except Exception as e:
+                logger.exception(f"Error ending game {game_id}: {e}")
+
+        self.current_game_ids = []
+
+    def _record_pass_duration(self, duration_s: float) -> None:
+        self.last_pass_duration_s = duration_s
+        if self.num_passes == 0:
+            self.mean_pass_duration_s = duration_s
+        else:
+            self.mean_pass_duration_s += self.PASS_DURATION_EMA_ALPHA * (
+                duration_s - self.mean_pass_duration_s
+            )
+        self.num_passes += 1
+
+    def stats(self) -> dict[str, float | int]:
+        """Return the scheduler load and tick lag statistics."""
+        return {
+            "num_games": len(self),
+            "num_passes": self.num_passes,
+            "last_pass_duration_s": self.last_pass_duration_s,
+            "mean_pass_duration_s": self.mean_pass_duration_s,
+            "frame_budget_s": self.clock.period_s,
+            **self.clock.stats(),
+        }
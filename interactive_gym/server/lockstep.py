@@ -0,0 +1,122 @@
+"""
+Relay of player actions for Pyodide scenes played in lockstep.
+
+In lockstep, every client in a room runs the same environment in Pyodide,
+reset with a seed the server picks for the game, so the server never steps an
+environment. Each client instead sends the actions it's responsible for (its
+own agent's and, for the bot host, the bots') for a tick that's
+`lockstep_input_delay_ticks` ahead of the one it's stepping. Once every player
+has sent their actions for a tick, the server emits them to the room as a
+single bundle, and each client steps that tick with the bundle's actions (see
+`processPyodideGame` in `phaser_gym_graphics.js`).
+
+Every `lockstep_state_hash_interval` ticks, the clients also send a hash of
+their state after stepping. Since the clients step the same environment with
+the same actions, the hashes only differ if the environment isn't
+deterministic (e.g., it draws from an unseeded RNG), in which case the desync
+is logged and reported to the room.
+"""
+
+from __future__ import annotations
+
+import logging
+import typing
+
+from interactive_gym.utils.typing import SubjectID
+
+logger = logging.getLogger(__name__)
+
+
+class LockstepRelay:
+    """Collects each player's actions and state hashes for a lockstep game."""
+
+    def __init__(
+        self,
+        player_agent_ids: dict[SubjectID, typing.Any],
+        seed: int,
+    ):
+        """
+        :param player_agent_ids: The agent ID each player in the game controls, by subject ID.
+        :param seed: The seed every client resets the environment with.
+        """
+        self.player_agent_ids = dict(player_agent_ids)
+        self.seed = seed
+
+        # The actions received for each tick that hasn't been relayed yet.
+        self.pending_actions: dict[int, dict[SubjectID, dict]] = {}
+        # The hashes received for each tick that hasn't been checked yet.
+        self.pending_state_hashes: dict[int, dict[SubjectID, str]] = {}
+
+        self.num_relayed_ticks: int = 0
+        self.num_state_hash_checks: int = 0
+        self.desynced_ticks: list[int] = []
+
+    @property
+    def bot_host(self) -> SubjectID:
+        """The player whose client acts for the bots, so that every client steps them the same way."""
+        return min(self.player_agent_ids, key=str)
+
+    def add_actions(
+        self, subject_id: SubjectID, tick: int, actions: dict
+    ) -> dict | None:
+        """Record a player's actions for a tick.
+
+        :return: The actions of every agent for the tick once all players have sent theirs, otherwise None.
+        """
+        if subject_id not in self.player_agent_ids:
+            logger.warning(
+                f"Received lockstep actions from {subject_id}, who isn't a player in the game."
+            )
+            return None
+
+        tick_actions = self.pending_actions.setdefault(tick, {})
+        tick_actions[subject_id] = actions
+        if len(tick_actions) < len(self.player_agent_ids):
+            return None
+
+        del self.pending_actions[tick]
+        self.num_relayed_ticks += 1
+
+        bundle = {}
+        for player_actions in tick_actions.values():
+            bundle.update(player_actions)
+        return bundle
+
+    def add_state_hash(
+        self, subject_id: SubjectID, tick: int, state_hash: str
+    ) -> dict[SubjectID, str] | None:
+        """Record a player's state hash for a tick.
+
+        :return: Every player's hash for the tick if they differ, otherwise None.
+        """
+        if subject_id not in self.player_agent_ids:
+            return None
+
+        tick_hashes = self.pending_state_hashes.setdefault(tick, {})
+        tick_hashes[subject_id] = state_hash
+        if len(tick_hashes) < len(self.player_agent_ids):
+            return None
+
+        del self.pending_state_hashes[tick]
+        self.num_state_hash_checks += 1
+
+        if len(set(tick_hashes.values())) == 1:
+            return None
+
+        self.desynced_ticks.append(tick)
+        return tick_hashes
+
+    def start_payload(self, subject_id: SubjectID) -> dict[str, typing.Any]:
+        """The lockstep settings a player's client starts the game with."""
+        return {
+            "seed": self.seed,
+            "agent_id": self.player_agent_ids[subject_id],
+            "is_bot_host": subject_id == self.bot_host,
+        }
+
+    def stats(self) -> dict[str, typing.Any]:
+        return {
+            "num_relayed_ticks": self.num_relayed_ticks,
+            "num_state_hash_checks": self.num_state_hash_checks,
+            "desynced_ticks": list(self.desynced_ticks),
+        }
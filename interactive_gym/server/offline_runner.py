@@ -0,0 +1,300 @@
+"""
+Run a GymScene offline, without the server, as fast as the environment allows.
+
+Scenes whose `policy_mapping` only has bots (loaded policies or random) can be
+played without participants: there are no sockets, no rendering, and no
+sleeping between ticks. Games are run by the same `RemoteGameV2` as live games
+and trigger the same `GameCallback` hooks, so callbacks save data in the same
+format. This is useful to pilot-test callbacks, to collect AI-vs-AI baselines,
+and to benchmark environment throughput.
+
+Games are spread over a pool of processes. Each process works on its own copy
+of the scene (and its callback), so callbacks should write their data out
+rather than only keep it in memory.
+
+From Python:
+
+    results = offline_runner.run_scene_offline(scene, num_games=100, num_workers=8)
+
+Or from the command line, given the import path of a GymScene:
+
+    python -m interactive_gym.server.offline_runner my_experiment.scenes:ai_ai_scene --num-games 100 --num-workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import copy
+import importlib
+import logging
+import multiprocessing
+import time
+import traceback
+import typing
+
+from interactive_gym.configurations import configuration_constants
+from interactive_gym.scenes import gym_scene
+from interactive_gym.server import remote_game
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineGame(remote_game.RemoteGameV2):
+    """A RemoteGameV2 whose bots act inline, rather than in their own greenlets."""
+
+    def _init_bot_threads(self):
+        pass
+
+    def run_bot_inference(self) -> None:
+        """Compute an action for each bot that has a pending observation."""
+        for agent_id, policy in self.bot_players.items():
+            if policy == configuration_constants.PolicyTypes.Random:
+                continue
+
+            state_queue = self.state_queues[agent_id]
+            if state_queue.empty():
+                continue
+
+            self.compute_bot_action(agent_id, state_queue.get(block=False))
+
+
+def _prepare_scene(scene: gym_scene.GymScene) -> gym_scene.GymScene:
+    """Copy the scene and make sure it can be run offline."""
+    assert not scene.run_through_pyodide, "Pyodide scenes can't be run offline."
+    assert configuration_constants.PolicyTypes.Human not in list(
+        scene.policy_mapping.values()
+    ), "Scenes with human players can't be run offline."
+
+    scene = copy.deepcopy(scene)
+
+    # Offline games build their environments directly in the process running them.
+    scene.num_env_workers = 0
+    scene.env_pool_size = 0
+
+    return scene
+
+
+def run_game(
+    scene: gym_scene.GymScene, game_id: int, seed: int | None = None
+) -> dict[str, typing.Any]:
+    """Play every episode of a single game and return a summary of it."""
+    start_time = time.perf_counter()
+    game = OfflineGame(scene, game_id=game_id)
+    callback = scene.callback
+
+    num_ticks = 0
+    game.reset(seed=seed)
+    if callback is not None:
+        callback.on_episode_start(game)
+
+    while game.status == remote_game.GameStatus.Active:
+        game.run_bot_inference()
+
+        if callback is not None:
+            callback.on_game_tick_start(game)
+
+        game.tick()
+        num_ticks += 1
+
+        if callback is not None:
+            callback.on_game_tick_end(game)
+
+        if game.status in [
+            remote_game.GameStatus.Reset,
+            remote_game.GameStatus.Done,
+        ]:
+            if callback is not None:
+                callback.on_episode_end(game)
+
+        if game.status == remote_game.GameStatus.Reset:
+            game.reset()
+            if callback is not None:
+                callback.on_episode_start(game)
+
+    if callback is not None:
+        callback.on_game_end(game)
+
+    game.tear_down()
+    game.release_env()
+
+    return {
+        "game_id": game_id,
+        "game_uuid": game.game_uuid,
+        "num_episodes": game.episode_num,
+        "num_ticks": num_ticks,
+        "total_rewards": dict(game.total_rewards),
+        "duration_s": time.perf_counter() - start_time,
+    }
+
+
+def _run_games(
+    scene: gym_scene.GymScene, game_ids: list[int], seed: int | None
+) -> list[dict[str, typing.Any]]:
+    return [
+        run_game(
+            scene, game_id, seed=None if seed is None else seed + game_id
+        )
+        for game_id in game_ids
+    ]
+
+
+def _worker_main(
+    conn, scene: gym_scene.GymScene, game_ids: list[int], seed: int | None
+) -> None:
+    """Entry point of a worker process: run its games and send back the results."""
+    try:
+        conn.send((True, _run_games(scene, game_ids, seed)))
+    except Exception:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def run_scene_offline(
+    scene: gym_scene.GymScene,
+    num_games: int,
+    num_workers: int = 1,
+    seed: int | None = None,
+) -> list[dict[str, typing.Any]]:
+    """Run `num_games` games of a bot-only scene as fast as possible.
+
+    :param scene: The GymScene to run. Every agent in its `policy_mapping` must be a bot or random policy.
+    :type scene: gym_scene.GymScene
+    :param num_games: Number of games to run, each with `scene.num_episodes` episodes.
+    :type num_games: int
+    :param num_workers: Number of processes to spread the games over. With 1, games run in this process (and share the scene's callback instance), defaults to 1
+    :type num_workers: int, optional
+    :param seed: Seed for the first episode of each game, offset by the game's index, defaults to None
+    :type seed: int | None, optional
+    :return: A summary of each game, in the order they were run.
+    :rtype: list[dict[str, typing.Any]]
+    """
+    assert num_games >= 1, "Must run at least one game."
+    assert num_workers >= 1, "Must have at least one worker."
+
+    if num_workers == 1:
+        # Run in-process on the original callback so results can be
+        # inspected directly (e.g., when testing a callback).
+        prepared_scene = _prepare_scene(scene)
+        prepared_scene.callback = scene.callback
+        return _run_games(prepared_scene, list(range(num_games)), seed)
+
+    scene = _prepare_scene(scene)
+
+    # Give each worker a single chunk of games so that it only
+    # loads the environment and policies once.
+    chunks = [
+        list(range(num_games))[i::num_workers] for i in range(num_workers)
+    ]
+    chunks = [chunk for chunk in chunks if chunk]
+
+    # Workers are plain processes with a pipe each, rather than an executor,
+    # since scene modules often monkey patch with eventlet when imported,
+    # which breaks the threads that executors rely on.
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+    for chunk in chunks:
+        conn, child_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_worker_main, args=(child_conn, scene, chunk, seed)
+        )
+        process.start()
+        child_conn.close()
+        workers.append((process, conn))
+
+    results = []
+    errors = []
+    for process, conn in workers:
+        try:
+            ok, result = conn.recv()
+        except EOFError:
+            ok, result = False, f"Worker exited with code {process.exitcode}."
+        process.join()
+
+        if ok:
+            results.extend(result)
+        else:
+            errors.append(result)
+
+    if errors:
+        raise RuntimeError(
+            "Offline games failed in a worker:\n" + "\n".join(errors)
+        )
+
+    return sorted(results, key=lambda r: r["game_id"])
+
+
+def summarize(
+    results: list[dict[str, typing.Any]], wall_time_s: float
+) -> dict[str, typing.Any]:
+    """Aggregate the results of `run_scene_offline` for reporting."""
+    num_ticks = sum(r["num_ticks"] for r in results)
+    num_episodes = sum(r["num_episodes"] for r in results)
+
+    mean_episode_rewards = collections.defaultdict(float)
+    for r in results:
+        for agent_id, reward in r["total_rewards"].items():
+            mean_episode_rewards[agent_id] += reward / max(num_episodes, 1)
+
+    return {
+        "num_games": len(results),
+        "num_episodes": num_episodes,
+        "num_ticks": num_ticks,
+        "wall_time_s": wall_time_s,
+        "ticks_per_s": num_ticks / wall_time_s if wall_time_s > 0 else None,
+        "mean_episode_rewards": dict(mean_episode_rewards),
+    }
+
+
+def _load_scene(path: str) -> gym_scene.GymScene:
+    module_name, _, attribute = path.partition(":")
+    assert (
+        attribute
+    ), f"Expected a scene as `module.path:attribute`, got {path}."
+
+    obj = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        obj = getattr(obj, name)
+
+    assert isinstance(
+        obj, gym_scene.GymScene
+    ), f"{path} is a {type(obj)}, not a GymScene."
+    return obj
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a bot-only GymScene offline, as fast as possible."
+    )
+    parser.add_argument(
+        "scene",
+        type=str,
+        help="Import path of the GymScene, e.g., `my_experiment.scenes:ai_ai_scene`",
+    )
+    parser.add_argument(
+        "--num-games", type=int, default=1, help="Number of games to run"
+    )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="Number of processes to run games in",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Base seed for the games"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    results = run_scene_offline(
+        _load_scene(args.scene),
+        num_games=args.num_games,
+        num_workers=args.num_workers,
+        seed=args.seed,
+    )
+    logger.info(
+        f"Offline run summary: {summarize(results, time.perf_counter() - start)}"
+    )
@@ -0,0 +1,163 @@
+"""
+Policies loaded once per process and shared by every game.
+
+`RemoteGameV2` used to call `scene.load_policy_fn` for every game it created,
+so the first game to use a model paid for loading it while its participants
+waited. The `PolicyRegistry` loads each policy once per `load_policy_fn` and
+policy ID and hands the same handle to every game and GameManager.
+
+`app.run()` preloads every policy in the experiment's `Stager` before the
+server starts. ONNX models loaded through `onnx_inference_utils` are also
+warmed up with a dummy forward pass, so that the first game doesn't pay for
+the slow first run either. Load time, warm-up time, and memory are recorded
+for each policy and logged.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
+import typing
+
+from interactive_gym.configurations import configuration_constants
+from interactive_gym.scenes import gym_scene, scene
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes() -> int | None:
+    """Resident memory of this process, if it can be measured (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _iter_gym_scenes(
+    scenes: list[scene.Scene | scene.SceneWrapper],
+) -> typing.Iterator[gym_scene.GymScene]:
+    """Yield every GymScene, including those nested in SceneWrappers."""
+    for s in scenes:
+        if isinstance(s, scene.SceneWrapper):
+            yield from _iter_gym_scenes(s.scenes)
+        elif isinstance(s, gym_scene.GymScene):
+            yield s
+
+
+class PolicyRegistry:
+    """Loads each policy once and shares its handle across games."""
+
+    def __init__(self):
+        # Policy handles and their load statistics, keyed by the function
+        # that loads them and the policy ID from the scene's policy_mapping.
+        self.handles: dict[tuple[typing.Callable, typing.Any], typing.Any] = {}
+        self.load_stats: dict[
+            tuple[typing.Callable, typing.Any], dict[str, typing.Any]
+        ] = {}
+
+    def load(self, scene: gym_scene.GymScene, policy_id: typing.Any):
+        """Return the handle of a scene's policy, loading it if necessary."""
+        assert (
+            scene.load_policy_fn is not None
+        ), "Must provide a method to load policies via policy name to RemoteConfig!"
+
+        key = (scene.load_policy_fn, policy_id)
+        if key not in self.handles:
+            self.handles[key] = self._load(scene.load_policy_fn, policy_id)
+        return self.handles[key]
+
+    def _load(self, load_policy_fn: typing.Callable, policy_id: typing.Any):
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        handle = load_policy_fn(policy_id)
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        warmed_up = self._warm_up(handle)
+        warm_up_s = time.perf_counter() - start
+
+        rss_after = _rss_bytes()
+        stats = {
+            "policy_id": policy_id,
+            "load_s": load_s,
+            "warm_up_s": warm_up_s if warmed_up else None,
+            "memory_bytes": (
+                rss_after - rss_before
+                if rss_before is not None and rss_after is not None
+                else None
+            ),
+            "file_size_bytes": (
+                os.path.getsize(policy_id)
+                if isinstance(policy_id, str) and os.path.isfile(policy_id)
+                else None
+            ),
+        }
+        self.load_stats[(load_policy_fn, policy_id)] = stats
+        logger.info(f"Loaded policy {policy_id}: {stats}")
+
+        return handle
+
+    @staticmethod
+    def _warm_up(handle: typing.Any) -> bool:
+        """Run a dummy forward pass if the handle is a managed ONNX session."""
+        # Only look for ONNX sessions if the ONNX utils are in use, since
+        # onnxruntime is an optional dependency.
+        session_manager = sys.modules.get(
+            "interactive_gym.utils.onnx_session_manager"
+        )
+        if session_manager is None:
+            return False
+
+        if not isinstance(handle, typing.Hashable):
+            return False
+
+        session = session_manager.SESSION_MANAGER.sessions.get(handle)
+        if session is None:
+            return False
+
+        try:
+            session.warm_up()
+        except Exception as e:
+            logger.warning(f"Failed to warm up policy {handle}: {e}")
+            return False
+
+        return True
+
+    def preload(
+        self, scenes: list[scene.Scene | scene.SceneWrapper]
+    ) -> dict[typing.Any, dict[str, typing.Any]]:
+        """Load every server-side policy used by the scenes and return their load statistics.
+
+        Policies that fail to load are logged and skipped, so that they fail
+        (as before) when a game that uses them is created.
+        """
+        for s in _iter_gym_scenes(scenes):
+            if s.run_through_pyodide or s.load_policy_fn is None:
+                continue
+
+            for policy_id in s.policy_mapping.values():
+                if policy_id in [
+                    configuration_constants.PolicyTypes.Human,
+                    configuration_constants.PolicyTypes.Random,
+                ]:
+                    continue
+
+                try:
+                    self.load(s, policy_id)
+                except Exception as e:
+                    logger.exception(
+                        f"Failed to preload policy {policy_id} for scene {s.scene_id}: {e}"
+                    )
+
+        return self.stats()
+
+    def stats(self) -> dict[typing.Any, dict[str, typing.Any]]:
+        return {
+            stats["policy_id"]: stats for stats in self.load_stats.values()
+        }
+
+
+POLICY_REGISTRY = PolicyRegistry()
@@ -10,6 +10,7 @@ import typing
 import uuid
 
 import eventlet
+import eventlet.queue
 import numpy as np
 from gymnasium import spaces
 
@@ -17,7 +18,8 @@ from interactive_gym.configurations import (
     configuration_constants,
     remote_config,
 )
-from interactive_gym.server import utils
+from interactive_gym.server import env_pool, env_worker, policy_registry, utils
+from interactive_gym.utils import policy_state_store
 from interactive_gym.scenes import scene, gym_scene
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,54 @@ class GameStatus:
     Reset = "reset"
 
 
+@dataclasses.dataclass(frozen=True)
+class BotActionStatus:
+    """What happened to a bot's action on a tick (see `GymScene.policies`)."""
+
+    OnTime = "on_time"
+    Late = "late"
+    Dropped = "dropped"
+    Missed = "missed"
+    Pending = "pending"
+    Idle = "idle"
+
+
+class BotReactionLatency:
+    """Tracks how long a bot takes from receiving an observation to acting on it.
+
+    Reaction latency is measured from when an observation is queued for the
+    bot until its action is applied in a tick, so it includes waiting for the
+    policy consumer to wake up, inference, and waiting for the next tick.
+    """
+
+    def __init__(self):
+        self.num_actions: int = 0
+        self.last_s: float = 0.0
+        self.total_s: float = 0.0
+        self.max_s: float = 0.0
+        self.total_ticks: int = 0
+        self.max_ticks: int = 0
+
+    def record(self, latency_s: float, latency_ticks: int) -> None:
+        self.num_actions += 1
+        self.last_s = latency_s
+        self.total_s += latency_s
+        self.max_s = max(self.max_s, latency_s)
+        self.total_ticks += latency_ticks
+        self.max_ticks = max(self.max_ticks, latency_ticks)
+
+    def stats(self) -> dict[str, float | int]:
+        num_actions = max(self.num_actions, 1)
+        return {
+            "num_actions": self.num_actions,
+            "last_s": self.last_s,
+            "mean_s": self.total_s / num_actions,
+            "max_s": self.max_s,
+            "mean_ticks": self.total_ticks / num_actions,
+            "max_ticks": self.max_ticks,
+        }
+
+
 class RemoteGameV2:
     def __init__(
         self,
@@ -40,7 +90,9 @@ class RemoteGameV2:
     ):
         self.scene = scene
         self.status = GameStatus.Inactive
-        self.lock = threading.Lock()
+        # Reentrant so that a game can be removed (and its env released) by
+        # code that already holds its lock, e.g., when a player leaves.
+        self.lock = threading.RLock()
         self.reset_event: eventlet.event.Event | None = None
         self.set_reset_event()
 
@@ -62,8 +114,32 @@ class RemoteGameV2:
         self.bot_players = {}
         self.bot_threads = {}
 
+        # When (time and tick) the observation waiting in each bot's state
+        # queue was queued, and the same for the observation behind the
+        # action waiting in its pending actions, to measure reaction latency.
+        self.observation_times: dict[str | int, tuple[float, int]] = {}
+        self.action_observation_times: dict[str | int, tuple[float, int]] = {}
+        self.bot_reaction_latencies: dict[str | int, BotReactionLatency] = (
+            collections.defaultdict(BotReactionLatency)
+        )
+
+        # Ticks of the observations each bot hasn't acted on yet, and the
+        # status of each bot's action on the last tick and in total.
+        self.awaited_observation_ticks: dict[
+            str | int, collections.deque[int]
+        ] = collections.defaultdict(collections.deque)
+        self.bot_action_status: dict[str | int, str] = {}
+        self.bot_action_counts: dict[str | int, collections.Counter] = (
+            collections.defaultdict(collections.Counter)
+        )
+
         # Game environment
         self.env = None
+        self.env_pool: env_pool.EnvPool | None = None
+        self.env_released: bool = False
+        # Result of a reset that was already run on the env (e.g., by the
+        # env pool) and will be used in place of the next `env.reset()`.
+        self.prepared_reset: tuple | None = None
         self.obs: np.ndarray | dict[str, typing.Any] | None = None
         self.game_uuid: str = str(uuid.uuid4())
         self.game_id: int | str = (
@@ -88,6 +164,14 @@ class RemoteGameV2:
         self.prev_rewards: dict[str | int, float] = {}
         self.prev_actions: dict[str | int, str | int] = {}
 
+        # The state is emitted every `emit_interval` ticks, which the server
+        # raises under overload (see `GymScene.runtime`). Every change is
+        # recorded so that it can be saved with the game data.
+        self.emit_interval: int = 1
+        self.emit_interval_changes: list[dict[str, typing.Any]] = []
+        # The tick at which the state was last emitted in this episode.
+        self.last_emit_tick: int | None = None
+
         self._build()
 
     def set_reset_event(self) -> None:
@@ -95,9 +179,17 @@ class RemoteGameV2:
         self.reset_event = eventlet.event.Event()
 
     def _build_env(self) -> None:
-        self.env = self.scene.env_creator(
-            **self.scene.env_config, render_mode="rgb_array"
-        )
+        if self.scene.env_pool_size > 0:
+            self.env_pool = env_pool.get_env_pool(self.scene)
+            self.env, self.prepared_reset = self.env_pool.acquire()
+        elif self.scene.num_env_workers > 0:
+            self.env = env_worker.get_env_worker_pool(
+                self.scene.num_env_workers
+            ).make_env(self.scene)
+        else:
+            self.env = self.scene.env_creator(
+                **self.scene.env_config, render_mode="rgb_array"
+            )
 
     def _load_policies(self) -> None:
         """Load and instantiates all policies"""
@@ -109,11 +201,9 @@ class RemoteGameV2:
             elif self.scene.run_through_pyodide:
                 continue
             else:
-                assert (
-                    self.scene.load_policy_fn is not None
-                ), "Must provide a method to load policies via policy name to RemoteConfig!"
-                self.bot_players[agent_id] = self.scene.load_policy_fn(
-                    policy_id
+                # Policies are loaded once per process and shared by all games.
+                self.bot_players[agent_id] = (
+                    policy_registry.POLICY_REGISTRY.load(self.scene, policy_id)
                 )
 
     def _init_bot_threads(self):
@@ -121,24 +211,77 @@ class RemoteGameV2:
         for agent_id, pid in self.bot_players.items():
             if pid == configuration_constants.PolicyTypes.Random:
                 continue
+
+            # A consumer from the previous episode may still be waiting
+            # for an observation, don't leave it running alongside the new one.
+            previous_thread = self.bot_threads.get(agent_id)
+            if previous_thread is not None:
+                previous_thread.kill()
+
             self.bot_threads[agent_id] = eventlet.spawn(
                 self.policy_consumer, agent_id=agent_id
             )
 
     def policy_consumer(self, agent_id: str | int) -> None:
+        """Compute the bot's action whenever a new observation is queued for it.
+
+        The consumer blocks on the bot's state queue, so it wakes up as soon
+        as `enqueue_observations` queues an observation. Without one, it only
+        wakes up once every `frame_skip` ticks to check that the game is
+        still active.
+        """
+        idle_timeout_s = self.scene.frame_skip / self.scene.fps
         while self.status == GameStatus.Active:
-
-            # Game hangs if we don't do this
-            time.sleep(1 / self.scene.fps)
-
             try:
-                state = self.state_queues[agent_id].get(block=False)
+                state = self.state_queues[agent_id].get(timeout=idle_timeout_s)
             except queue.Empty:
                 continue
 
-            policy = self.bot_players[agent_id]
+            if self.status != GameStatus.Active:
+                break
+
+            self.compute_bot_action(agent_id, state)
+
+    def compute_bot_action(self, agent_id: str | int, state: typing.Any) -> None:
+        """Run the bot's policy on an observation taken from its state queue and queue the action."""
+        observed_at = self.observation_times.pop(agent_id, None)
+
+        policy = self.bot_players[agent_id]
+        if self.scene.stateful_policy_inference:
+            action = self.scene.policy_inference_fn(
+                state, policy, state_key=(self.game_uuid, agent_id)
+            )
+        else:
             action = self.scene.policy_inference_fn(state, policy)
-            self.enqueue_action(agent_id, action)
+
+        if self.enqueue_action(agent_id, action) and observed_at is not None:
+            self.action_observation_times[agent_id] = observed_at
+
+    def bot_action_stats(self) -> dict[str | int, dict[str, float | int]]:
+        """Return how many ticks each bot's action had each status, and the share of actions that were on time."""
+        stats = {}
+        for agent_id, counts in self.bot_action_counts.items():
+            num_actions = (
+                counts[BotActionStatus.OnTime]
+                + counts[BotActionStatus.Late]
+                + counts[BotActionStatus.Dropped]
+            )
+            stats[agent_id] = {
+                **counts,
+                "on_time_fraction": (
+                    counts[BotActionStatus.OnTime] / num_actions
+                    if num_actions
+                    else 0.0
+                ),
+            }
+        return stats
+
+    def bot_reaction_stats(self) -> dict[str | int, dict[str, float | int]]:
+        """Return the reaction latency statistics of each bot that has acted."""
+        return {
+            agent_id: latency.stats()
+            for agent_id, latency in self.bot_reaction_latencies.items()
+        }
 
     def get_available_human_agent_ids(self) -> list[str]:
         """List the available human player IDs"""
@@ -190,18 +333,37 @@ class RemoteGameV2:
         for bot_thread in self.bot_threads.values():
             bot_thread.kill()
 
+        policy_state_store.POLICY_STATE_STORE.evict_game(self.game_uuid)
+
         for q in self.pending_actions.values():
             q.queue.clear()
 
-    def enqueue_action(self, subject_id, action) -> None:
-        """Queue an action for a human player"""
-        if self.status != GameStatus.Active:
+    def release_env(self) -> None:
+        """Hand the environment back once the game has been removed.
+
+        Pooled environments are returned to their pool and environments in an
+        env worker are closed, since they hold resources in another process.
+        """
+        if self.env is None or self.env_released:
             return
+        self.env_released = True
+
+        if self.env_pool is not None:
+            self.env_pool.release(self.env)
+        elif isinstance(self.env, env_worker.RemoteEnv):
+            self.env.close()
+
+    def enqueue_action(self, subject_id, action) -> bool:
+        """Queue an action for a player, returning whether it was queued."""
+        if self.status != GameStatus.Active:
+            return False
 
         try:
             self.pending_actions[subject_id].put(action, block=False)
         except queue.Full:
-            pass
+            return False
+
+        return True
 
     def add_player(self, player_id: str | int, identifier: str | int) -> None:
         available_ids = self.get_available_human_agent_ids()
@@ -218,10 +380,16 @@ class RemoteGameV2:
         self.current_ping[player_identifier] = ping
 
     def tick(self) -> None:
+        player_actions = self.get_player_actions()
+        self.process_step(self.step_env(player_actions))
+
+    def get_player_actions(self) -> dict[str | int, typing.Any]:
+        """Collect the action each player will take on this tick."""
 
         # If the queue is empty, we have a mechanism for deciding which action to submit
         # Either the previous submitted action or the default action.
         player_actions = {}
+        self.bot_action_status = {}
 
         for pid, sid in self.human_players.items():
             action = None
@@ -288,19 +456,82 @@ class RemoteGameV2:
             # If we have a specified policy, pop an action from the pending actions queue
             # if there are any
             elif self.pending_actions[pid].qsize() > 0:
-                player_actions[pid] = self.pending_actions[pid].get(block=False)
+                action = self.pending_actions[pid].get(block=False)
+                if self._resolve_bot_action(pid):
+                    player_actions[pid] = action
+            elif bot != configuration_constants.PolicyTypes.Random:
+                self._record_bot_action_status(pid, self._waiting_status(pid))
 
         self.prev_actions = player_actions
-        try:
-            self.obs, rewards, terminateds, truncateds, _ = self.env.step(
-                player_actions
-            )
+        return player_actions
+
+    @property
+    def bot_action_deadline_ticks(self) -> int:
+        if self.scene.bot_action_deadline_ticks is None:
+            return self.scene.frame_skip
+        return self.scene.bot_action_deadline_ticks
+
+    def _resolve_bot_action(self, agent_id: str | int) -> bool:
+        """Check a bot action against its deadline and record its status and latency.
+
+        Returns whether the action should be applied on this tick.
+        """
+        observed_at = self.action_observation_times.pop(agent_id, None)
+        if observed_at is None:
+            self._record_bot_action_status(agent_id, BotActionStatus.OnTime)
+            return True
+
+        observed_time, observed_tick = observed_at
+        latency_ticks = self.tick_num - observed_tick
+        self.bot_reaction_latencies[agent_id].record(
+            time.monotonic() - observed_time, latency_ticks
+        )
+
+        # The action answers its observation and any earlier ones.
+        awaited_ticks = self.awaited_observation_ticks[agent_id]
+        while awaited_ticks and awaited_ticks[0] <= observed_tick:
+            awaited_ticks.popleft()
+
+        if latency_ticks <= self.bot_action_deadline_ticks:
+            self._record_bot_action_status(agent_id, BotActionStatus.OnTime)
+            return True
+
+        if (
+            self.scene.late_bot_action_policy
+            == configuration_constants.LateBotActionPolicies.Drop
+        ):
+            self._record_bot_action_status(agent_id, BotActionStatus.Dropped)
+            return False
+
+        self._record_bot_action_status(agent_id, BotActionStatus.Late)
+        return True
+
+    def _waiting_status(self, agent_id: str | int) -> str:
+        """Status of a bot without an action on this tick."""
+        awaited_ticks = self.awaited_observation_ticks[agent_id]
+        if not awaited_ticks:
+            return BotActionStatus.Idle
 
+        if self.tick_num - awaited_ticks[0] > self.bot_action_deadline_ticks:
+            return BotActionStatus.Missed
+
+        return BotActionStatus.Pending
+
+    def _record_bot_action_status(self, agent_id: str | int, status: str) -> None:
+        self.bot_action_status[agent_id] = status
+        self.bot_action_counts[agent_id][status] += 1
+
+    def step_env(self, player_actions: dict[str | int, typing.Any]) -> tuple:
+        """Step the environment with the players' actions."""
+        try:
+            return self.env.step(player_actions)
         except AssertionError:
             player_actions = list(player_actions.values())[0]
-            self.obs, rewards, terminateds, truncateds, _ = self.env.step(
-                player_actions
-            )
+            return self.env.step(player_actions)
+
+    def process_step(self, step_result: tuple) -> None:
+        """Update the game with the result of an environment step."""
+        self.obs, rewards, terminateds, truncateds, _ = step_result
 
         self.prev_rewards = (
             rewards if isinstance(rewards, dict) else {"reward": rewards}
@@ -345,28 +576,49 @@ class RemoteGameV2:
             try:
                 self.state_queues[pid].put(obs, block=False)
             except queue.Full:
-                pass
+                continue
+
+            self.observation_times[pid] = (time.monotonic(), self.tick_num)
+            self.awaited_observation_ticks[pid].append(self.tick_num)
 
     def reset_pending_actions(self) -> None:
         self.pending_actions = collections.defaultdict(
             lambda: queue.Queue(maxsize=1)
         )
+        self.action_observation_times = {}
+        self.awaited_observation_ticks = collections.defaultdict(
+            collections.deque
+        )
 
     def reset_state_queues(self) -> None:
+        # Green queues, so that policy consumers can block on them
+        # until an observation arrives without blocking the server.
         self.state_queues = collections.defaultdict(
-            lambda: queue.Queue(maxsize=1)
+            lambda: eventlet.queue.Queue(maxsize=1)
         )
+        self.observation_times = {}
 
     def reset(self, seed: int | None = None) -> None:
         self.reset_pending_actions()
+        # Drop observations left over from the previous episode, so that
+        # the first observation of this one isn't rejected as a duplicate.
+        self.reset_state_queues()
         self.prev_actions = {}
         self.prev_rewards = {}
-        self.obs, _ = self.env.reset(seed=seed)
+        if self.prepared_reset is not None and seed is None:
+            self.obs, _ = self.prepared_reset
+        else:
+            self.obs, _ = self.env.reset(seed=seed)
+        self.prepared_reset = None
         self.status = GameStatus.Active
 
+        # Recurrent bots start every episode from a zero state.
+        policy_state_store.POLICY_STATE_STORE.reset_game(self.game_uuid)
+
         self._init_bot_threads()
 
         self.tick_num = 0
+        self.last_emit_tick = None
 
         self.enqueue_observations()
 
@@ -0,0 +1,299 @@
+"""
+Encoding of the environment state that the server emits to each game's room.
+
+`env_to_state_fn` returns every object in the scene on every tick, even though
+in most environments (e.g., grid worlds) few of them change from one tick to
+the next. With delta encoding, the server remembers the last state it sent to
+a room and emits only the objects that were added or changed since then, along
+with the `uuid`s of those that were removed. A full keyframe is sent at the
+start of each episode, when a participant joins, and every `keyframe_interval`
+emits, and the client rebuilds the full state from the keyframe and the deltas
+that follow it (see `addStateToBuffer` in `phaser_gym_graphics.js`).
+
+With binary encoding, the objects of each frame are also packed with msgpack
+rather than sent as JSON dicts. Each object type has a registered schema (its
+fields in a fixed order and their defaults), so an object is sent as a row of
+its type's small integer tag followed by its values, without the field names
+and without trailing values that are equal to their defaults. Strings such as
+`uuid`s, image names, and colors are interned: each is sent once after a
+keyframe and then referenced by its index in the room's string table.
+"""
+
+from __future__ import annotations
+
+import copy
+import dataclasses
+import typing
+
+import msgpack
+
+from interactive_gym.configurations import object_contexts
+
+
+@dataclasses.dataclass(frozen=True)
+class ObjectSchema:
+    """The fields an object type is sent with, in order, and their defaults."""
+
+    object_type: str
+    fields: tuple[str, ...]
+    defaults: tuple[typing.Any, ...]
+    # Fields whose values are always strings (or None), which are interned.
+    interned_fields: frozenset[str] = frozenset()
+
+
+# Schemas by object type, and the tag each object type is sent with.
+OBJECT_SCHEMAS: dict[str, ObjectSchema] = {}
+OBJECT_TYPE_TAGS: dict[str, int] = {}
+
+# Fields of the object contexts that always hold strings (or None).
+INTERNED_FIELDS = frozenset(
+    ["uuid", "image_name", "animation", "color", "font", "text", "name"]
+)
+
+
+def register_object_schema(schema: ObjectSchema) -> None:
+    """Register the schema of an object type so that it can be binary encoded."""
+    if schema.object_type not in OBJECT_TYPE_TAGS:
+        OBJECT_TYPE_TAGS[schema.object_type] = len(OBJECT_TYPE_TAGS)
+    OBJECT_SCHEMAS[schema.object_type] = schema
+
+
+def schema_from_dataclass(cls: type) -> ObjectSchema:
+    """Build the schema of an object context dataclass (e.g., `object_contexts.Sprite`)."""
+    fields = [
+        field for field in dataclasses.fields(cls) if field.name != "object_type"
+    ]
+    return ObjectSchema(
+        object_type=cls.__dataclass_fields__["object_type"].default,
+        fields=tuple(field.name for field in fields),
+        # Required fields have no default (dataclasses.MISSING), so they're never trimmed.
+        defaults=tuple(field.default for field in fields),
+        interned_fields=frozenset(
+            field.name for field in fields if field.name in INTERNED_FIELDS
+        ),
+    )
+
+
+for _object_context in [
+    object_contexts.Sprite,
+    object_contexts.Line,
+    object_contexts.Circle,
+    object_contexts.Polygon,
+    object_contexts.Text,
+    object_contexts.AtlasSpec,
+    object_contexts.MultiAtlasSpec,
+    object_contexts.ImgSpec,
+    object_contexts.RenderedEnvRGB,
+]:
+    register_object_schema(schema_from_dataclass(_object_context))
+
+
+class ObjectContextCodec:
+    """Packs a room's frames of object dicts into msgpack with the registered schemas.
+
+    Each payload is a msgpack array of `[schemas, new_strings, rows, removed]`:
+    the schemas (only after a reset, i.e., in keyframes), the strings added to
+    the room's string table, one row per object, and the string table indices
+    of the removed objects' uuids.
+    """
+
+    def __init__(self):
+        self.strings: dict[str, int] = {}
+
+    def _intern(self, value: str, new_strings: list[str]) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings[value] = index
+            new_strings.append(value)
+        return index
+
+    def encode(
+        self,
+        objects: list[dict[str, typing.Any]],
+        removed_uuids: list[str] | None = None,
+        reset: bool = False,
+    ) -> bytes:
+        """Pack objects (and the uuids of removed objects) into a payload.
+
+        :param reset: Whether to clear the string table and send the schemas, as for a keyframe.
+        """
+        if reset:
+            self.strings = {}
+
+        new_strings: list[str] = []
+        rows = []
+        for obj in objects:
+            schema = OBJECT_SCHEMAS.get(obj["object_type"])
+            assert (
+                schema is not None
+            ), f"Unrecognized object type: {obj['object_type']}"
+
+            values = []
+            for field, default in zip(schema.fields, schema.defaults):
+                value = obj.get(field, default)
+                if field in schema.interned_fields and value is not None:
+                    value = self._intern(str(value), new_strings)
+                values.append(value)
+
+            # Trailing values equal to their defaults are filled in by the client.
+            num_values = len(values)
+            while (
+                num_values > 0
+                and schema.defaults[num_values - 1] is not dataclasses.MISSING
+                and obj.get(schema.fields[num_values - 1])
+                == schema.defaults[num_values - 1]
+            ):
+                num_values -= 1
+
+            rows.append(
+                [OBJECT_TYPE_TAGS[schema.object_type], *values[:num_values]]
+            )
+
+        removed = [
+            self._intern(uuid, new_strings) for uuid in removed_uuids or []
+        ]
+
+        schemas = None
+        if reset:
+            schemas = [
+                [
+                    OBJECT_TYPE_TAGS[schema.object_type],
+                    schema.object_type,
+                    list(schema.fields),
+                    [
+                        None if default is dataclasses.MISSING else default
+                        for default in schema.defaults
+                    ],
+                    [field in schema.interned_fields for field in schema.fields],
+                ]
+                for schema in OBJECT_SCHEMAS.values()
+            ]
+
+        return msgpack.packb(
+            [schemas, new_strings, rows, removed], use_bin_type=True
+        )
+
+
+def _copy_objects(
+    state: list[dict[str, typing.Any]],
+) -> dict[str, dict[str, typing.Any]]:
+    """Copy a frame's objects by uuid.
+
+    Objects are deep copied so that an env that reuses its dicts (or their
+    lists, e.g., the `points` of a `Line` or `Polygon`) across ticks doesn't
+    change what we compare the next frame against.
+    """
+    return {obj["uuid"]: copy.deepcopy(obj) for obj in state}
+
+
+class StateDeltaEncoder:
+    """Turns the state objects of a room's frames into keyframes and deltas."""
+
+    def __init__(self, keyframe_interval: int, binary: bool = False):
+        """
+        :param keyframe_interval: Send a full keyframe every this many emits.
+        :param binary: Whether to pack the objects with an `ObjectContextCodec` rather than send them as dicts.
+        """
+        assert keyframe_interval >= 1, "keyframe_interval must be >= 1."
+        self.keyframe_interval = keyframe_interval
+        self.codec = ObjectContextCodec() if binary else None
+
+        # The objects of the last frame sent to the room, by uuid.
+        self.last_objects: dict[str, dict[str, typing.Any]] = {}
+        self.last_hud_text: str | None = None
+        self.emits_since_keyframe: int = 0
+        self.keyframe_requested: bool = True
+
+        self.num_keyframes: int = 0
+        self.num_deltas: int = 0
+
+    def request_keyframe(self) -> None:
+        """Send a full keyframe on the next emit (e.g., because a participant joined)."""
+        self.keyframe_requested = True
+
+    def encode(
+        self,
+        state: list[dict[str, typing.Any]] | None,
+        hud_text: str | None,
+    ) -> dict[str, typing.Any]:
+        """Return the fields of the `environment_state` event for a frame.
+
+        Keyframes hold the full list of objects in `game_state_objects`. Deltas
+        instead hold the objects that were added or changed in `changed_objects`
+        and the uuids of those that were removed in `removed_objects`, and only
+        include `hud_text` if it changed. With binary encoding, the objects
+        (and removed uuids) are instead packed into `encoded_objects`.
+
+        :param state: The output of `env_to_state_fn`, or None if the env is rendered to an image.
+        :param hud_text: The output of `hud_text_fn`, if any.
+        """
+        if (
+            state is None
+            or self.keyframe_requested
+            or self.emits_since_keyframe + 1 >= self.keyframe_interval
+        ):
+            return self._keyframe(state, hud_text)
+
+        objects = _copy_objects(state)
+        changed_objects = [
+            obj
+            for uuid, obj in objects.items()
+            if self.last_objects.get(uuid) != obj
+        ]
+        removed_objects = [
+            uuid for uuid in self.last_objects if uuid not in objects
+        ]
+
+        self.last_objects = objects
+        self.emits_since_keyframe += 1
+        self.num_deltas += 1
+
+        if self.codec is not None:
+            frame = {
+                "keyframe": False,
+                "encoded_objects": self.codec.encode(
+                    changed_objects, removed_objects
+                ),
+            }
+        else:
+            frame = {
+                "keyframe": False,
+                "changed_objects": changed_objects,
+                "removed_objects": removed_objects,
+            }
+        if hud_text != self.last_hud_text:
+            frame["hud_text"] = hud_text
+            self.last_hud_text = hud_text
+
+        return frame
+
+    def _keyframe(
+        self,
+        state: list[dict[str, typing.Any]] | None,
+        hud_text: str | None,
+    ) -> dict[str, typing.Any]:
+        self.last_objects = _copy_objects(state) if state is not None else {}
+        self.last_hud_text = hud_text
+        self.emits_since_keyframe = 0
+        self.keyframe_requested = False
+        self.num_keyframes += 1
+
+        if self.codec is not None and state is not None:
+            return {
+                "keyframe": True,
+                "encoded_objects": self.codec.encode(state, reset=True),
+                "hud_text": hud_text,
+            }
+
+        return {
+            "keyframe": True,
+            "game_state_objects": state,
+            "hud_text": hud_text,
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "num_keyframes": self.num_keyframes,
+            "num_deltas": self.num_deltas,
+        }
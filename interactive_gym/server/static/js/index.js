@@ -1,7 +1,8 @@
 import * as ui_utils from './ui_utils.js';
 import {startUnityScene, terminateUnityScene, shutdownUnityGame, preloadUnityGame} from './unity_utils.js';
-import {graphics_start, graphics_end, addStateToBuffer, getRemoteGameData, pressedKeys} from './phaser_gym_graphics.js';
+import {graphics_start, graphics_end, addStateToBuffer, getRemoteGameData, addLockstepActions, reportLockstepDesync} from './phaser_gym_graphics.js';
 import {RemoteGame} from './pyodide_remote_game.js';
+import {loadONNXPolicy} from './onnx_inference.js';
 
 window.socket = io();
 var socket = window.socket;
@@ -12,6 +13,7 @@ var maxLatency;
 
 
 var pyodideRemoteGame = null;
+var onnxPoliciesReady = true;
 
 var documentInFocus = false;
 document.addEventListener("visibilitychange", function() {
@@ -87,6 +89,27 @@ function pyodideReadyIfUsing() {
     return pyodideRemoteGame.pyodideReady;
 }
 
+function prefetchONNXPolicies(policyMapping) {
+    // Load and warm up the scene's ONNX policies while the participant reads the
+    // instructions, rather than on the bots' first action in the game.
+    const policyIDs = [...new Set(Object.values(policyMapping || {}))].filter(
+        policyID => typeof policyID === "string" && (policyID.endsWith(".onnx") || policyID.endsWith(".ort"))
+    );
+    if (policyIDs.length === 0) {
+        return;
+    }
+
+    onnxPoliciesReady = false;
+    Promise.all(policyIDs.map(policyID => loadONNXPolicy(policyID)))
+        .catch((error) => {
+            // Don't keep the participant from starting, the bots will fall back to the default action
+            console.error("Failed to load ONNX policies:", error);
+        })
+        .finally(() => {
+            onnxPoliciesReady = true;
+        });
+}
+
 
 $(function() {
     $('#startButton').click( () => {
@@ -161,13 +184,29 @@ socket.on('start_game', function(data) {
         'animation_configs': scene_metadata.animation_configs,
         'pyodide_remote_game': pyodideRemoteGame,
         'scene_metadata': scene_metadata,
+        'lockstep': data.lockstep,
     };
 
-    ui_utils.enableKeyListener(scene_metadata.input_mode)
+    // Lockstep games reset with the seed the server picked, so every client steps the same environment
+    if (pyodideRemoteGame !== null) {
+        pyodideRemoteGame.setSeed(data.lockstep !== undefined ? data.lockstep.seed : null);
+    }
+
+    ui_utils.enableKeyListener(scene_metadata.input_mode, scene_metadata.run_through_pyodide)
     graphics_start(graphics_config);
 });
 
 
+socket.on('lockstep_actions', function(data) {
+    addLockstepActions(data);
+});
+
+
+socket.on('lockstep_desync', function(data) {
+    reportLockstepDesync(data);
+});
+
+
 var waitroomInterval;
 socket.on("waiting_room", function(data) {
     if (waitroomInterval) {
@@ -297,10 +336,11 @@ socket.on("game_reset", function(data) {
     };
 
     let input_mode = scene_metadata.input_mode;
+    let run_through_pyodide = scene_metadata.run_through_pyodide;
 
     startResetCountdown(data.timeout, function() {
         // This function will be called after the countdown
-        ui_utils.enableKeyListener(input_mode);
+        ui_utils.enableKeyListener(input_mode, run_through_pyodide);
         graphics_start(graphics_config);
 
         socket.emit("reset_complete", {room: data.room, session_id: window.sessionId});
@@ -355,9 +395,26 @@ socket.on("create_game_failed", function(data) {
 })
 
 
+socket.on("admission_queue", function(data) {
+    // The server is at capacity, so we wait in a queue until it admits us.
+    $("#instructions").hide();
+    $("#waitroomText").text(`The server is busy. You are number ${data.position} of ${data.queue_length} in line and will be placed in a game as soon as there is room...`);
+    $("#waitroomText").show();
+})
+
+socket.on("admission_granted", function(data) {
+    // We were admitted from the queue, so request the game again.
+    $("#waitroomText").hide();
+    socket.emit("join_game", {session_id: window.sessionId});
+})
+
+
 socket.on('environment_state', function(data) {
     $('#hudText').show()
-    $('#hudText').text(data.hud_text)
+    // Delta-encoded frames only include the HUD text when it changes
+    if (data.hud_text !== undefined) {
+        $('#hudText').text(data.hud_text)
+    }
     addStateToBuffer(data);
 });
 
@@ -400,12 +457,6 @@ socket.on('update_game_page_text', function(data) {
 })
 
 
-// var pressedKeys = {};
-
-socket.on('request_pressed_keys', function(data) {
-    console.log("request_pressed_keys", ui_utils.pressedKeys, pressedKeys, window.sessionId)
-    socket.emit('send_pressed_keys', {'pressed_keys': Object.keys(pressedKeys), session_id: window.sessionId});
-});
 
 
 
@@ -578,6 +629,7 @@ function startGymScene(data) {
 
     // First, check if we need to initialize Pyodide
     if (data.run_through_pyodide) {
+        prefetchONNXPolicies(data.policy_mapping);
         initializePyodideRemoteGame(data);
         enableCheckPyodideDone();
     };
@@ -748,7 +800,7 @@ function enableStartRefreshInterval() {
             $("#startButton").show();
             $("#startButton").attr("disabled", true);
         } 
-        else if (pyodideReadyIfUsing()){
+        else if (pyodideReadyIfUsing() && onnxPoliciesReady){
             $('#errorText').hide()
             $("#startButton").show();
             $("#startButton").attr("disabled", false);
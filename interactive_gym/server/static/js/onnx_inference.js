@@ -1,175 +1,145 @@
-// import * as ort from 'https://cdnjs.cloudflare.com/ajax/libs/onnxruntime-web/1.10.0/ort.min.js';
+// Bot policies run in a Web Worker (onnx_worker.js) so that inference doesn't block
+// the main thread, where Phaser renders and Pyodide steps the environment.
 
-// Store loaded models to avoid reloading
-const loadedModels = {};
-const hiddenStates = {};
+const worker = new Worker(new URL('./onnx_worker.js', import.meta.url));
 
-export async function actionFromONNX(policyID, observation) {
-    // Conduct forward inference
-    const logits = await inferenceONNXPolicy(policyID, observation);
-
-    // Apply softmax to convert logits to probabilities
-    const probabilities = softmax(logits);
+// requestID -> {resolve, reject} of requests waiting on the worker
+const pendingRequests = {};
+let nextRequestID = 0;
 
-    // Sample an action based on the probabilities
-    const action = sampleAction(probabilities);
+// policyID -> observation buffers the worker has returned, to reuse in later requests
+const observationBuffers = {};
 
-    return action;
-}
-
-async function inferenceONNXPolicy(policyID, observation) {
-
-    // If the observation is an Array of Arrays or a dictionary with some values being Arrays of Arrays,
-    // flatten them to a single Array
-    if (Array.isArray(observation)) {
-        observation = observation.flat(Infinity);
-    } else if (typeof observation === 'object') {
-        for (let key in observation) {
-            if (Array.isArray(observation[key])) {
-                observation[key] = observation[key].flat(Infinity);
-            }
-        }
+worker.onmessage = (event) => {
+    const message = event.data;
+    const request = pendingRequests[message.requestID];
+    if (request === undefined) {
+        return;
     }
+    delete pendingRequests[message.requestID];
 
-    // Ensure observation is a Float32Array
-    if (typeof observation === 'object' && !Array.isArray(observation)) {
-        // If observation is a dictionary
-        for (let key in observation) {
-            if (Array.isArray(observation[key])) {
-                observation[key] = new Float32Array(observation[key]);
-            }
-        }
-    } else if (Array.isArray(observation)) {
-        // If observation is already an array
-        observation = new Float32Array(observation);
-    } else {
-        throw new Error('Observation must be either an object or an array');
+    if (message.type === "error") {
+        request.reject(new Error(message.message));
+        return;
     }
 
-    // If there are any image observations, make sure that they are appropriately shaped
-    // toJs will return an Array full of Array objects, but we need a single 3-D array
-    
-    // Load the model if not already loaded
-    if (!loadedModels[policyID]) {
-        loadedModels[policyID] = await window.ort.InferenceSession.create(
-            policyID, {executionProviders: ["wasm"],}
-          );
-    }
-    
-    const session = loadedModels[policyID];
-    
-    // If the observation is a dictionary, flatten all the values into a single array
-    if (typeof observation === 'object' && !Array.isArray(observation)) {
-        observation = flattenObservation(observation);
+    if (message.observations !== undefined) {
+        observationBuffers[request.policyID].push(message.observations);
     }
+    request.resolve(message.actions);
+};
+
+function sendRequest(policyID, message, transfer = []) {
+    return new Promise((resolve, reject) => {
+        const requestID = nextRequestID++;
+        pendingRequests[requestID] = {resolve: resolve, reject: reject, policyID: policyID};
+        worker.postMessage({...message, requestID: requestID, policyID: resolvePolicyURL(policyID)}, transfer);
+    });
+}
 
+// Policy IDs are paths relative to the page (e.g., "static/assets/.../model.onnx"), which
+// the worker would resolve against its own script's URL, so the worker gets the absolute URL.
+function resolvePolicyURL(policyID) {
+    return new URL(policyID, document.baseURI).href;
+}
 
+// Load a policy in the worker ahead of its first use.
+export async function loadONNXPolicy(policyID) {
+    await sendRequest(policyID, {type: "load"});
+}
 
-    // Observation should be shape (observationSize,), reshape to add batch dimension of 1
-    // and convert to an ort.Tensor
-    const inputTensor = new window.ort.Tensor('float32', observation, [1, observation.length]);
-
-    // TODO(chase): We need to add the onnx inputs to the configuration!
-    const feeds = {
-        'obs': inputTensor,
-        // 'seq_lens': new window.ort.Tensor('float32', new Float32Array([1])),
-        // 'state_ins': [new window.ort.Tensor('float32', new Float32Array([0]), [1])]
-    };
-
-    // Check if the model is recurrent by inspecting input names, we're following
-    // the RLlib convention of naming hidden states as 'state_in_0', 'state_in_1', etc.
-    const isRecurrent = session.inputNames.some(name => name.startsWith('state_in_'));
-    
-    if (isRecurrent) {
-        // Load hidden states if available, otherwise initialize them
-        if (!hiddenStates[policyID]) {
-            hiddenStates[policyID] = {};
-        }
-
-        session.inputNames.forEach(name => {
-            if (name.startsWith('state_in_')) {
-                if (!hiddenStates[policyID][name]) {
+// Reset the hidden states of recurrent policies, e.g., at the start of an episode.
+export function resetONNXHiddenStates() {
+    worker.postMessage({type: "reset"});
+}
 
-                    // TODO(chase): retrieve the shape; this hardcodes hidden states to [1, 256]
-                    const expectedShape = [1, 256] // inputMetadata[name].dimensions;
+// Sample actions for several agents that share a policy with a single forward pass.
+// `observations` maps agent IDs to observations (a Map or an object) and the
+// returned object maps the same agent IDs to actions.
+export async function actionsFromONNX(policyID, observations) {
+    const entries = observations instanceof Map ? [...observations.entries()] : Object.entries(observations);
+    if (entries.length === 0) {
+        return {};
+    }
 
-                    // Initialize the hidden state tensor with zeros
-                    hiddenStates[policyID][name] = new window.ort.Tensor('float32', new Float32Array(expectedShape.reduce((a, b) => a * b)), expectedShape);
-                } 
-                feeds[name] = hiddenStates[policyID][name];
-            }
-        });
+    const agentIDs = entries.map(([agentID, observation]) => agentID);
+    const observationSize = observationLength(entries[0][1]);
+    const batch = getObservationBuffer(policyID, entries.length * observationSize);
+    entries.forEach(([agentID, observation], row) => {
+        writeObservation(observation, batch, row * observationSize);
+    });
+
+    const actions = await sendRequest(
+        policyID,
+        {type: "infer", agentIDs: agentIDs, observations: batch, observationSize: observationSize},
+        [batch.buffer]
+    );
+
+    const actionsByAgent = {};
+    agentIDs.forEach((agentID, row) => {
+        actionsByAgent[agentID] = actions[row];
+    });
+    return actionsByAgent;
+}
 
-        feeds['seq_lens'] = new window.ort.Tensor('float32', new Float32Array([1]));
-    } else {
-        feeds['state_ins'] = new window.ort.Tensor('float32', new Float32Array([1]));
+export async function actionFromONNX(policyID, observation) {
+    const actions = await actionsFromONNX(policyID, {0: observation});
+    return actions[0];
+}
 
+function getObservationBuffer(policyID, length) {
+    if (observationBuffers[policyID] === undefined) {
+        observationBuffers[policyID] = [];
     }
 
-    // Run inference
-    const results = await session.run(feeds);
-
-    // Get the output logits (assuming single output)
-    const logits = results[session.outputNames[0]].data;
-
-    return logits
+    const buffers = observationBuffers[policyID];
+    const index = buffers.findIndex(buffer => buffer.length === length);
+    if (index === -1) {
+        return new Float32Array(length);
+    }
+    return buffers.splice(index, 1)[0];
 }
 
-// Softmax function to convert logits to probabilities
-function softmax(logits) {
-    const maxLogit = Math.max(...logits);
-    const exps = logits.map(logit => Math.exp(logit - maxLogit));
-    const sumExps = exps.reduce((a, b) => a + b, 0);
-    return exps.map(exp => exp / sumExps);
+// Number of values in an observation once flattened. Observations from Pyodide
+// can be numbers, (nested) arrays, typed arrays, or dictionaries (Maps or objects).
+function observationLength(observation) {
+    if (typeof observation === 'number' || typeof observation === 'boolean') {
+        return 1;
+    } else if (ArrayBuffer.isView(observation)) {
+        return observation.length;
+    } else if (Array.isArray(observation)) {
+        return observation.reduce((length, value) => length + observationLength(value), 0);
+    } else if (typeof observation === 'object' && observation !== null) {
+        return sortedValues(observation).reduce((length, value) => length + observationLength(value), 0);
+    }
+    throw new Error('Observation must be either an object or an array');
 }
 
-// Function to sample an action based on probabilities
-function sampleAction(probabilities) {
-    const cumulativeProbabilities = probabilities.reduce((acc, prob) => {
-        if (acc.length === 0) {
-            return [prob];
-        } else {
-            return [...acc, acc[acc.length - 1] + prob];
-        }
-    }, []);
-
-    const randomValue = Math.random();
-
-    for (let i = 0; i < cumulativeProbabilities.length; i++) {
-        if (randomValue < cumulativeProbabilities[i]) {
-            return i;
+// Flatten an observation into `out` starting at `offset`, returning the offset after it.
+// The values of dictionary observations are concatenated in the order of their sorted keys.
+function writeObservation(observation, out, offset) {
+    if (typeof observation === 'number' || typeof observation === 'boolean') {
+        out[offset] = observation;
+        return offset + 1;
+    } else if (ArrayBuffer.isView(observation)) {
+        out.set(observation, offset);
+        return offset + observation.length;
+    } else if (Array.isArray(observation)) {
+        for (const value of observation) {
+            offset = writeObservation(value, out, offset);
         }
+        return offset;
     }
 
-    // Fallback in case of floating-point precision issues
-    return cumulativeProbabilities.length - 1;
+    for (const value of sortedValues(observation)) {
+        offset = writeObservation(value, out, offset);
+    }
+    return offset;
 }
 
-
-function flattenObservation(observation) {
-    // Initialize an empty Float32Array
-    let concatenatedArray = new Float32Array(0);
-
-    // Sort the keys of the observation dictionary
-    const sortedKeys = Object.keys(observation).sort();
-
-    // Iterate over each value (which should be an array) in the sorted observation dictionary
-    for (const key of sortedKeys) {
-        const array = observation[key];
-        // Continuously concatenate each array using Float32Concat
-        concatenatedArray = Float32Concat(concatenatedArray, new Float32Array(array));
+function sortedValues(observation) {
+    if (observation instanceof Map) {
+        return [...observation.keys()].sort().map(key => observation.get(key));
     }
-
-    return concatenatedArray;
+    return Object.keys(observation).sort().map(key => observation[key]);
 }
-
-function Float32Concat(first, second)
-{
-    var firstLength = first.length,
-        result = new Float32Array(firstLength + second.length);
-
-    result.set(first);
-    result.set(second, firstLength);
-
-    return result;
-}
\ No newline at end of file
@@ -0,0 +1,389 @@
+// Web Worker that runs bot policies with onnxruntime-web, off of the main thread
+// so that inference doesn't compete with Phaser's render loop and the Pyodide step.
+//
+// Messages from the main thread (see onnx_inference.js):
+//   {type: "load", requestID, policyID}  Load and warm up a policy ahead of its first use.
+//   {type: "infer", requestID, policyID, agentIDs, observations, observationSize}
+//       `observations` is a Float32Array with one row of `observationSize` per agent,
+//       transferred to the worker and transferred back with the result for reuse.
+//   {type: "reset"}  Reset the hidden states of recurrent policies (e.g., new episode).
+// Replies:
+//   {type: "loaded", requestID}
+//   {type: "actions", requestID, actions, observations}
+//   {type: "error", requestID, message}
+
+const ORT_CDN_URL = "https://cdnjs.cloudflare.com/ajax/libs/onnxruntime-web/1.10.0/";
+
+importScripts(`${ORT_CDN_URL}ort.min.js`);
+
+// onnxruntime-web looks for its .wasm files next to the script that loads it,
+// which in a worker is this file in our static directory, so point it at the CDN.
+ort.env.wasm.wasmPaths = ORT_CDN_URL;
+
+// Multi-threaded WASM requires cross-origin isolation, which we can't assume.
+ort.env.wasm.numThreads = 1;
+
+// policyID -> {session, inputShapes, stateInputNames, isRecurrent, queue, buffers}
+const policies = {};
+
+// `${policyID}:${agentID}` -> {state_in_0: Float32Array, ...}
+const hiddenStates = {};
+
+// Agent ID used for the dummy forward pass that warms up a session
+const WARM_UP_AGENT_ID = "__warm_up__";
+
+// policyID -> {error, time} of its last failed load. Inference calls fail with that
+// error until the retry interval has passed, rather than refetching on every tick.
+const failedLoads = {};
+const LOAD_RETRY_INTERVAL_MS = 10000;
+
+
+self.onmessage = async (event) => {
+    const message = event.data;
+    try {
+        if (message.type === "load") {
+            await loadPolicy(message.policyID);
+            self.postMessage({type: "loaded", requestID: message.requestID});
+        } else if (message.type === "infer") {
+            const actions = await inferActions(message);
+            self.postMessage(
+                {
+                    type: "actions",
+                    requestID: message.requestID,
+                    actions: actions,
+                    observations: message.observations,
+                },
+                [actions.buffer, message.observations.buffer]
+            );
+        } else if (message.type === "reset") {
+            for (const key of Object.keys(hiddenStates)) {
+                delete hiddenStates[key];
+            }
+        }
+    } catch (error) {
+        self.postMessage({type: "error", requestID: message.requestID, message: String(error)});
+    }
+};
+
+
+async function loadPolicy(policyID) {
+    const failedLoad = failedLoads[policyID];
+    if (
+        policies[policyID] === undefined
+        && failedLoad !== undefined
+        && Date.now() - failedLoad.time < LOAD_RETRY_INTERVAL_MS
+    ) {
+        throw failedLoad.error;
+    }
+
+    if (policies[policyID] === undefined) {
+        const loading = createPolicy(policyID).then(async (policy) => {
+            // Warming up only speeds up the first inference, so a policy
+            // whose warm-up fails can still be used.
+            try {
+                await warmUpPolicy(policyID, policy);
+            } catch (error) {
+                console.warn(`Failed to warm up ${policyID}: ${error}`);
+            }
+            delete failedLoads[policyID];
+            return policy;
+        });
+        policies[policyID] = loading;
+
+        // Don't keep a failed load around, so that it's retried after the interval.
+        loading.catch((error) => {
+            if (policies[policyID] === loading) {
+                delete policies[policyID];
+                failedLoads[policyID] = {error: error, time: Date.now()};
+            }
+        });
+    }
+    return policies[policyID];
+}
+
+
+async function createPolicy(policyID) {
+    const response = await fetch(policyID);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch ${policyID}: ${response.status}`);
+    }
+    const modelBytes = new Uint8Array(await response.arrayBuffer());
+
+    const session = await ort.InferenceSession.create(modelBytes, {executionProviders: ["wasm"]});
+
+    // Following RLlib's convention, recurrent models name their hidden states
+    // 'state_in_0', 'state_in_1', ... and return the next ones as 'state_out_0', ...
+    const stateInputNames = session.inputNames.filter(name => name.startsWith("state_in_"));
+    const inputShapes = getInputShapes(session, policyID, modelBytes);
+
+    for (const name of stateInputNames) {
+        if (inputShapes[name] === undefined) {
+            throw new Error(`Couldn't find the shape of ${name} in ${policyID}.`);
+        }
+    }
+
+    return {
+        session: session,
+        inputShapes: inputShapes,
+        stateInputNames: stateInputNames,
+        isRecurrent: stateInputNames.length > 0,
+        // Inference calls on a session run one at a time.
+        queue: Promise.resolve(),
+        // Preallocated arrays, per batch size.
+        buffers: {},
+    };
+}
+
+
+// Shapes of the model's inputs, without the batch dimension. Newer versions of
+// onnxruntime-web expose them on the session, otherwise they're read from the model
+// (only possible for .onnx files, not ONNX Runtime's .ort format).
+function getInputShapes(session, policyID, modelBytes) {
+    const shapes = {};
+    if (session.inputMetadata !== undefined) {
+        for (const [index, name] of session.inputNames.entries()) {
+            const metadata = Array.isArray(session.inputMetadata)
+                ? session.inputMetadata[index]
+                : session.inputMetadata[name];
+            if (metadata !== undefined && metadata.shape !== undefined) {
+                shapes[name] = metadata.shape.slice(1).map(dim => (typeof dim === "number" ? dim : 1));
+            }
+        }
+        return shapes;
+    }
+
+    if (!policyID.endsWith(".onnx")) {
+        return {};
+    }
+    return readOnnxInputShapes(modelBytes);
+}
+
+
+// The first run of a session is much slower than the rest (allocations, kernel
+// selection), so run it on a dummy observation before the policy is used in a game.
+async function warmUpPolicy(policyID, policy) {
+    if (policy.inputShapes["obs"] === undefined) {
+        return;
+    }
+
+    const observationSize = policy.inputShapes["obs"].reduce((a, b) => a * b, 1);
+    await runPolicy(policy, {
+        policyID: policyID,
+        agentIDs: [WARM_UP_AGENT_ID],
+        observations: new Float32Array(observationSize),
+        observationSize: observationSize,
+    });
+    delete hiddenStates[`${policyID}:${WARM_UP_AGENT_ID}`];
+}
+
+
+async function inferActions(message) {
+    const policy = await loadPolicy(message.policyID);
+
+    // Wait for any inference that's already running on this session.
+    const run = policy.queue.then(() => runPolicy(policy, message));
+    policy.queue = run.catch(() => {});
+    return run;
+}
+
+
+async function runPolicy(policy, message) {
+    const batchSize = message.agentIDs.length;
+    const buffers = getBuffers(policy, batchSize);
+
+    const feeds = {
+        obs: new ort.Tensor("float32", message.observations, [batchSize, message.observationSize]),
+    };
+
+    if (policy.isRecurrent) {
+        // Gather each agent's hidden state into the batch.
+        for (const name of policy.stateInputNames) {
+            const stateSize = buffers.states[name].length / batchSize;
+            message.agentIDs.forEach((agentID, row) => {
+                const state = getHiddenState(policy, message.policyID, agentID)[name];
+                buffers.states[name].set(state, row * stateSize);
+            });
+            feeds[name] = new ort.Tensor("float32", buffers.states[name], [batchSize, ...policy.inputShapes[name]]);
+        }
+        feeds["seq_lens"] = new ort.Tensor("float32", buffers.seqLens, [batchSize]);
+    } else if (policy.session.inputNames.includes("state_ins")) {
+        // RLlib's dummy state input, which optimized models no longer have
+        feeds["state_ins"] = new ort.Tensor("float32", buffers.seqLens, [batchSize]);
+    }
+
+    const results = await policy.session.run(feeds);
+
+    if (policy.isRecurrent) {
+        // Scatter the new hidden states back to each agent.
+        for (const name of policy.stateInputNames) {
+            const newStates = results[name.replace("state_in_", "state_out_")].data;
+            const stateSize = newStates.length / batchSize;
+            message.agentIDs.forEach((agentID, row) => {
+                getHiddenState(policy, message.policyID, agentID)[name].set(
+                    newStates.subarray(row * stateSize, (row + 1) * stateSize)
+                );
+            });
+        }
+    }
+
+    const logits = results[policy.session.outputNames[0]].data;
+    const numActions = logits.length / batchSize;
+    const actions = new Int32Array(batchSize);
+    for (let row = 0; row < batchSize; row++) {
+        actions[row] = sampleAction(logits, row * numActions, numActions, getProbabilities(policy, numActions));
+    }
+
+    return actions;
+}
+
+
+function getBuffers(policy, batchSize) {
+    if (policy.buffers[batchSize] === undefined) {
+        const states = {};
+        for (const name of policy.stateInputNames) {
+            const stateSize = policy.inputShapes[name].reduce((a, b) => a * b, 1);
+            states[name] = new Float32Array(batchSize * stateSize);
+        }
+        policy.buffers[batchSize] = {
+            states: states,
+            seqLens: new Float32Array(batchSize).fill(1),
+        };
+    }
+    return policy.buffers[batchSize];
+}
+
+
+function getHiddenState(policy, policyID, agentID) {
+    const key = `${policyID}:${agentID}`;
+    if (hiddenStates[key] === undefined) {
+        hiddenStates[key] = {};
+        for (const name of policy.stateInputNames) {
+            const stateSize = policy.inputShapes[name].reduce((a, b) => a * b, 1);
+            hiddenStates[key][name] = new Float32Array(stateSize);
+        }
+    }
+    return hiddenStates[key];
+}
+
+
+function getProbabilities(policy, numActions) {
+    if (policy.probabilities === undefined || policy.probabilities.length !== numActions) {
+        policy.probabilities = new Float32Array(numActions);
+    }
+    return policy.probabilities;
+}
+
+
+// Sample an action from the softmax of logits[offset : offset + numActions],
+// using `probabilities` as scratch space.
+function sampleAction(logits, offset, numActions, probabilities) {
+    let maxLogit = -Infinity;
+    for (let i = 0; i < numActions; i++) {
+        maxLogit = Math.max(maxLogit, logits[offset + i]);
+    }
+
+    let total = 0;
+    for (let i = 0; i < numActions; i++) {
+        probabilities[i] = Math.exp(logits[offset + i] - maxLogit);
+        total += probabilities[i];
+    }
+
+    const randomValue = Math.random() * total;
+    let cumulative = 0;
+    for (let i = 0; i < numActions; i++) {
+        cumulative += probabilities[i];
+        if (randomValue < cumulative) {
+            return i;
+        }
+    }
+
+    // Fallback in case of floating-point precision issues
+    return numActions - 1;
+}
+
+
+// Minimal protobuf reader for the input shapes of an ONNX model:
+// ModelProto.graph (7) -> GraphProto.input (11) -> ValueInfoProto {name (1), type (2)}
+// -> TypeProto.tensor_type (1) -> shape (2) -> dim (1) {dim_value (1), dim_param (2)}.
+function readOnnxInputShapes(bytes) {
+    const shapes = {};
+    for (const [field, graph] of protobufFields(bytes)) {
+        if (field !== 7) continue;
+        for (const [graphField, valueInfo] of protobufFields(graph)) {
+            if (graphField !== 11) continue;
+
+            let name;
+            let shape = null;
+            for (const [valueInfoField, value] of protobufFields(valueInfo)) {
+                if (valueInfoField === 1) {
+                    name = new TextDecoder().decode(value);
+                } else if (valueInfoField === 2) {
+                    shape = readTensorShape(value);
+                }
+            }
+            if (name !== undefined && shape !== null) {
+                shapes[name] = shape.slice(1);
+            }
+        }
+    }
+    return shapes;
+}
+
+
+function readTensorShape(typeProto) {
+    for (const [typeField, tensorType] of protobufFields(typeProto)) {
+        if (typeField !== 1) continue;
+        for (const [tensorField, shapeProto] of protobufFields(tensorType)) {
+            if (tensorField !== 2) continue;
+            const dims = [];
+            for (const [shapeField, dimension] of protobufFields(shapeProto)) {
+                if (shapeField !== 1) continue;
+                let dim = 1;
+                for (const [dimField, dimValue] of protobufFields(dimension)) {
+                    if (dimField === 1) dim = dimValue;
+                }
+                dims.push(dim);
+            }
+            return dims;
+        }
+    }
+    return null;
+}
+
+
+// Yield [fieldNumber, value] for each field of a protobuf message. Varints are
+// numbers and length-delimited fields are Uint8Array views of the bytes.
+function* protobufFields(bytes) {
+    let position = 0;
+
+    const readVarint = () => {
+        let result = 0;
+        let multiplier = 1;
+        while (true) {
+            const byte = bytes[position++];
+            result += (byte & 0x7f) * multiplier;
+            if ((byte & 0x80) === 0) return result;
+            multiplier *= 128;
+        }
+    };
+
+    while (position < bytes.length) {
+        const key = readVarint();
+        const field = Math.floor(key / 8);
+        const wireType = key % 8;
+
+        if (wireType === 0) {
+            yield [field, readVarint()];
+        } else if (wireType === 1) {
+            position += 8;
+        } else if (wireType === 2) {
+            const length = readVarint();
+            yield [field, bytes.subarray(position, position + length)];
+            position += length;
+        } else if (wireType === 5) {
+            position += 4;
+        } else {
+            throw new Error(`Unsupported protobuf wire type ${wireType}.`);
+        }
+    }
+}
@@ -1,4 +1,4 @@
-import {actionFromONNX} from './onnx_inference.js';
+import {actionsFromONNX, resetONNXHiddenStates} from './onnx_inference.js';
 
 
 var game_config = {
@@ -14,6 +14,17 @@ var game_graphics;
 let stateBuffer = []
 const MAX_BUFFER_SIZE = 1;
 export function addStateToBuffer(state_data) {
+    // Delta-encoded frames are applied as they arrive (in order), so buffered
+    // states always hold the full list of objects.
+    if (state_data.keyframe !== undefined) {
+        state_data = applyStateDelta(state_data);
+    }
+
+    if (interpolationDelayMs !== null) {
+        addSnapshot(state_data);
+        return;
+    }
+
     if (stateBuffer >= MAX_BUFFER_SIZE) {
         stateBuffer.shift(); // remove the oldest state
     }
@@ -24,10 +35,163 @@ function clearStateBuffer() {
     stateBuffer = [];
 }
 
+// With interpolation (scene_metadata.interpolation_delay_ms in server mode), server
+// frames are kept as snapshots timestamped with their tick's time on the server,
+// and the client renders interpolation_delay_ms behind the server, interpolating
+// object positions between the snapshots on either side of that time.
+let interpolationDelayMs = null;
+let snapshotPeriodMs = null;
+let snapshotBuffer = [];
+// Estimate of (local time - server time) for the snapshots' timestamps. It follows
+// the fastest arrivals, and drifts up slowly in case the server falls behind.
+let serverClockOffsetMs = null;
+const SERVER_CLOCK_OFFSET_DRIFT = 0.01;
+const MAX_SNAPSHOT_BUFFER_SIZE = 120;
+
+function addSnapshot(state_data) {
+    const serverTimeMs = state_data.step * snapshotPeriodMs;
+    const lastSnapshot = snapshotBuffer[snapshotBuffer.length - 1];
+
+    // Steps restart with each episode
+    if (lastSnapshot !== undefined && state_data.step <= lastSnapshot.state.step) {
+        snapshotBuffer = [];
+        serverClockOffsetMs = null;
+    }
+
+    const offsetMs = performance.now() - serverTimeMs;
+    if (serverClockOffsetMs === null || offsetMs < serverClockOffsetMs) {
+        serverClockOffsetMs = offsetMs;
+    } else {
+        serverClockOffsetMs += SERVER_CLOCK_OFFSET_DRIFT * (offsetMs - serverClockOffsetMs);
+    }
+
+    snapshotBuffer.push({state: state_data, time: serverTimeMs});
+    if (snapshotBuffer.length > MAX_SNAPSHOT_BUFFER_SIZE) {
+        snapshotBuffer.shift();
+    }
+}
+
+// The snapshots on either side of the time to render at, and how far between them it is.
+function getSnapshotsToRender() {
+    if (snapshotBuffer.length === 0) {
+        return null;
+    }
+
+    const renderTimeMs = performance.now() - interpolationDelayMs - serverClockOffsetMs;
+    while (snapshotBuffer.length >= 2 && snapshotBuffer[1].time <= renderTimeMs) {
+        snapshotBuffer.shift();
+    }
+
+    const from = snapshotBuffer[0];
+    const to = snapshotBuffer[1];
+    if (to === undefined || renderTimeMs <= from.time) {
+        // Hold the oldest snapshot until it's time to move on from it
+        return {from: from, to: from, alpha: 0};
+    }
+    return {from: from, to: to, alpha: (renderTimeMs - from.time) / (to.time - from.time)};
+}
+
+function interpolateObject(fromObj, toObj, alpha) {
+    // Positions are interpolated here, so don't also tween them
+    const obj = {...fromObj, tween: false};
+    if (typeof fromObj.x === 'number' && typeof toObj.x === 'number') {
+        obj.x = fromObj.x + (toObj.x - fromObj.x) * alpha;
+    }
+    if (typeof fromObj.y === 'number' && typeof toObj.y === 'number') {
+        obj.y = fromObj.y + (toObj.y - fromObj.y) * alpha;
+    }
+    if (Array.isArray(fromObj.points) && Array.isArray(toObj.points) && fromObj.points.length === toObj.points.length) {
+        obj.points = fromObj.points.map((point, i) => [
+            point[0] + (toObj.points[i][0] - point[0]) * alpha,
+            point[1] + (toObj.points[i][1] - point[1]) * alpha,
+        ]);
+    }
+    return obj;
+}
+
+function hasMoved(fromObj, toObj) {
+    return fromObj.x !== toObj.x ||
+        fromObj.y !== toObj.y ||
+        JSON.stringify(fromObj.points) !== JSON.stringify(toObj.points);
+}
+
+// With delta encoding, the objects of the current state by uuid
+let deltaStateObjects = new Map();
+let deltaHudText = null;
+function applyStateDelta(state_data) {
+    if (state_data.encoded_objects !== undefined) {
+        state_data = decodeStateObjects(state_data);
+    }
+
+    if (state_data.keyframe) {
+        deltaStateObjects = new Map();
+        (state_data.game_state_objects || []).forEach(obj => deltaStateObjects.set(obj.uuid, obj));
+        deltaHudText = state_data.hud_text;
+        return state_data;
+    }
+
+    state_data.changed_objects.forEach(obj => deltaStateObjects.set(obj.uuid, obj));
+    state_data.removed_objects.forEach(uuid => deltaStateObjects.delete(uuid));
+    if (state_data.hud_text !== undefined) {
+        deltaHudText = state_data.hud_text;
+    }
+
+    return {
+        ...state_data,
+        game_state_objects: [...deltaStateObjects.values()],
+        hud_text: deltaHudText,
+    };
+}
+
+// With binary encoding, the object schemas by type tag and the room's string
+// table, both of which are reset by each keyframe (see state_encoding.py)
+let objectSchemas = {};
+let internedStrings = [];
+function decodeStateObjects(state_data) {
+    const [schemas, newStrings, rows, removed] = msgpack.decode(new Uint8Array(state_data.encoded_objects));
+
+    if (state_data.keyframe) {
+        objectSchemas = {};
+        internedStrings = [];
+    }
+    if (schemas !== null) {
+        schemas.forEach(([tag, objectType, fields, defaults, interned]) => {
+            objectSchemas[tag] = {objectType: objectType, fields: fields, defaults: defaults, interned: interned};
+        });
+    }
+    internedStrings.push(...newStrings);
+
+    const objects = rows.map(row => {
+        const schema = objectSchemas[row[0]];
+        const obj = {object_type: schema.objectType};
+        schema.fields.forEach((field, i) => {
+            // Trailing values that were equal to their defaults aren't sent
+            let value = i + 1 < row.length ? row[i + 1] : schema.defaults[i];
+            if (schema.interned[i] && typeof value === 'number') {
+                value = internedStrings[value];
+            }
+            obj[field] = value;
+        });
+        return obj;
+    });
+
+    const {encoded_objects, ...decoded} = state_data;
+    if (state_data.keyframe) {
+        decoded.game_state_objects = objects;
+    } else {
+        decoded.changed_objects = objects;
+        decoded.removed_objects = removed.map(index => internedStrings[index]);
+    }
+    return decoded;
+}
+
 // Contains an array for each bot that we'll shift to get the most recent action
 // Bots are queried asynchronously!
 let botActionBuffers = {};
 
+// Policies whose last query failed, so that each failure is only logged once
+let failedBotPolicies = new Set();
+
 let humanKeyPressBuffer = [];
 const MAX_KEY_PRESS_BUFFER_SIZE = 1;
 export function addHumanKeyPressToBuffer(action) {
@@ -50,6 +214,25 @@ var previousSubmittedActions = {};
 
 let currentObservations = {};
 
+// In lockstep, every client steps the same environment with the same actions.
+// Each client sends the actions it's responsible for (its own agent's and, on the
+// bot host, the bots') for the tick `input_delay_ticks` ahead of the one it's
+// stepping, and the server relays every player's actions for a tick back as a
+// bundle. A tick is only stepped once its bundle has arrived.
+let lockstep = null;
+export function addLockstepActions(data) {
+    if (lockstep !== null && data.tick >= lockstep.tick) {
+        lockstep.actionBundles.set(data.tick, data.actions);
+    }
+}
+
+export function reportLockstepDesync(data) {
+    if (lockstep !== null) {
+        lockstep.desyncedTicks.push(data.tick);
+    }
+    console.error(`Lockstep desync after tick ${data.tick}, state hashes:`, data.state_hashes);
+}
+
 class RemoteGameDataLogger {
     constructor() {
         this.data = {
@@ -140,6 +323,32 @@ export function getRemoteGameData() {
 }
 
 export function graphics_start(graphics_config) {
+    // Pyodide games render their own state as it's computed, so only interpolate server frames
+    let scene_metadata = graphics_config.scene_metadata;
+    interpolationDelayMs = (
+        !graphics_config.pyodide_remote_game &&
+        scene_metadata !== undefined &&
+        scene_metadata.interpolation_delay_ms !== undefined &&
+        scene_metadata.interpolation_delay_ms !== null
+    ) ? scene_metadata.interpolation_delay_ms : null;
+    snapshotPeriodMs = scene_metadata !== undefined ? 1000 / scene_metadata.fps : null;
+    snapshotBuffer = [];
+    serverClockOffsetMs = null;
+
+    lockstep = (graphics_config.pyodide_remote_game && graphics_config.lockstep) ? {
+        agentID: graphics_config.lockstep.agent_id,
+        isBotHost: graphics_config.lockstep.is_bot_host,
+        inputDelayTicks: scene_metadata.lockstep_input_delay_ticks,
+        stateHashInterval: scene_metadata.lockstep_state_hash_interval,
+        // The next tick to step and the next tick to send this client's actions for
+        tick: 0,
+        inputTick: scene_metadata.lockstep_input_delay_ticks,
+        actionBundles: new Map(),
+        // The hash of the state to send along with the next actions, if any
+        pendingStateHash: undefined,
+        desyncedTicks: [],
+    } : null;
+
     game_graphics = new GraphicsManager(game_config, graphics_config);
 }
 
@@ -148,6 +357,8 @@ export function graphics_end() {
     $("#gameContainer").empty();
     game_graphics.game.destroy(true);
     stateBuffer = [];
+    snapshotBuffer = [];
+    lockstep = null;
 }
 
 class GraphicsManager {
@@ -208,6 +419,10 @@ class GymScene extends Phaser.Scene {
         this.pyodide_remote_game = config.pyodide_remote_game;
         this.isProcessingPyodide = false;
         this.stateImageSprite = null;
+        // With interpolation, the snapshots we're rendering between and the objects that move between them
+        this.lastRenderedSnapshot = null;
+        this.lastTargetSnapshot = null;
+        this.movingObjects = [];
         if (this.pyodide_remote_game) {
             this.pyodide_remote_game.reinitialize_environment(this.pyodide_remote_game.config);
         }
@@ -291,6 +506,7 @@ class GymScene extends Phaser.Scene {
                 currentObservations = {};
                 clearStateBuffer();
                 this.removeAllObjects();
+                resetONNXHiddenStates();
                 [currentObservations, infos, render_state] = await this.pyodide_remote_game.reset();
                 remoteGameLogger.logData(
                     {
@@ -300,9 +516,17 @@ class GymScene extends Phaser.Scene {
                         t: this.pyodide_remote_game.step_num
                     });
             } else {
-                const actions = await this.buildPyodideActionDict();
+                const actions = lockstep !== null ? await this.takeLockstepActions() : await this.buildPyodideActionDict();
+                if (actions === null) {
+                    // Still waiting on the other players' actions for this tick
+                    this.isProcessingPyodide = false;
+                    return;
+                }
                 previousSubmittedActions = actions;
                 [currentObservations, rewards, terminateds, truncateds, infos, render_state] = await this.pyodide_remote_game.step(actions);
+                if (lockstep !== null) {
+                    await this.finishLockstepTick();
+                }
                 remoteGameLogger.logData(
                     {
                         observations: currentObservations, 
@@ -320,11 +544,59 @@ class GymScene extends Phaser.Scene {
         this.isProcessingPyodide = false;
     };
 
+    // Send this client's actions for the tick `input_delay_ticks` ahead (once per tick)
+    // and return the actions of every agent for the current tick, or null if the
+    // other players' actions haven't arrived yet.
+    async takeLockstepActions() {
+        // The game may end while we're waiting on Pyodide, so hold on to this game's state
+        const state = lockstep;
+        if (state.inputTick <= state.tick + state.inputDelayTicks) {
+            const inputTick = state.inputTick;
+            state.inputTick += 1;
+            window.socket.emit("lockstep_actions", {
+                tick: inputTick,
+                actions: await this.buildPyodideActionDict(),
+                ...state.pendingStateHash,
+            });
+            state.pendingStateHash = undefined;
+        }
+
+        // No one has acted yet on the first ticks, so every agent takes the default action
+        let bundle = {};
+        if (state.tick >= state.inputDelayTicks) {
+            bundle = state.actionBundles.get(state.tick);
+            if (bundle === undefined) {
+                return null;
+            }
+            state.actionBundles.delete(state.tick);
+        }
+
+        let actions = {};
+        for (let agentID of Object.keys(this.scene_metadata.policy_mapping)) {
+            actions[agentID] = bundle[agentID] !== undefined ? bundle[agentID] : this.scene_metadata.default_action;
+        }
+        return actions;
+    }
+
+    // Advance to the next lockstep tick and, every `state_hash_interval` ticks, hash the
+    // state to send along with the next actions so the server can check for desyncs.
+    async finishLockstepTick() {
+        const state = lockstep;
+        state.tick += 1;
+        if (state.stateHashInterval !== null && state.tick % state.stateHashInterval == 0) {
+            state.pendingStateHash = {
+                state_hash_tick: state.tick,
+                state_hash: await this.pyodide_remote_game.stateHash(),
+            };
+        }
+    }
+
     async buildPyodideActionDict() {
         let actions = {};
 
-        // Identify which policy corresponds to the human by checking for the human value in policy_mapping
-        let human_policy_agent_id = Object.keys(
+        // Identify which policy corresponds to the human by checking for the human value in policy_mapping.
+        // In lockstep, each client only acts for the human agent it was assigned.
+        let human_policy_agent_id = lockstep !== null ? String(lockstep.agentID) : Object.keys(
             this.scene_metadata.policy_mapping
         ).find(
                 key => this.scene_metadata.policy_mapping[key] == "human"
@@ -335,9 +607,21 @@ class GymScene extends Phaser.Scene {
             actions[human_policy_agent_id] = this.getHumanAction();
         }
 
+        // Only the bot host acts for the bots in lockstep, so that every client steps them
+        // with the same (possibly sampled) actions.
+        if (lockstep !== null && !lockstep.isBotHost) {
+            return actions;
+        }
+
+        // If bots act on this step (according to frame skip), query each ONNX policy
+        // once for all of the agents that use it.
+        if (this.pyodide_remote_game && this.pyodide_remote_game.step_num % this.scene_metadata.frame_skip == 0) {
+            this.queryBotPolicies(human_policy_agent_id);
+        }
+
         // Loop over the policy mapping and populate the actions dictionary with bot actions
         for (let [agentID, policy] of Object.entries(this.scene_metadata.policy_mapping)) {
-            if (agentID == human_policy_agent_id) {
+            if (agentID == human_policy_agent_id || (lockstep !== null && policy == "human")) {
                 continue;
             }
             actions[agentID] = this.getBotAction(agentID);
@@ -352,12 +636,8 @@ class GymScene extends Phaser.Scene {
         // If the bot is action on this step (according to frame skip), calculate an action.
         if (this.pyodide_remote_game && this.pyodide_remote_game.step_num % this.scene_metadata.frame_skip == 0) {
             let policyID = policy_mapping[agentID];
-            // Check if the policy mapping ends with .onnx to indicate an ONNX model
-            if (policyID.endsWith(".onnx")) {
-                // Cast the agent ID to an integer
-                let observation = currentObservations.get(isNaN(agentID) ? agentID : parseInt(agentID));
-                this.queryBotPolicy(agentID, policyID, observation);
-            } else if (policyID === "random") {
+            // ONNX policies were already queried in buildPyodideActionDict
+            if (policyID === "random") {
                 // If the policy is random, return a random action
                 return Math.floor(Math.random() * Object.keys(this.scene_metadata.action_mapping).length + 1) - 1;
             }
@@ -382,15 +662,48 @@ class GymScene extends Phaser.Scene {
         } 
     }
 
-    async queryBotPolicy(agentID, policyID, observation) {
+    queryBotPolicies(human_policy_agent_id) {
+        // Group the bots' observations by policy
+        let observationsByPolicy = {};
+        for (let [agentID, policyID] of Object.entries(this.scene_metadata.policy_mapping)) {
+            // Check if the policy mapping ends with .onnx (or .ort, for ONNX Runtime's format) to indicate an ONNX model
+            if (agentID == human_policy_agent_id || !(policyID.endsWith(".onnx") || policyID.endsWith(".ort"))) {
+                continue;
+            }
 
-        if (botActionBuffers[agentID] === undefined) {
-            botActionBuffers[agentID] = [];
+            if (observationsByPolicy[policyID] === undefined) {
+                observationsByPolicy[policyID] = {};
+            }
+            // Cast the agent ID to an integer
+            observationsByPolicy[policyID][agentID] = currentObservations.get(isNaN(agentID) ? agentID : parseInt(agentID));
         }
 
-        // Calculate the action and add it to the buffer
-        let action = await actionFromONNX(policyID, observation);
-        botActionBuffers[agentID].push(action);
+        for (let [policyID, observations] of Object.entries(observationsByPolicy)) {
+            this.queryBotPolicy(policyID, observations);
+        }
+    }
+
+    async queryBotPolicy(policyID, observations) {
+        // Calculate the actions and add them to the buffers
+        let actions;
+        try {
+            actions = await actionsFromONNX(policyID, observations);
+        } catch (error) {
+            // The bots take the default action until the policy can be loaded
+            if (!failedBotPolicies.has(policyID)) {
+                console.error(`Failed to query bot policy ${policyID}:`, error);
+                failedBotPolicies.add(policyID);
+            }
+            return;
+        }
+        failedBotPolicies.delete(policyID);
+
+        for (let [agentID, action] of Object.entries(actions)) {
+            if (botActionBuffers[agentID] === undefined) {
+                botActionBuffers[agentID] = [];
+            }
+            botActionBuffers[agentID].push(action);
+        }
     }
 
     getHumanAction() {
@@ -473,12 +786,63 @@ class GymScene extends Phaser.Scene {
     }
 
     processRendering() {
+        if (interpolationDelayMs !== null) {
+            this.processInterpolatedRendering();
+            return;
+        }
+
         if (stateBuffer.length > 0) {
             this.state = stateBuffer.shift(); // get the oldest state from the buffer
             this.drawState();
         }
     }
 
+    processInterpolatedRendering() {
+        let snapshots = getSnapshotsToRender();
+        if (snapshots === null) {
+            return;
+        }
+        let {from, to, alpha} = snapshots;
+
+        // Find the objects that move between the two snapshots
+        if (from !== this.lastRenderedSnapshot || to !== this.lastTargetSnapshot) {
+            this.movingObjects = [];
+            if (from.state.game_state_objects != null && to.state.game_state_objects != null) {
+                let toObjects = new Map(to.state.game_state_objects.map(obj => [obj.uuid, obj]));
+                from.state.game_state_objects.forEach(fromObj => {
+                    let toObj = toObjects.get(fromObj.uuid);
+                    if (toObj !== undefined && hasMoved(fromObj, toObj)) {
+                        this.movingObjects.push([fromObj, toObj]);
+                    }
+                });
+            }
+            this.lastTargetSnapshot = to;
+        }
+
+        if (from !== this.lastRenderedSnapshot) {
+            // Draw the whole snapshot when we reach it, so objects are added, changed, and removed
+            let moving = new Map(this.movingObjects.map(([fromObj, toObj]) => [fromObj.uuid, toObj]));
+            this.state = {
+                ...from.state,
+                game_state_objects: from.state.game_state_objects == null ? from.state.game_state_objects :
+                    from.state.game_state_objects.map(obj => (
+                        moving.has(obj.uuid) ? interpolateObject(obj, moving.get(obj.uuid), alpha) : obj
+                    )),
+            };
+            this.drawState();
+            this.lastRenderedSnapshot = from;
+            return;
+        }
+
+        // Otherwise only the moving objects need to be updated
+        this.movingObjects.forEach(([fromObj, toObj]) => {
+            let object_map = fromObj.permanent === true ? this.perm_object_map : this.temp_object_map;
+            if (object_map.hasOwnProperty(fromObj.uuid)) {
+                this._updateObject(interpolateObject(fromObj, toObj, alpha), object_map);
+            }
+        });
+    }
+
     drawState() {
 
         /*
@@ -835,7 +1199,8 @@ class GymScene extends Phaser.Scene {
     _updateCircle(circle_config, object_map) {
         let uuid = circle_config.uuid;
         let graphics = object_map[uuid];
-        graphics.clear();
+        // Redraw as a new graphics object, removing the old one from the scene
+        graphics.destroy();
         this._addCircle(circle_config, object_map);
     }
 
@@ -867,7 +1232,8 @@ class GymScene extends Phaser.Scene {
     _updatePolygon(polygon_config, object_map) {
         let uuid = polygon_config.uuid;
         let graphics = object_map[uuid];
-        graphics.clear();
+        // Redraw as a new graphics object, removing the old one from the scene
+        graphics.destroy();
         this._addPolygon(polygon_config, object_map);
     }
 
@@ -6,6 +6,8 @@ export class RemoteGame {
     constructor(config) {
         this.setAttributes(config);
         this.installed_packages = [];
+        // In lockstep, every client resets with the seed the server picked for the game
+        this.seed = null;
         this.initialize(); 
     }
 
@@ -26,6 +28,10 @@ export class RemoteGame {
         this.shouldReset = true;
     }
 
+    setSeed(seed) {
+        this.seed = seed;
+    }
+
     isDone(){
         return this.state === "done";
     }
@@ -109,9 +115,17 @@ env
         this.shouldReset = false;
         console.log("Resetting the environment");
         const startTime = performance.now();
+        // Each episode gets its own seed, which is the same on every client in the game.
+        // Global RNGs are seeded too, for environments that draw from them.
+        const resetCode = this.seed === null ? "obs, infos = env.reset()" : `
+import random
+random.seed(${this.seed + this.num_episodes})
+np.random.seed(${this.seed + this.num_episodes})
+obs, infos = env.reset(seed=${this.seed + this.num_episodes})
+`;
         const result = await this.pyodide.runPythonAsync(`
 import numpy as np
-obs, infos = env.reset()
+${resetCode}
 render_state = env.render()
 
 if not isinstance(obs, dict):
@@ -306,6 +320,32 @@ obs, rewards, terminateds, truncateds, infos, render_state
         return [obs, rewards, terminateds, truncateds, infos, render_state]
     };
 
+    // Hash of the observations and render state of the last reset or step, which
+    // only matches across clients if they stepped the environment the same way.
+    async stateHash() {
+        return await this.pyodide.runPythonAsync(`
+import hashlib
+
+def _update_state_hash(state_hash, value):
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            state_hash.update(str(key).encode())
+            _update_state_hash(state_hash, value[key])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _update_state_hash(state_hash, item)
+    elif isinstance(value, np.ndarray):
+        state_hash.update(np.ascontiguousarray(value).tobytes())
+    else:
+        state_hash.update(repr(value).encode())
+
+_state_hash = hashlib.sha1()
+_update_state_hash(_state_hash, obs)
+_update_state_hash(_state_hash, render_state)
+_state_hash.hexdigest()
+        `);
+    };
+
     getHUDText() {
         let score = Object.values(this.cumulative_rewards)[0];
         let time_left = (this.max_steps - this.step_num) / this.config.fps;
@@ -20,8 +20,31 @@ export function updateHUDText(text) {
 
 var pressedKeys = {};
 
-export function enableKeyListener(input_mode) {
+// In pressed_keys mode, the keys held down are pushed to the server whenever they
+// change, numbered so that the server can ignore stale updates.
+var pressedKeysSequenceNum = 0;
+// Only server-side scenes apply the keys on the server, Pyodide scenes step in the browser.
+var sendKeysToServer = true;
+function sendPressedKeys() {
+    if (!sendKeysToServer) {
+        return;
+    }
+    pressedKeysSequenceNum++;
+    socket.emit('update_pressed_keys', {
+        'pressed_keys': Object.keys(pressedKeys),
+        'sequence_num': pressedKeysSequenceNum,
+        'client_timestamp': Date.now(),
+        session_id: window.sessionId,
+    });
+}
+
+export function enableKeyListener(input_mode, run_through_pyodide = false) {
     pressedKeys = {};
+    sendKeysToServer = !run_through_pyodide;
+    if (input_mode != "single_keystroke") {
+        // Clear any keys the server still has from before, e.g., the last episode
+        sendPressedKeys();
+    }
     $(document).on('keydown', function(event) {
         // List of keys to prevent default behavior for (scroll the window)
         var keysToPreventDefault = ['ArrowUp', 'ArrowDown', 'ArrowLeft', 'ArrowRight', ' ']; // Includes space (' ')
@@ -34,17 +57,20 @@ export function enableKeyListener(input_mode) {
         // This means no composite actions.
         if (input_mode == "single_keystroke") {
             pgg.addHumanKeyPressToBuffer(event.key);
-            socket.emit('send_pressed_keys', {'pressed_keys': Array(event.key), session_id: window.sessionId});
+            if (sendKeysToServer) {
+                socket.emit('send_pressed_keys', {'pressed_keys': Array(event.key), session_id: window.sessionId});
+            }
             return;
         }
 
-        // Otherwise, we keep track of the keys that are pressed and send them on request
+        // Otherwise, we keep track of the keys that are pressed and send them when they change
         if (pressedKeys[event.key]) {
             return; // Key is already pressed, so exit the function
         }
 
         pressedKeys[event.key] = true; // Add key to pressedKeys when it is pressed
         pgg.updatePressedKeys(pressedKeys);
+        sendPressedKeys();
     });
 
     $(document).on('keyup', function(event) {
@@ -53,8 +79,12 @@ export function enableKeyListener(input_mode) {
         }
 
         // If we're tracking pressed keys, remove it
+        if (!pressedKeys[event.key]) {
+            return;
+        }
         delete pressedKeys[event.key]; // Remove key from pressedKeys when it is released
         pgg.updatePressedKeys(pressedKeys);
+        sendPressedKeys();
     });
 }
 
@@ -0,0 +1,92 @@
+"""
+A bounded LRU cache of policy logits, keyed by observation.
+
+In grid worlds (e.g., Overcooked) bots see the same observation over and over
+(idling, circling, waiting on a pot), and each time the policy recomputes the
+same logits. A `LogitsCache` remembers the logits of the most recent distinct
+observations so that repeated ones skip the forward pass. Only the logits are
+cached: the action is still sampled from them on every call, so stochastic
+policies behave exactly as they would without the cache.
+
+Only use it for policies whose output depends on the observation alone (i.e.,
+not recurrent policies).
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LogitsCache:
+    """Least recently used cache of logits by observation hash."""
+
+    def __init__(
+        self, max_size: int = 10_000, name: str = "", report_every: int = 10_000
+    ):
+        """
+        :param max_size: Number of distinct observations to keep logits for.
+        :param name: Name used when logging the hit rate (e.g., the model path).
+        :param report_every: Log the hit rate every this many lookups, 0 to disable.
+        """
+        assert max_size >= 1, "Must have a logits cache size of at least one!"
+        self.max_size = max_size
+        self.name = name
+        self.report_every = report_every
+
+        self.entries: collections.OrderedDict[bytes, np.ndarray] = (
+            collections.OrderedDict()
+        )
+
+        self.num_hits: int = 0
+        self.num_misses: int = 0
+
+    @staticmethod
+    def key(observation: np.ndarray) -> bytes:
+        """Hash an observation's contents, shape, and dtype."""
+        observation = np.ascontiguousarray(observation)
+        digest = hashlib.blake2b(observation.tobytes(), digest_size=16)
+        digest.update(str((observation.shape, observation.dtype.str)).encode())
+        return digest.digest()
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        """Return the cached logits for an observation key, or None on a miss."""
+        logits = self.entries.get(key)
+        if logits is None:
+            self.num_misses += 1
+        else:
+            self.num_hits += 1
+            self.entries.move_to_end(key)
+
+        self._maybe_report()
+        return logits
+
+    def put(self, key: bytes, logits: np.ndarray) -> None:
+        """Cache the logits computed for an observation key."""
+        logits = np.array(logits, copy=True)
+        logits.setflags(write=False)
+
+        self.entries[key] = logits
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _maybe_report(self) -> None:
+        num_lookups = self.num_hits + self.num_misses
+        if self.report_every and num_lookups % self.report_every == 0:
+            logger.info(f"Logits cache {self.name}: {self.stats()}")
+
+    def stats(self) -> dict[str, float | int]:
+        num_lookups = self.num_hits + self.num_misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "num_hits": self.num_hits,
+            "num_misses": self.num_misses,
+            "hit_rate": self.num_hits / num_lookups if num_lookups else 0.0,
+        }
@@ -0,0 +1,235 @@
+"""
+Batched inference of ONNX policies across games.
+
+With `onnx_inference_utils.onnx_model_inference_fn`, every bot in every game
+runs its own `InferenceSession.run` on a batch of one, so with many identical
+bots the per-call overhead dominates. `batched_onnx_model_inference_fn` is a
+drop-in `policy_inference_fn` that instead hands the observation to a
+`BatchedInferenceService` for the model. The service collects observations from
+all callers for up to `max_wait_s` (or until `max_batch_size` are pending),
+runs a single batched `InferenceSession.run`, and returns each caller's action.
+Callers are greenlets (e.g., the bots' policy consumers), which simply wait for
+their result while other games keep running.
+
+Recurrent models get each caller's hidden state from the `POLICY_STATE_STORE`,
+gathered into the batch and scattered back afterwards. Any other model input
+(e.g., RLlib's `state_ins`) is filled in with a default value of the right
+batch size, based on the session's input metadata.
+"""
+
+from __future__ import annotations
+
+import logging
+
+import eventlet
+import eventlet.event
+import numpy as np
+
+from interactive_gym.utils import (
+    inference_utils,
+    onnx_inference_utils,
+    onnx_session_manager,
+    policy_state_store,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Map ONNX tensor types to numpy dtypes for the default inputs.
+ONNX_TYPES_TO_NUMPY = {
+    "tensor(float)": np.float32,
+    "tensor(double)": np.float64,
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64,
+}
+
+
+def default_model_input(input_meta, batch_size: int) -> np.ndarray:
+    """Build a default value for a non-observation model input.
+
+    The first dimension is taken to be the batch dimension and any other
+    dynamic dimension is set to 1. Sequence lengths are ones, everything
+    else is zeros.
+    """
+    shape = [
+        batch_size if i == 0 else (dim if isinstance(dim, int) else 1)
+        for i, dim in enumerate(input_meta.shape)
+    ]
+    dtype = ONNX_TYPES_TO_NUMPY.get(input_meta.type, np.float32)
+
+    if input_meta.name == "seq_lens":
+        return np.ones(shape, dtype=dtype)
+    return np.zeros(shape, dtype=dtype)
+
+
+def preprocess_observation(
+    observation: dict[str, np.ndarray] | np.ndarray,
+) -> np.ndarray:
+    """Flatten an observation into the 1D float array the model expects."""
+    if isinstance(observation, dict):
+        observation = np.hstack(list(observation.values()))
+    return np.asarray(observation, dtype=np.float32).reshape(-1)
+
+
+class BatchedInferenceService:
+    """Runs a single ONNX model on batches of observations from many callers."""
+
+    def __init__(
+        self,
+        model_path: str,
+        max_batch_size: int = 64,
+        max_wait_s: float = 0.002,
+    ):
+        """
+        :param model_path: Path of the ONNX model, loaded with `onnx_inference_utils.load_onnx_policy_fn`.
+        :param max_batch_size: Run the batch as soon as this many observations are pending.
+        :param max_wait_s: Longest time to wait for more observations after the first one arrives.
+        """
+        self.model_path = onnx_inference_utils.load_onnx_policy_fn(model_path)
+        self.session = onnx_inference_utils.ORT_SESSIONS[self.model_path]
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+
+        # Pending observations, with their state key, logits cache key,
+        # and the event their action is sent to.
+        self.pending: list[
+            tuple[
+                np.ndarray,
+                policy_state_store.StateKey | None,
+                bytes | None,
+                eventlet.event.Event,
+            ]
+        ] = []
+        self.flush_timer = None
+
+        # Default values of the non-observation inputs, per batch size.
+        self.default_inputs: dict[int, dict[str, np.ndarray]] = {}
+
+        self.num_batches: int = 0
+        self.num_observations: int = 0
+
+    def infer(
+        self,
+        observation: dict[str, np.ndarray] | np.ndarray,
+        state_key: policy_state_store.StateKey | None = None,
+    ) -> int:
+        """Queue an observation for the next batch and wait for its action.
+
+        :param observation: The bot's observation.
+        :param state_key: The bot's key in the `POLICY_STATE_STORE`, if the model is recurrent.
+        """
+        observation = preprocess_observation(observation)
+
+        # Observations whose logits are cached don't wait for a batch.
+        cache = onnx_inference_utils.LOGITS_CACHES.get(self.model_path)
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(observation.reshape(-1))
+            cached_logits = cache.get(cache_key)
+            if cached_logits is not None:
+                return inference_utils.sample_action_via_softmax(cached_logits)
+
+        result = eventlet.event.Event()
+        self.pending.append((observation, state_key, cache_key, result))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = eventlet.spawn_after(self.max_wait_s, self.flush)
+
+        return result.wait()
+
+    def run_batch(
+        self,
+        observations: np.ndarray,
+        state_keys: list[policy_state_store.StateKey | None] | None = None,
+    ) -> np.ndarray:
+        """Run the model on a stacked batch of observations and return the logits."""
+        batch_size = observations.shape[0]
+        if onnx_inference_utils.get_recurrent_state_spec(self.model_path):
+            return onnx_inference_utils.recurrent_onnx_model_inference(
+                observations,
+                self.model_path,
+                state_keys or [None] * batch_size,
+            )
+
+        if batch_size not in self.default_inputs:
+            self.default_inputs[batch_size] = {
+                input_meta.name: default_model_input(input_meta, batch_size)
+                for input_meta in self.session.get_inputs()
+                if input_meta.name != "obs"
+            }
+
+        # Runs in a pool thread, so more observations queue up for the next batch meanwhile.
+        return onnx_session_manager.SESSION_MANAGER.run(
+            self.model_path,
+            {"obs": observations, **self.default_inputs[batch_size]},
+            output_names=["output"],
+        )[0]
+
+    def flush(self) -> None:
+        """Run every pending observation as one batch and hand out the actions."""
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        batch, self.pending = self.pending[: self.max_batch_size], self.pending[
+            self.max_batch_size :
+        ]
+        if not batch:
+            return
+
+        # Anything beyond the maximum batch size goes in the next batch.
+        if self.pending:
+            self.flush_timer = eventlet.spawn_after(0, self.flush)
+
+        try:
+            logits = self.run_batch(
+                np.stack([obs for obs, _, _, _ in batch]),
+                [state_key for _, state_key, _, _ in batch],
+            )
+        except Exception as e:
+            logger.exception(
+                f"Batched inference failed for model {self.model_path}: {e}"
+            )
+            for _, _, _, result in batch:
+                result.send_exception(e)
+            return
+
+        self.num_batches += 1
+        self.num_observations += len(batch)
+
+        cache = onnx_inference_utils.LOGITS_CACHES.get(self.model_path)
+        for row, (_, _, cache_key, result) in zip(logits, batch):
+            if cache is not None and cache_key is not None:
+                cache.put(cache_key, row)
+            result.send(inference_utils.sample_action_via_softmax(row))
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "num_batches": self.num_batches,
+            "num_observations": self.num_observations,
+            "mean_batch_size": self.num_observations / max(self.num_batches, 1),
+        }
+
+
+# One service per model path, shared by every game in the process.
+INFERENCE_SERVICES: dict[str, BatchedInferenceService] = {}
+
+
+def get_inference_service(model_path: str) -> BatchedInferenceService:
+    """Return the batched inference service for a model, creating it if necessary."""
+    if model_path not in INFERENCE_SERVICES:
+        INFERENCE_SERVICES[model_path] = BatchedInferenceService(model_path)
+    return INFERENCE_SERVICES[model_path]
+
+
+def batched_onnx_model_inference_fn(
+    observation: dict[str, np.ndarray] | np.ndarray,
+    onnx_model_path: str,
+    state_key: policy_state_store.StateKey | None = None,
+) -> int:
+    """Drop-in replacement for `onnx_inference_utils.onnx_model_inference_fn` that batches across games."""
+    return get_inference_service(onnx_model_path).infer(
+        observation, state_key=state_key
+    )
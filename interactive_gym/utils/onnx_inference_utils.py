@@ -8,7 +8,12 @@ from __future__ import annotations
 
 import numpy as np
 
-from interactive_gym.utils import inference_utils
+from interactive_gym.utils import (
+    inference_utils,
+    logits_cache,
+    onnx_session_manager,
+    policy_state_store,
+)
 
 try:
     import onnxruntime as ort
@@ -19,6 +24,11 @@ except ImportError:
 
 
 ORT_SESSIONS: dict[str, ort.InferenceSession] = {}
+RECURRENT_STATE_SPECS: dict[str, policy_state_store.StateSpec] = {}
+DUMMY_STATE_INPUTS: dict[str, bool] = {}
+
+# Models that opted into caching their logits, see `enable_logits_cache`.
+LOGITS_CACHES: dict[str, logits_cache.LogitsCache] = {}
 
 
 def inference_onnx_model(
@@ -30,28 +40,133 @@ def inference_onnx_model(
     #     1,
     # ]
     # print(list(input_dict.keys()))
-    outputs = ORT_SESSIONS[model_path].run(["output"], input_dict)
+    outputs = onnx_session_manager.SESSION_MANAGER.run(
+        model_path, input_dict, output_names=["output"]
+    )
     return outputs
 
 
+def get_recurrent_state_spec(
+    model_path: str,
+) -> policy_state_store.StateSpec:
+    """Return the shape and dtype of each recurrent state input of a model.
+
+    Following RLlib's convention, recurrent models take their hidden states
+    as `state_in_0`, `state_in_1`, ... and return the next ones as
+    `state_out_0`, `state_out_1`, .... Models without them have an empty spec.
+    """
+    if model_path not in RECURRENT_STATE_SPECS:
+        session = onnx_session_manager.SESSION_MANAGER.load(model_path).session
+        RECURRENT_STATE_SPECS[model_path] = {
+            input_meta.name: (
+                tuple(
+                    dim if isinstance(dim, int) else 1
+                    for dim in input_meta.shape[1:]
+                ),
+                np.dtype(np.float32),
+            )
+            for input_meta in session.get_inputs()
+            if input_meta.name.startswith("state_in_")
+        }
+    return RECURRENT_STATE_SPECS[model_path]
+
+
+def has_dummy_state_input(model_path: str) -> bool:
+    """Whether a model still has RLlib's dummy `state_ins` input."""
+    if model_path not in DUMMY_STATE_INPUTS:
+        session = onnx_session_manager.SESSION_MANAGER.load(model_path).session
+        DUMMY_STATE_INPUTS[model_path] = any(
+            input_meta.name == "state_ins"
+            for input_meta in session.get_inputs()
+        )
+    return DUMMY_STATE_INPUTS[model_path]
+
+
+def state_output_name(state_input_name: str) -> str:
+    """Name of the output that holds the next value of a recurrent state input."""
+    return state_input_name.replace("state_in_", "state_out_", 1)
+
+
+def recurrent_onnx_model_inference(
+    observations: np.ndarray,
+    model_path: str,
+    state_keys: list[policy_state_store.StateKey | None],
+) -> np.ndarray:
+    """Run a recurrent model on a batch of observations and return the logits.
+
+    The hidden state of each bot with a state key is read from (and the new
+    state written back to) the `POLICY_STATE_STORE`; bots without a key start
+    from a zero state every call.
+    """
+    state_spec = get_recurrent_state_spec(model_path)
+    state_ins, generations = policy_state_store.POLICY_STATE_STORE.gather(
+        state_keys, state_spec
+    )
+    output_names = ["output"] + [
+        state_output_name(name) for name in state_spec
+    ]
+
+    inputs = {"obs": observations, **state_ins}
+    # Only RLlib exports have a `seq_lens` input.
+    managed_session = onnx_session_manager.SESSION_MANAGER.load(model_path)
+    if "seq_lens" in managed_session.input_names:
+        inputs["seq_lens"] = np.ones(len(state_keys), dtype=np.float32)
+
+    outputs = onnx_session_manager.SESSION_MANAGER.run(
+        model_path, inputs, output_names=output_names
+    )
+
+    policy_state_store.POLICY_STATE_STORE.scatter(
+        state_keys, dict(zip(state_spec, outputs[1:])), generations
+    )
+    return outputs[0]
+
+
 def onnx_model_inference_fn(
-    observation: dict[str, np.ndarray] | np.ndarray, onnx_model_path: str
+    observation: dict[str, np.ndarray] | np.ndarray,
+    onnx_model_path: str,
+    state_key: policy_state_store.StateKey | None = None,
 ):
     # if it's a dictionary observation, the onnx model expects a flattened input array
     if isinstance(observation, dict):
         observation = np.hstack(list(observation.values())).reshape((1, -1))
 
-    # TODO(chase): add compatibility with recurrent networks, must pass state in and seq lens
+    if get_recurrent_state_spec(onnx_model_path):
+        logits = recurrent_onnx_model_inference(
+            observation.astype(np.float32).reshape((1, -1)),
+            onnx_model_path,
+            [state_key],
+        ).reshape(-1)
+        return inference_utils.sample_action_via_softmax(logits)
+
+    observation = observation.astype(np.float32)
+
+    # Repeated observations reuse their logits, but the
+    # action is still sampled from them on every call. Observations are
+    # keyed flattened, as in the batched inference service, so that both
+    # share the cache.
+    cache = LOGITS_CACHES.get(onnx_model_path)
+    if cache is not None:
+        cache_key = cache.key(observation.reshape(-1))
+        cached_logits = cache.get(cache_key)
+        if cached_logits is not None:
+            return inference_utils.sample_action_via_softmax(cached_logits)
+
+    input_dict = {"obs": observation}
+    # rllib artifact, which optimized models (see `onnx_optimize`) no longer have
+    if has_dummy_state_input(onnx_model_path):
+        input_dict["state_ins"] = np.array([0.0], dtype=np.float32)
+
     model_outputs = inference_onnx_model(
-        {
-            "obs": observation.astype(np.float32),
-            "state_ins": np.array([0.0], dtype=np.float32),  # rllib artifact
-        },
+        input_dict,
         model_path=onnx_model_path,
     )[0].reshape(
         -1
     )  # outputs list of a batch. batch size always 1 so index list and reshape
 
+    if cache is not None:
+        cache.put(cache_key, model_outputs)
+
     action = inference_utils.sample_action_via_softmax(model_outputs)
 
     return action
@@ -76,8 +191,32 @@ def onnx_model_inference_fn(
 def load_onnx_policy_fn(onnx_model_path: str) -> str:
     """Initialize the ORT session and return the string to access it"""
     if ORT_SESSIONS.get(onnx_model_path) is None:
-        ORT_SESSIONS[onnx_model_path] = ort.InferenceSession(
-            onnx_model_path, None
+        ORT_SESSIONS[onnx_model_path] = (
+            onnx_session_manager.SESSION_MANAGER.load(onnx_model_path).session
         )
 
     return onnx_model_path
+
+
+def enable_logits_cache(
+    onnx_model_path: str, max_size: int = 10_000
+) -> logits_cache.LogitsCache:
+    """Cache the logits of a model for its most recent distinct observations.
+
+    Applies to `onnx_model_inference_fn` and the batched inference service.
+    Recurrent models can't be cached, since their logits also depend on
+    their hidden state.
+
+    :param onnx_model_path: Path of the model to cache.
+    :param max_size: Number of distinct observations to keep logits for.
+    :return: The model's cache, e.g., to check its hit rate with `stats()`.
+    """
+    assert not get_recurrent_state_spec(
+        onnx_model_path
+    ), f"Can't cache the logits of recurrent model {onnx_model_path}."
+
+    if onnx_model_path not in LOGITS_CACHES:
+        LOGITS_CACHES[onnx_model_path] = logits_cache.LogitsCache(
+            max_size=max_size, name=onnx_model_path
+        )
+    return LOGITS_CACHES[onnx_model_path]
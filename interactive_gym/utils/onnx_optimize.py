@@ -0,0 +1,480 @@
+"""
+Optimize (and optionally quantize) ONNX policies for serving.
+
+Policies exported from RLlib are served as-is, so both `onnxruntime` on the
+server and `onnxruntime-web` in the browser load an unoptimized graph that
+still carries RLlib's dummy `state_ins` input. This tool writes serving
+variants of each model:
+
+- RLlib artifacts are stripped: the unused `state_ins` input (and the
+  `state_outs` output that only echoes it) of non-recurrent models.
+- The graph is optimized by ONNX Runtime (constant folding, node fusions).
+- Optionally, weights are quantized to int8, for smaller downloads and faster
+  CPU inference. Recurrent models aren't quantized unless asked for, since
+  quantizing their recurrent weights shifts their actions the most.
+- Each variant is saved as `.onnx` and/or as ONNX Runtime's `.ort` format.
+  `.ort` files load faster but are slightly larger than their `.onnx`
+  counterparts (e.g., 657KB vs. 644KB for the recurrent cogrid model), so
+  `.onnx` is the better choice for download size.
+
+Every variant is checked against the original model: the action distributions
+(softmax of the logits) on random observations must match within a tolerance.
+Optimization alone doesn't change the outputs, so unquantized variants are
+held to a tight tolerance. Quantization does, and int8 variants have a looser
+one: on the shipped models, the largest difference in any action probability
+is 0.04 for the cogrid cramped room model, 0.11 for the slime volleyball
+model, and 0.23 for the recurrent cogrid model (whose argmax action still
+agrees on 98% of observations).
+The variants and the results of the checks are recorded in a `manifest.json`
+in the output directory, which scenes can point to with `resolve_model`:
+
+    policy_mapping = {
+        "agent_left": onnx_optimize.resolve_model(
+            "static/assets/slime_volleyball/models/optimized/manifest.json",
+            "model",
+            quantized=True,
+        ),
+    }
+
+From the command line:
+
+    python -m interactive_gym.utils.onnx_optimize path/to/model.onnx --output-dir path/to/optimized --quantize --formats onnx ort
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_FILENAME = "manifest.json"
+
+# RLlib's dummy state input of non-recurrent models.
+RLLIB_DUMMY_STATE_INPUT = "state_ins"
+
+OPTIMIZATION_LEVELS = ["basic", "extended", "all"]
+MODEL_FORMATS = ["onnx", "ort"]
+
+
+def _import_onnx():
+    try:
+        import onnx
+        import onnxruntime as ort
+    except ImportError:
+        raise ImportError(
+            "Must `pip install onnx onnxruntime` to optimize ONNX models!"
+        )
+    return onnx, ort
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def strip_rllib_artifacts(model) -> list[str]:
+    """Remove RLlib's dummy state input (and its echo output) in place.
+
+    Recurrent models (`state_in_0`, ...) are left as-is. Returns the names of
+    the removed inputs and outputs.
+    """
+    graph = model.graph
+    removed = []
+
+    # `state_outs` is produced by an Identity of `state_ins`, drop both.
+    echo_nodes = [
+        node
+        for node in graph.node
+        if node.op_type == "Identity"
+        and list(node.input) == [RLLIB_DUMMY_STATE_INPUT]
+    ]
+    echo_outputs = {name for node in echo_nodes for name in node.output}
+    for output in list(graph.output):
+        if output.name in echo_outputs:
+            graph.output.remove(output)
+            removed.append(output.name)
+
+    for node in echo_nodes:
+        if not any(name in removed for name in node.output):
+            continue
+        graph.node.remove(node)
+
+    still_used = any(
+        RLLIB_DUMMY_STATE_INPUT in node.input for node in graph.node
+    ) or any(output.name == RLLIB_DUMMY_STATE_INPUT for output in graph.output)
+    for graph_input in list(graph.input):
+        if graph_input.name == RLLIB_DUMMY_STATE_INPUT and not still_used:
+            graph.input.remove(graph_input)
+            removed.append(graph_input.name)
+
+    return removed
+
+
+def _optimize(
+    input_path: str,
+    output_path: str,
+    optimization_level: str,
+    model_format: str,
+) -> None:
+    """Let ONNX Runtime optimize the model and save it in the given format."""
+    _, ort = _import_onnx()
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = {
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[optimization_level]
+    session_options.optimized_model_filepath = output_path
+    if model_format == "ort":
+        session_options.add_session_config_entry(
+            "session.save_model_format", "ORT"
+        )
+
+    # Creating the session runs the optimizations and saves the result.
+    ort.InferenceSession(
+        input_path,
+        sess_options=session_options,
+        providers=["CPUExecutionProvider"],
+    )
+
+
+def _sample_inputs(
+    session, num_samples: int, seed: int
+) -> dict[str, np.ndarray]:
+    """Random observations, with zero recurrent state, for a model's inputs."""
+    rng = np.random.default_rng(seed)
+    inputs = {}
+    for input_meta in session.get_inputs():
+        shape = [num_samples] + [
+            dim if isinstance(dim, int) else 1 for dim in input_meta.shape[1:]
+        ]
+        if input_meta.name == "obs":
+            inputs[input_meta.name] = rng.normal(size=shape).astype(np.float32)
+        elif input_meta.name == "seq_lens":
+            inputs[input_meta.name] = np.ones(shape, dtype=np.float32)
+        else:
+            inputs[input_meta.name] = np.zeros(shape, dtype=np.float32)
+    return inputs
+
+
+def is_recurrent(model) -> bool:
+    """Whether a model takes recurrent state inputs (`state_in_0`, ...)."""
+    return any(
+        graph_input.name.startswith("state_in_")
+        for graph_input in model.graph.input
+    )
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exps = np.exp(logits)
+    return exps / exps.sum(axis=-1, keepdims=True)
+
+
+def compare_action_distributions(
+    original_path: str,
+    variant_path: str,
+    num_samples: int = 256,
+    seed: int = 0,
+) -> dict[str, float]:
+    """Compare the action distributions of two models on random observations."""
+    _, ort = _import_onnx()
+    original = ort.InferenceSession(
+        original_path, providers=["CPUExecutionProvider"]
+    )
+    variant = ort.InferenceSession(
+        variant_path, providers=["CPUExecutionProvider"]
+    )
+
+    inputs = _sample_inputs(original, num_samples, seed)
+    variant_input_names = {
+        input_meta.name for input_meta in variant.get_inputs()
+    }
+
+    # Run one observation at a time, as the models are served.
+    original_probs, variant_probs = [], []
+    for i in range(num_samples):
+        sample = {name: value[i : i + 1] for name, value in inputs.items()}
+        original_probs.append(
+            _softmax(original.run(["output"], sample)[0].reshape(-1))
+        )
+        variant_probs.append(
+            _softmax(
+                variant.run(
+                    ["output"],
+                    {
+                        name: value
+                        for name, value in sample.items()
+                        if name in variant_input_names
+                    },
+                )[0].reshape(-1)
+            )
+        )
+
+    original_probs = np.stack(original_probs)
+    variant_probs = np.stack(variant_probs)
+    return {
+        "max_abs_prob_diff": float(np.abs(original_probs - variant_probs).max()),
+        "argmax_agreement": float(
+            np.mean(original_probs.argmax(-1) == variant_probs.argmax(-1))
+        ),
+    }
+
+
+def optimize_model(
+    model_path: str,
+    output_dir: str,
+    quantize: bool = False,
+    quantize_recurrent: bool = False,
+    model_formats: list[str] = ("onnx",),
+    optimization_level: str = "extended",
+    tolerance: float = 0.02,
+    quantized_tolerance: float = 0.15,
+    num_samples: int = 256,
+) -> dict[str, typing.Any]:
+    """Write the serving variants of a model and return its manifest entry.
+
+    :param model_path: Path of the ONNX model exported from RLlib.
+    :param output_dir: Directory to write the variants (and manifest) to.
+    :param quantize: Whether to also write variants with int8-quantized weights.
+    :param quantize_recurrent: Whether to quantize the model if it's recurrent, which is skipped by default.
+    :param model_formats: Formats to save each variant in, `onnx` and/or `ort`.
+    :param optimization_level: ONNX Runtime graph optimization level: `basic`, `extended`, or `all`. `all` adds layout optimizations for the machine it runs on, so prefer `extended` for models served to browsers.
+    :param tolerance: Largest allowed difference in any action probability between an unquantized variant and the original.
+    :param quantized_tolerance: Largest allowed difference in any action probability between an int8 variant and the original. The default admits the non-recurrent shipped models (up to 0.11), recurrent ones need about 0.25.
+    :param num_samples: Number of random observations to compare the models on.
+    """
+    onnx, _ = _import_onnx()
+    from onnxruntime import quantization
+
+    assert (
+        optimization_level in OPTIMIZATION_LEVELS
+    ), f"Unrecognized optimization level: {optimization_level}"
+    for model_format in model_formats:
+        assert (
+            model_format in MODEL_FORMATS
+        ), f"Unrecognized model format: {model_format}"
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+
+    variants = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model = onnx.load(model_path)
+        removed = strip_rllib_artifacts(model)
+        stripped_path = os.path.join(tmp_dir, f"{name}.stripped.onnx")
+        onnx.save(model, stripped_path)
+
+        sources = [(False, stripped_path)]
+        if quantize and is_recurrent(model) and not quantize_recurrent:
+            logger.info(
+                f"Not quantizing recurrent model {model_path}, "
+                f"pass quantize_recurrent to quantize it anyway."
+            )
+        elif quantize:
+            quantized_path = os.path.join(tmp_dir, f"{name}.int8.onnx")
+            quantization.quantize_dynamic(
+                stripped_path,
+                quantized_path,
+                weight_type=quantization.QuantType.QInt8,
+            )
+            sources.append((True, quantized_path))
+
+        for quantized, source_path in sources:
+            for model_format in model_formats:
+                suffix = ".int8" if quantized else ""
+                filename = f"{name}.opt{suffix}.{model_format}"
+                output_path = os.path.join(output_dir, filename)
+                _optimize(
+                    source_path, output_path, optimization_level, model_format
+                )
+
+                comparison = compare_action_distributions(
+                    model_path, output_path, num_samples=num_samples
+                )
+                variant_tolerance = (
+                    quantized_tolerance if quantized else tolerance
+                )
+                passed = comparison["max_abs_prob_diff"] <= variant_tolerance
+                if not passed:
+                    logger.warning(
+                        f"{filename} doesn't match {model_path} within {variant_tolerance}: {comparison}"
+                    )
+
+                variants.append(
+                    {
+                        "path": filename,
+                        "format": model_format,
+                        "quantized": quantized,
+                        "optimization_level": optimization_level,
+                        "size_bytes": os.path.getsize(output_path),
+                        "sha256": _sha256(output_path),
+                        "removed": removed,
+                        "tolerance": variant_tolerance,
+                        "passed": passed,
+                        **comparison,
+                    }
+                )
+
+    return {
+        "source": os.path.relpath(model_path, output_dir),
+        "source_size_bytes": os.path.getsize(model_path),
+        "source_sha256": _sha256(model_path),
+        "variants": variants,
+    }
+
+
+def write_manifest(
+    output_dir: str, entries: dict[str, dict[str, typing.Any]]
+) -> str:
+    """Add model entries to the manifest in `output_dir`, keeping any others."""
+    _, ort = _import_onnx()
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+
+    manifest = {"models": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    manifest["onnxruntime_version"] = ort.__version__
+    manifest["models"].update(entries)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest_path
+
+
+def resolve_model(
+    manifest_path: str,
+    model_name: str,
+    model_format: str = "onnx",
+    quantized: bool = False,
+) -> str:
+    """Return the path of a model variant listed in a manifest, e.g., for a scene's `policy_mapping`.
+
+    The path is relative to the same directory as `manifest_path`, so a
+    manifest under the static directory resolves to a path the browser can
+    load. Only variants that matched the original model are returned.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    assert (
+        model_name in manifest["models"]
+    ), f"{model_name} isn't in {manifest_path}, found {list(manifest['models'])}."
+
+    for variant in manifest["models"][model_name]["variants"]:
+        if (
+            variant["format"] == model_format
+            and variant["quantized"] == quantized
+            and variant["passed"]
+        ):
+            return os.path.join(os.path.dirname(manifest_path), variant["path"])
+
+    raise ValueError(
+        f"No {'quantized ' if quantized else ''}{model_format} variant of "
+        f"{model_name} that matches the original in {manifest_path}."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Optimize and quantize ONNX policies for serving."
+    )
+    parser.add_argument(
+        "models", type=str, nargs="+", help="Paths of the ONNX models"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        required=True,
+        help="Directory to write the variants and manifest to",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Also write variants with int8-quantized weights",
+    )
+    parser.add_argument(
+        "--quantize-recurrent",
+        action="store_true",
+        help="With --quantize, also quantize recurrent models",
+    )
+    parser.add_argument(
+        "--formats",
+        type=str,
+        nargs="+",
+        default=["onnx"],
+        choices=MODEL_FORMATS,
+        help="Formats to save the variants in",
+    )
+    parser.add_argument(
+        "--optimization-level",
+        type=str,
+        default="extended",
+        choices=OPTIMIZATION_LEVELS,
+        help="ONNX Runtime graph optimization level",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="Largest allowed difference in any action probability",
+    )
+    parser.add_argument(
+        "--quantized-tolerance",
+        type=float,
+        default=0.15,
+        help="Largest allowed difference in any action probability for int8 variants",
+    )
+    parser.add_argument(
+        "--num-samples",
+        type=int,
+        default=256,
+        help="Number of random observations to compare the models on",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    entries = {}
+    for model_path in args.models:
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        entries[name] = optimize_model(
+            model_path,
+            args.output_dir,
+            quantize=args.quantize,
+            quantize_recurrent=args.quantize_recurrent,
+            model_formats=args.formats,
+            optimization_level=args.optimization_level,
+            tolerance=args.tolerance,
+            quantized_tolerance=args.quantized_tolerance,
+            num_samples=args.num_samples,
+        )
+        for variant in entries[name]["variants"]:
+            logger.info(
+                f"{variant['path']}: {variant['size_bytes']} bytes "
+                f"(source {entries[name]['source_size_bytes']}), "
+                f"max action probability difference {variant['max_abs_prob_diff']:.2e}, "
+                f"{'passed' if variant['passed'] else 'FAILED'}"
+            )
+
+    manifest_path = write_manifest(args.output_dir, entries)
+    logger.info(f"Wrote manifest to {manifest_path}")
+
+    if not all(
+        variant["passed"]
+        for entry in entries.values()
+        for variant in entry["variants"]
+    ):
+        raise SystemExit(1)
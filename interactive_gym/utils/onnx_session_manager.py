@@ -0,0 +1,288 @@
+"""
+Managed ONNX Runtime sessions that run inference off of the eventlet hub.
+
+`InferenceSession.run` is a blocking call into native code. Called directly
+from a greenlet (e.g., a bot's policy consumer), it stalls the whole server
+(every socket and game loop in the process) until the model returns. The
+`OnnxSessionManager` instead runs inference in eventlet's pool of real threads
+(`eventlet.tpool`), so only the calling greenlet waits while everything else
+keeps running. ONNX Runtime releases the GIL while it runs, so these threads
+run in parallel with the server.
+
+Each model gets a single `InferenceSession` with explicit intra-op and inter-op
+thread counts. By default each session uses one thread of each, so that many
+concurrent models don't oversubscribe the CPU. Inputs are copied into
+preallocated buffers that are bound to the session with IO bindings, one set
+per input signature (e.g., batch size), and reused across calls.
+
+The process-wide `SESSION_MANAGER` is configured before any model is loaded:
+
+    onnx_session_manager.SESSION_MANAGER.configure(
+        intra_op_num_threads=2, inter_op_num_threads=1, num_pool_threads=8
+    )
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+
+import numpy as np
+from eventlet import tpool
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    raise ImportError(
+        "Must `pip install onnxruntime` to use the ONNX inference utils!"
+    )
+
+logger = logging.getLogger(__name__)
+
+
+# Input names, shapes, and dtypes of a call, used to look up its buffers.
+InputSignature = tuple[tuple[str, tuple[int, ...], str], ...]
+
+
+class ManagedSession:
+    """An ONNX Runtime session and the IO-bound input buffers reused across its calls."""
+
+    def __init__(
+        self,
+        model_path: str,
+        session_options: ort.SessionOptions,
+        providers: list[str] | None = None,
+    ):
+        self.model_path = model_path
+        self.session = ort.InferenceSession(
+            model_path, sess_options=session_options, providers=providers
+        )
+        self.input_names: list[str] = [
+            input_meta.name for input_meta in self.session.get_inputs()
+        ]
+        self.output_names: list[str] = [
+            output_meta.name for output_meta in self.session.get_outputs()
+        ]
+
+        # Idle input buffers and their IO binding, per input signature.
+        # A binding is only used by one call at a time, so concurrent calls
+        # with the same signature each take (or create) their own.
+        self.idle_bindings: dict[
+            InputSignature,
+            list[tuple[dict[str, np.ndarray], ort.IOBinding]],
+        ] = collections.defaultdict(list)
+
+        self.num_runs: int = 0
+        self.num_bindings: int = 0
+
+    @staticmethod
+    def _signature(inputs: dict[str, np.ndarray]) -> InputSignature:
+        return tuple(
+            (name, value.shape, value.dtype.str)
+            for name, value in sorted(inputs.items())
+        )
+
+    def _acquire_binding(
+        self, inputs: dict[str, np.ndarray], output_names: list[str]
+    ) -> tuple[dict[str, np.ndarray], ort.IOBinding]:
+        """Take an idle binding for these inputs, or allocate a new one."""
+        signature = (self._signature(inputs), tuple(output_names))
+        if self.idle_bindings[signature]:
+            return self.idle_bindings[signature].pop()
+
+        buffers = {
+            name: np.empty(value.shape, dtype=value.dtype)
+            for name, value in inputs.items()
+        }
+        binding = self.session.io_binding()
+        for name, buffer in buffers.items():
+            binding.bind_cpu_input(name, buffer)
+        for name in output_names:
+            binding.bind_output(name, "cpu")
+
+        self.num_bindings += 1
+        return buffers, binding
+
+    def _release_binding(
+        self,
+        inputs: dict[str, np.ndarray],
+        output_names: list[str],
+        buffers: dict[str, np.ndarray],
+        binding: ort.IOBinding,
+    ) -> None:
+        signature = (self._signature(inputs), tuple(output_names))
+        self.idle_bindings[signature].append((buffers, binding))
+
+    def _run_bound(self, binding: ort.IOBinding) -> list[np.ndarray]:
+        """Run the session on a binding. Called from a pool thread."""
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()
+
+    def run(
+        self,
+        inputs: dict[str, np.ndarray],
+        output_names: list[str] | None = None,
+        use_thread_pool: bool = True,
+    ) -> list[np.ndarray]:
+        """Run the model on the inputs and return the requested outputs.
+
+        :param inputs: Model inputs by name. Inputs are copied, so the caller can reuse them.
+        :param output_names: Names of the outputs to return, defaults to all outputs.
+        :param use_thread_pool: Whether to run in `eventlet.tpool` rather than in the calling greenlet.
+        """
+        output_names = output_names or self.output_names
+        inputs = {
+            name: np.ascontiguousarray(value) for name, value in inputs.items()
+        }
+
+        # If the run fails the binding is dropped rather than
+        # released, so that one in a bad state is never reused.
+        buffers, binding = self._acquire_binding(inputs, output_names)
+        for name, value in inputs.items():
+            np.copyto(buffers[name], value)
+
+        if use_thread_pool:
+            outputs = tpool.execute(self._run_bound, binding)
+        else:
+            outputs = self._run_bound(binding)
+
+        self._release_binding(inputs, output_names, buffers, binding)
+        self.num_runs += 1
+        return outputs
+
+    def warm_up(self) -> None:
+        """Run a dummy forward pass on a single observation.
+
+        The first run of a session is much slower than the rest (allocations,
+        kernel selection), so warming up moves that cost out of a game. The
+        dummy inputs have the shapes of a single observation, so the IO
+        binding they allocate is the one inference on a single observation
+        reuses.
+        """
+        inputs = {}
+        for input_meta in self.session.get_inputs():
+            shape = [
+                dim if isinstance(dim, int) else 1 for dim in input_meta.shape
+            ]
+            dtype = np.float32
+            if input_meta.type == "tensor(int64)":
+                dtype = np.int64
+            elif input_meta.type == "tensor(int32)":
+                dtype = np.int32
+
+            if input_meta.name == "seq_lens":
+                inputs[input_meta.name] = np.ones(shape, dtype=dtype)
+            else:
+                inputs[input_meta.name] = np.zeros(shape, dtype=dtype)
+
+        self.run(inputs, output_names=["output"], use_thread_pool=False)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "num_runs": self.num_runs,
+            "num_bindings": self.num_bindings,
+            "num_idle_bindings": sum(
+                len(bindings) for bindings in self.idle_bindings.values()
+            ),
+        }
+
+
+class OnnxSessionManager:
+    """Loads ONNX models once per process and runs them without blocking the server."""
+
+    def __init__(
+        self,
+        intra_op_num_threads: int = 1,
+        inter_op_num_threads: int = 1,
+        num_pool_threads: int | None = None,
+        use_thread_pool: bool = True,
+        providers: list[str] | None = None,
+    ):
+        self.intra_op_num_threads = intra_op_num_threads
+        self.inter_op_num_threads = inter_op_num_threads
+        self.num_pool_threads = num_pool_threads
+        self.use_thread_pool = use_thread_pool
+        self.providers = providers
+
+        self.sessions: dict[str, ManagedSession] = {}
+
+    def configure(
+        self,
+        intra_op_num_threads: int | None = None,
+        inter_op_num_threads: int | None = None,
+        num_pool_threads: int | None = None,
+        use_thread_pool: bool | None = None,
+        providers: list[str] | None = None,
+    ) -> OnnxSessionManager:
+        """Set how sessions are created and run. Only models loaded afterwards use the new thread counts.
+
+        :param intra_op_num_threads: Threads ONNX Runtime uses within an operator, per session.
+        :param inter_op_num_threads: Threads ONNX Runtime uses to run independent operators in parallel, per session.
+        :param num_pool_threads: Size of eventlet's thread pool, i.e., how many inference calls can run at once. Must be set before the first call.
+        :param use_thread_pool: Whether to run inference in the thread pool. Disable to run it in the calling greenlet.
+        :param providers: ONNX Runtime execution providers, in order of preference.
+        """
+        if intra_op_num_threads is not None:
+            self.intra_op_num_threads = intra_op_num_threads
+
+        if inter_op_num_threads is not None:
+            self.inter_op_num_threads = inter_op_num_threads
+
+        if num_pool_threads is not None:
+            self.num_pool_threads = num_pool_threads
+            tpool.set_num_threads(num_pool_threads)
+
+        if use_thread_pool is not None:
+            self.use_thread_pool = use_thread_pool
+
+        if providers is not None:
+            self.providers = providers
+
+        if self.sessions:
+            logger.warning(
+                f"ONNX session manager was configured after loading {list(self.sessions)}, "
+                "those sessions keep their previous thread counts."
+            )
+
+        return self
+
+    def _session_options(self) -> ort.SessionOptions:
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = self.intra_op_num_threads
+        session_options.inter_op_num_threads = self.inter_op_num_threads
+        session_options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL
+            if self.inter_op_num_threads > 1
+            else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        return session_options
+
+    def load(self, model_path: str) -> ManagedSession:
+        """Return the session for a model, creating it if necessary."""
+        if model_path not in self.sessions:
+            self.sessions[model_path] = ManagedSession(
+                model_path, self._session_options(), providers=self.providers
+            )
+        return self.sessions[model_path]
+
+    def run(
+        self,
+        model_path: str,
+        inputs: dict[str, np.ndarray],
+        output_names: list[str] | None = None,
+    ) -> list[np.ndarray]:
+        """Run a model (loading it if necessary) and return the requested outputs."""
+        return self.load(model_path).run(
+            inputs,
+            output_names=output_names,
+            use_thread_pool=self.use_thread_pool,
+        )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            model_path: session.stats()
+            for model_path, session in self.sessions.items()
+        }
+
+
+SESSION_MANAGER = OnnxSessionManager()
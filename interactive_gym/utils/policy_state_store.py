@@ -0,0 +1,155 @@
+"""
+Recurrent policy state kept on the server, per bot.
+
+A recurrent policy (e.g., an LSTM exported from RLlib) takes its previous
+hidden state as input and returns the next one, so each bot needs its own
+state that persists from one inference call to the next. The `PolicyStateStore`
+holds that state, keyed by the bot's game and agent ID, as arrays that are
+allocated on the bot's first write and then updated in place.
+
+States are zeroed when an episode starts and evicted when the game is torn
+down. Bots only keep their state in games that have been reset at least once;
+until then (or after eviction), reading a bot's state gives zeros without
+creating an entry for it. For batched inference, `gather` stacks the states of several bots into
+a batch and `scatter` writes the model's new states back to each bot.
+
+Since the model runs between `gather` and `scatter`, a game can be reset or
+evicted in the meantime. Each reset gives the game a new generation, and
+`scatter` drops states that were computed in an earlier one, so a new episode
+never picks up the last one's state and an evicted game isn't recreated.
+"""
+
+from __future__ import annotations
+
+import itertools
+import typing
+
+import numpy as np
+
+# A bot's state key: the UUID of its game and its agent ID.
+StateKey = tuple[str, typing.Hashable]
+
+# Shape (without the batch dimension) and dtype of each state tensor, by name.
+StateSpec = dict[str, tuple[tuple[int, ...], np.dtype]]
+
+
+class PolicyStateStore:
+    """Hidden states of recurrent bots, preallocated and updated in place."""
+
+    def __init__(self):
+        # Game UUID -> agent ID -> state name -> state with a batch dimension of 1.
+        self.states: dict[
+            str, dict[typing.Hashable, dict[str, np.ndarray]]
+        ] = {}
+
+        # The current generation of each game, set whenever the game is
+        # reset. Bots only keep their states in games that have one.
+        self.generations: dict[str, int] = {}
+        self._generation_counter = itertools.count()
+
+        # Buffers that batches of states are gathered into, by state name
+        # and batch size. A gathered batch is only valid until the next
+        # `gather` of the same size, so callers must use it (e.g., copy it
+        # into the model's inputs) before yielding.
+        self.batch_buffers: dict[tuple[str, int], np.ndarray] = {}
+
+    def update(
+        self,
+        key: StateKey,
+        new_states: dict[str, np.ndarray],
+        generation: int | None,
+    ) -> None:
+        """Overwrite a bot's states (in place) with the model's new states.
+
+        :param generation: The generation of the bot's game when its states were gathered. If the game has been reset or evicted since, the new states are dropped.
+        """
+        game_uuid, agent_id = key
+        if generation is None or self.generations.get(game_uuid) != generation:
+            return
+
+        game_states = self.states.setdefault(game_uuid, {})
+        agent_states = game_states.get(agent_id)
+        if agent_states is None or agent_states.keys() != new_states.keys():
+            game_states[agent_id] = {
+                name: np.array(value)[np.newaxis]
+                for name, value in new_states.items()
+            }
+            return
+
+        for name, value in new_states.items():
+            np.copyto(
+                agent_states[name], value.reshape(agent_states[name].shape)
+            )
+
+    def gather(
+        self, keys: list[StateKey | None], spec: StateSpec
+    ) -> tuple[dict[str, np.ndarray], list[int | None]]:
+        """Stack the states of several bots into a batch, with zeros for bots that have none.
+
+        :return: The batch and the generation of each bot's game, to pass to `scatter`.
+        """
+        batch = {}
+        for name, (shape, dtype) in spec.items():
+            buffer_key = (name, len(keys))
+            buffer = self.batch_buffers.get(buffer_key)
+            if buffer is None or buffer.dtype != dtype:
+                buffer = np.empty((len(keys), *shape), dtype=dtype)
+                self.batch_buffers[buffer_key] = buffer
+            batch[name] = buffer
+
+        generations = []
+        for i, key in enumerate(keys):
+            agent_states = None
+            generation = None
+            if key is not None:
+                game_uuid, agent_id = key
+                agent_states = self.states.get(game_uuid, {}).get(agent_id)
+                generation = self.generations.get(game_uuid)
+            generations.append(generation)
+
+            if agent_states is None or agent_states.keys() != spec.keys():
+                for name in spec:
+                    batch[name][i] = 0
+                continue
+
+            for name in spec:
+                batch[name][i] = agent_states[name][0]
+
+        return batch, generations
+
+    def scatter(
+        self,
+        keys: list[StateKey | None],
+        new_states: dict[str, np.ndarray],
+        generations: list[int | None],
+    ) -> None:
+        """Write each row of a batch of new states back to its bot."""
+        for i, (key, generation) in enumerate(zip(keys, generations)):
+            if key is None:
+                continue
+            self.update(
+                key,
+                {name: value[i] for name, value in new_states.items()},
+                generation,
+            )
+
+    def reset_game(self, game_uuid: str) -> None:
+        """Zero the states of every bot in a game, e.g., when an episode starts."""
+        self.generations[game_uuid] = next(self._generation_counter)
+        for agent_states in self.states.get(game_uuid, {}).values():
+            for state in agent_states.values():
+                state.fill(0)
+
+    def evict_game(self, game_uuid: str) -> None:
+        """Drop the states of every bot in a game once it's over."""
+        self.states.pop(game_uuid, None)
+        self.generations.pop(game_uuid, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "num_games": len(self.states),
+            "num_bots": sum(len(agents) for agents in self.states.values()),
+        }
+
+
+POLICY_STATE_STORE = PolicyStateStore()